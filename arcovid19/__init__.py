@@ -26,7 +26,15 @@ __version__ = "0.6b"
 # PUBLIC API
 # =============================================================================
 
-from .cache import CACHE, from_cache  # noqa
+from .cache import from_cache  # noqa
 from .cases import load_cases  # noqa
 from .models import load_infection_curve  # noqa
 from . import web  # noqa
+
+
+def __getattr__(name):
+    # the cache is created the first time it's used
+    if name == "CACHE":
+        from .cache import get_cache
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -19,10 +19,39 @@
 """
 
 __all__ = [
+    "CODECS",
+    "MODE_COLUMNAR",
+    "MODE_COMPRESSED",
+    "ColumnarDisk",
     "DEFAULT_CACHE_DIR",
-    "CACHE",
+    "SHM_DIR",
+    "CACHE_BACKEND",
+    "CACHE_DIR",
+    "CACHE_SIZE_LIMIT",
+    "CACHE_EVICTION_POLICY",
+    "CACHE_COMPRESSION",
+    "CACHE_MIN_FILE_SIZE",
     "CACHE_EXPIRE",
-    "from_cache"]
+    "MEMORY_CACHE_SIZE",
+    "LOCK_EXPIRE",
+    "MEMORY_CACHE",
+    "MemoryCache",
+    "MemoryBackend",
+    "CACHE_BACKENDS",
+    "get_cache",
+    "configure",
+    "CULL_INTERVAL",
+    "cull",
+    "clear",
+    "STATS_FLUSH_INTERVAL",
+    "STATS_COUNTERS",
+    "stats",
+    "CACHE_MAX_STALE",
+    "URL_TIMEOUT",
+    "CachedURL",
+    "code_salt",
+    "from_cache",
+    "fetch"]
 
 
 # =============================================================================
@@ -30,9 +59,258 @@ __all__ = [
 # =============================================================================
 
 import os
+import mmap
+import zlib
+import time
+import atexit
+import pickle
+import sqlite3
+import inspect
+import hashlib
+import logging
+import functools
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+import attr
 
 import diskcache as dcache
 
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+from . import __version__
+
+
+# =============================================================================
+# CODECS
+# =============================================================================
+
+def _zstd_compress(data):
+    # the compressors of zstandard can't be shared by threads
+    return zstandard.ZstdCompressor(level=1).compress(data)
+
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+#: The codecs that can compress the values of the cache, as
+#: ``(compress, decompress)`` by name. zlib is always available, lz4 and
+#: zstd if their packages are installed.
+CODECS = {"zlib": (functools.partial(zlib.compress, level=1), zlib.decompress)}
+
+if lz4 is not None:  # pragma: no cover
+    CODECS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+
+if zstandard is not None:  # pragma: no cover
+    CODECS["zstd"] = (_zstd_compress, _zstd_decompress)
+
+
+def _get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown or not installed codec {name!r}. "
+            f"Options: {', '.join(CODECS)}")
+
+
+# =============================================================================
+# DISK
+# =============================================================================
+
+#: Mode of the values stored by ColumnarDisk in the cache table (diskcache
+#: uses the modes from 0 to 4)
+MODE_COLUMNAR = 5
+
+#: Mode of the compressed values stored by ColumnarDisk
+MODE_COMPRESSED = 6
+
+# the protocol 5, with the buffers of the arrays out of band, is available
+# from Python 3.8; before it the arrays go in the pickles
+_PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+_OUT_OF_BAND = _PICKLE_PROTOCOL >= 5
+
+
+def _dumps(value, buffer_callback=None):
+    """Pickle ``value``, passing the buffers of its arrays to
+    ``buffer_callback`` when the protocol can write them out of band.
+
+    """
+    if buffer_callback is None or not _OUT_OF_BAND:
+        return pickle.dumps(value, protocol=_PICKLE_PROTOCOL)
+    return pickle.dumps(
+        value, protocol=_PICKLE_PROTOCOL, buffer_callback=buffer_callback)
+
+
+class ColumnarDisk(dcache.Disk):
+    """Serialization of the values of the cache with the arrays stored in
+    raw columnar files.
+
+    The values are pickled with the protocol 5, so the buffers of the
+    NumPy arrays (and of the blocks of the pandas DataFrames) are written
+    out of band to a file (in Python 3.7 the arrays stay in the pickle),
+    one after the other and aligned to ``alignment`` bytes, and the rest of
+    the pickle is stored in the database. When the value is fetched the
+    file is memory mapped and the arrays are built over it without copying
+    them, so the load time does not depend on the size of the arrays and
+    all the processes reading a value share the same pages of the OS page
+    cache. These arrays are read-only.
+
+    The pickles of the values (and the part of the pickle stored in the
+    database for the arrays) of at least ``compress_min_size`` bytes are
+    compressed with the ``compression`` codec, when it makes them at least
+    ``compress_min_ratio`` times smaller.
+    The arrays are only compressed with ``compress_arrays``: they take less
+    space but each fetch decompresses a copy of them.
+
+    The values smaller than ``min_file_size`` bytes, and the values with
+    less than ``min_file_size`` bytes of arrays, are stored in the
+    database instead of in a file.
+
+    These parameters are set as the ``disk_*`` settings of the
+    ``diskcache.Cache``, for example ``disk_compression="zlib"``.
+
+    Parameters
+    ----------
+
+    compression: str or None (default=None)
+        Name of one of the ``CODECS``, or ``None`` to not compress.
+
+    compress_min_size: int (default=1024)
+        Size in bytes from which the pickles are compressed.
+
+    compress_min_ratio: float (default=0.8)
+        Maximum size of the compressed pickles relative to the original
+        ones. Above it the values are stored uncompressed, because saving
+        a few bytes is not worth decompressing them in every fetch.
+
+    compress_arrays: bool (default=False)
+        If the arrays are compressed with the rest of the value, instead of
+        being memory mapped.
+
+    """
+
+    alignment = 64
+
+    def __init__(
+        self, directory, compression=None, compress_min_size=1024,
+        compress_min_ratio=0.8, compress_arrays=False, **kwargs
+    ):
+        super().__init__(directory, **kwargs)
+        if compression is not None:
+            _get_codec(compression)
+        self.compression = compression
+        self.compress_min_size = compress_min_size
+        self.compress_min_ratio = compress_min_ratio
+        self.compress_arrays = compress_arrays
+
+    def _compress(self, data):
+        """Return the codec and the compressed ``data``, or ``None`` and
+        ``data`` if it's not worth compressing it.
+
+        """
+        if self.compression is None or len(data) < self.compress_min_size:
+            return None, data
+        compress, _ = _get_codec(self.compression)
+        compressed = compress(data)
+        if len(compressed) > len(data) * self.compress_min_ratio:
+            return None, data
+        return self.compression, compressed
+
+    def _write(self, data, mode, key, value):
+        if len(data) < self.min_file_size:
+            return 0, mode, None, sqlite3.Binary(data)
+        filename, full_path = self.filename(key, value)
+        with open(full_path, "wb") as fp:
+            fp.write(data)
+        return len(data), mode, filename, None
+
+    def _store_pickle(self, data, key, value):
+        codec, data = self._compress(data)
+        if codec is None:
+            return self._write(data, dcache.core.MODE_PICKLE, key, value)
+        data = _dumps((codec, data))
+        return self._write(data, MODE_COMPRESSED, key, value)
+
+    def _store_columnar(self, header, buffers, key, value):
+        spans, offset = [], 0
+        filename, full_path = self.filename(key, value)
+        with open(full_path, "wb") as fp:
+            for buf in buffers:
+                padding = -offset % self.alignment
+                fp.write(b"\0" * padding)
+                fp.write(buf)
+                offset += padding
+                spans.append((offset, buf.nbytes))
+                offset += buf.nbytes
+
+        codec, header = self._compress(header)
+        db_value = _dumps((header, spans, codec))
+        return offset, MODE_COLUMNAR, filename, sqlite3.Binary(db_value)
+
+    def store(self, value, read, key=dcache.core.UNKNOWN):
+        """Convert ``value`` to the fields size, mode, filename and value
+        of the cache table.
+
+        """
+        if read or type(value) in (str, bytes, int, float):
+            return super().store(value, read, key=key)
+
+        buffers = []
+        header = _dumps(value, buffer_callback=buffers.append)
+        buffers = [buf.raw() for buf in buffers]
+        nbytes = sum(buf.nbytes for buf in buffers)
+
+        if self.compress_arrays or not nbytes or nbytes < self.min_file_size:
+            if buffers:  # the arrays go in the pickle
+                header = _dumps(value)
+            return self._store_pickle(header, key, value)
+
+        return self._store_columnar(header, buffers, key, value)
+
+    def fetch(self, mode, filename, value, read):
+        """Convert the fields mode, filename and value of the cache table
+        to the stored value.
+
+        """
+        if mode == MODE_COMPRESSED:
+            if value is None:
+                full_path = os.path.join(self._directory, filename)
+                with open(full_path, "rb") as fp:
+                    value = fp.read()
+            codec, data = pickle.loads(value)
+            _, decompress = _get_codec(codec)
+            return pickle.loads(decompress(data))
+
+        if mode != MODE_COLUMNAR:
+            return super().fetch(mode, filename, value, read)
+
+        meta = pickle.loads(value)
+        header, spans = meta[:2]
+        codec = meta[2] if len(meta) > 2 else None  # stored uncompressed
+        if codec is not None:
+            _, decompress = _get_codec(codec)
+            header = decompress(header)
+
+        with open(os.path.join(self._directory, filename), "rb") as fp:
+            data = memoryview(
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+        buffers = [data[offset:offset + size] for offset, size in spans]
+        return pickle.loads(header, buffers=buffers)
+
 
 # =============================================================================
 # CACHE CONF
@@ -43,17 +321,767 @@ ARCOVID19_DATA = os.path.expanduser(os.path.join('~', 'arcovid19_data'))
 #: Default cache location, (default=~/arcovid_19_data/_cache_)
 DEFAULT_CACHE_DIR = os.path.join(ARCOVID19_DATA, "_cache_")
 
-#: Default cache instance
-CACHE = dcache.Cache(directory=DEFAULT_CACHE_DIR, disk_min_file_size=0)
+#: Directory of the shared memory of the host used by the "shm" backend
+SHM_DIR = "/dev/shm"
+
+#: Backend of ``CACHE``, one of ``CACHE_BACKENDS`` (default="diskcache",
+#: or the ``ARCOVID19_CACHE_BACKEND`` environment variable)
+CACHE_BACKEND = os.environ.get("ARCOVID19_CACHE_BACKEND", "diskcache")
+
+#: Directory of ``CACHE``. ``None`` is the default directory of the backend
+#: (default=None, or the ``ARCOVID19_CACHE_DIR`` environment variable)
+CACHE_DIR = os.environ.get("ARCOVID19_CACHE_DIR")
+
+#: Size of the cache in bytes over which ``cull`` evicts values
+#: (default=1 GiB, or the ``ARCOVID19_CACHE_SIZE_LIMIT`` environment variable)
+CACHE_SIZE_LIMIT = int(os.environ.get("ARCOVID19_CACHE_SIZE_LIMIT", 2 ** 30))
+
+#: Which values are evicted first by ``cull``. One of the policies of
+#: diskcache: "least-recently-stored", "least-recently-used",
+#: "least-frequently-used" or "none" (default="least-recently-stored", or
+#: the ``ARCOVID19_CACHE_EVICTION_POLICY`` environment variable). The
+#: "least-recently-used" and "least-frequently-used" policies write the
+#: database in every read.
+CACHE_EVICTION_POLICY = os.environ.get(
+    "ARCOVID19_CACHE_EVICTION_POLICY", "least-recently-stored")
+
+#: Codec of ``CODECS`` that compresses the values of the "diskcache" and
+#: "shm" backends, or ``None`` (default="zstd" or "lz4" if installed, or
+#: the ``ARCOVID19_CACHE_COMPRESSION`` environment variable, where "none"
+#: disables the compression). zlib is not used by default because it's
+#: much slower for the little it saves on the values of arcovid19
+CACHE_COMPRESSION = os.environ.get(
+    "ARCOVID19_CACHE_COMPRESSION",
+    next((codec for codec in ("zstd", "lz4") if codec in CODECS), "none"))
+CACHE_COMPRESSION = (
+    None if CACHE_COMPRESSION.lower() == "none" else CACHE_COMPRESSION)
+
+#: Values smaller than this bytes are stored in the database of the
+#: "diskcache" and "shm" backends, and the bigger ones in their own files
+CACHE_MIN_FILE_SIZE = 32 * 2 ** 10  # 32 KiB
+
+# CACHE, the cache instance, is created by get_cache the first time it's used
 
 #: Time to expire of every load_cases call in seconds
 CACHE_EXPIRE = 60 * 60  # ONE HOUR
 
+#: Maximum number of values kept in memory by from_cache
+MEMORY_CACHE_SIZE = 32
+
+#: Seconds after which the lock of a value being computed is released, in
+#: case the process that holds it dies
+LOCK_EXPIRE = 10 * 60  # TEN MINUTES
+
+#: Seconds after the expiration of an URL in which ``fetch`` still returns
+#: the stale content while it is revalidated in background
+CACHE_MAX_STALE = 24 * 60 * 60  # ONE DAY
+
+#: Seconds to wait for a server when an URL is downloaded or revalidated
+URL_TIMEOUT = 30
+
+#: Seconds between the culls of the disk cache that every process starts in
+#: background when it uses the cache. ``None`` disables them, so the cache is
+#: culled only with ``cull`` (or ``arcovid19 cache cull``).
+CULL_INTERVAL = 10 * 60  # TEN MINUTES
+
+#: Seconds between the writes to the cache of the statistics collected by
+#: every process
+STATS_FLUSH_INTERVAL = 10
+
+logger = logging.getLogger("arcovid19.cache")
+
+
+# =============================================================================
+# MEMORY CACHE
+# =============================================================================
+
+@attr.s(repr=False)
+class MemoryCache:
+    """In-process LRU cache used by ``from_cache`` in front of the disk
+    cache.
+
+    Keeps up to ``maxsize`` values already deserialized, every one until
+    the expiration time of their entry in the disk cache and no more than
+    ``ttl`` seconds. The values are shared by all the callers, so they
+    must not be modified.
+
+    Parameters
+    ----------
+
+    maxsize: int (default=MEMORY_CACHE_SIZE)
+        Maximum number of values. ``0`` disables the memory cache.
+
+    ttl: float (default=CACHE_EXPIRE)
+        Maximum time that a value is kept, in seconds.
+
+    """
+
+    maxsize = attr.ib(default=MEMORY_CACHE_SIZE)
+    ttl = attr.ib(default=CACHE_EXPIRE)
+    hits = attr.ib(default=0, init=False)
+    misses = attr.ib(default=0, init=False)
+    _data = attr.ib(factory=OrderedDict, init=False)
+    _lock = attr.ib(factory=threading.Lock, init=False)
+
+    def __repr__(self):
+        return (
+            f"MemoryCache(size={len(self)}, maxsize={self.maxsize}, "
+            f"hits={self.hits}, misses={self.misses})")
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Retrieve the value of ``key``, or ``default`` if the key is not
+        in the cache or is expired.
+
+        """
+        with self._lock:
+            expire_time, value = self._data.get(key, (None, default))
+            if expire_time is not None and expire_time <= time.time():
+                del self._data[key]
+                expire_time, value = None, default
+
+            if expire_time is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expire_time=None):
+        """Store ``value`` under ``key`` until ``expire_time`` (seconds
+        since the epoch) or for ``ttl`` seconds, the sooner.
+
+        """
+        if self.maxsize <= 0:
+            return
+        max_expire_time = time.time() + self.ttl
+        expire_time = (
+            max_expire_time if expire_time is None
+            else min(expire_time, max_expire_time))
+        with self._lock:
+            self._data[key] = (expire_time, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all the values and reset the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Hits, misses, size and maximum size of the cache as a dict."""
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "size": len(self), "maxsize": self.maxsize}
+
+
+#: Default memory cache instance
+MEMORY_CACHE = MemoryCache()
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+def _sizeof(value):
+    """Size of the pickle of ``value``, without copying its arrays."""
+    buffers = []
+    header = _dumps(value, buffer_callback=buffers.append)
+    return len(header) + sum(buf.raw().nbytes for buf in buffers)
+
+
+@attr.s(slots=True)
+class _Entry:
+    value = attr.ib()
+    expire_time = attr.ib()
+    tag = attr.ib()
+    size = attr.ib()
+    store_time = attr.ib()
+    access_time = attr.ib()
+    access_count = attr.ib(default=0)
+
+
+#: The entries that each eviction policy removes first
+_EVICTION_ORDER = {
+    "least-recently-stored": lambda entry: entry.store_time,
+    "least-recently-used": lambda entry: entry.access_time,
+    "least-frequently-used": lambda entry: entry.access_count,
+    "none": None}
+
+
+@attr.s(repr=False)
+class MemoryBackend:
+    """Cache backend that keeps the values in the memory of the process.
+
+    Implements the part of the ``diskcache.Cache`` API used by arcovid19,
+    so it can replace ``CACHE`` where the filesystem is read-only or the
+    values must not outlive the process. It is not shared with other
+    processes. The values are not copied, so they must not be modified.
+
+    Parameters
+    ----------
+
+    size_limit: int (default=CACHE_SIZE_LIMIT)
+        Size in bytes over which the values are evicted. The size of every
+        value is the size of its pickle.
+
+    eviction_policy: str (default=CACHE_EVICTION_POLICY)
+        Which values are evicted first, with the same names of diskcache.
+
+    """
+
+    size_limit = attr.ib(default=CACHE_SIZE_LIMIT)
+    eviction_policy = attr.ib(default=CACHE_EVICTION_POLICY)
+    directory = None
+    _data = attr.ib(factory=dict, init=False)
+    _volume = attr.ib(default=0, init=False)
+    _lock = attr.ib(factory=threading.RLock, init=False)
+
+    @eviction_policy.validator
+    def _check_eviction_policy(self, attribute, value):
+        if value not in _EVICTION_ORDER:
+            raise ValueError(f"Unknown eviction policy {value!r}")
+
+    def __repr__(self):
+        return (
+            f"MemoryBackend(size={len(self)}, volume={self._volume}, "
+            f"size_limit={self.size_limit})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live_entry(key, time.time()) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key, default=dcache.core.ENOVAL)
+        if value is dcache.core.ENOVAL:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def iterkeys(self, reverse=False):
+        """Iterate the keys in the order they were stored."""
+        with self._lock:
+            keys = list(self._data)
+        return iter(reversed(keys) if reverse else keys)
+
+    def _live_entry(self, key, now):
+        entry = self._data.get(key)
+        if entry is None or entry.expire_time is None:
+            return entry
+        return entry if now < entry.expire_time else None
+
+    def get(
+        self, key, default=None, read=False, expire_time=False, tag=False,
+        retry=False
+    ):
+        """Retrieve the value of ``key``, or ``default`` if it's missing or
+        expired.
+
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is None:
+                value, entry_expire, entry_tag = default, None, None
+            else:
+                entry.access_time = now
+                entry.access_count += 1
+                value = entry.value
+                entry_expire, entry_tag = entry.expire_time, entry.tag
+        if expire_time and tag:
+            return value, entry_expire, entry_tag
+        elif expire_time:
+            return value, entry_expire
+        elif tag:
+            return value, entry_tag
+        return value
+
+    def set(self, key, value, expire=None, read=False, tag=None, retry=False):
+        """Store ``value`` in ``key``, for ``expire`` seconds if it's not
+        ``None``.
+
+        """
+        now = time.time()
+        entry = _Entry(
+            value=value,
+            expire_time=None if expire is None else now + expire,
+            tag=tag, size=_sizeof(value), store_time=now, access_time=now)
+        with self._lock:
+            self._pop(key)
+            self._data[key] = entry
+            self._volume += entry.size
+            if self._volume > self.size_limit:
+                self.cull()
+        return True
+
+    def add(self, key, value, expire=None, read=False, tag=None, retry=False):
+        """Store ``value`` in ``key`` only if the key is missing."""
+        with self._lock:
+            if self._live_entry(key, time.time()) is not None:
+                return False
+            return self.set(key, value, expire=expire, tag=tag)
+
+    def incr(self, key, delta=1, default=0, retry=False):
+        """Increment the value of ``key`` by ``delta``, starting from
+        ``default`` if it's missing.
+
+        """
+        with self._lock:
+            value = self.get(key, default=default)
+            if value is None:
+                raise KeyError(key)
+            value += delta
+            self.set(key, value)
+        return value
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._volume -= entry.size
+        return entry
+
+    def delete(self, key, retry=False):
+        """Remove ``key``, and return if it was in the cache."""
+        with self._lock:
+            return self._pop(key) is not None
+
+    def _remove(self, predicate):
+        with self._lock:
+            keys = [k for k, entry in self._data.items() if predicate(entry)]
+            for key in keys:
+                self._pop(key)
+        return len(keys)
+
+    def clear(self, retry=False):
+        """Remove all the values."""
+        return self._remove(lambda entry: True)
+
+    def evict(self, tag, retry=False):
+        """Remove the values stored with ``tag``."""
+        return self._remove(lambda entry: entry.tag == tag)
+
+    def expire(self, now=None, retry=False):
+        """Remove the expired values."""
+        now = time.time() if now is None else now
+        return self._remove(
+            lambda entry: entry.expire_time is not None and (
+                entry.expire_time <= now))
+
+    def cull(self, retry=False):
+        """Remove the expired values, and then evict values until the size of
+        the cache is under the size limit.
+
+        """
+        with self._lock:
+            removed = self.expire()
+            order = _EVICTION_ORDER[self.eviction_policy]
+            if order is None:
+                return removed
+            by_policy = sorted(self._data.items(), key=lambda i: order(i[1]))
+            for key, _ in by_policy:
+                if self._volume <= self.size_limit:
+                    break
+                self._pop(key)
+                removed += 1
+        return removed
+
+    def volume(self):
+        """Size of the values in bytes."""
+        return self._volume
+
+    def close(self):
+        pass
+
+
+def _diskcache_backend(directory, size_limit, eviction_policy):
+    return dcache.Cache(
+        directory=DEFAULT_CACHE_DIR if directory is None else directory,
+        disk=ColumnarDisk, disk_min_file_size=CACHE_MIN_FILE_SIZE,
+        disk_compression=CACHE_COMPRESSION,
+        size_limit=size_limit, eviction_policy=eviction_policy)
+
+
+def _shm_backend(directory, size_limit, eviction_policy):
+    # diskcache over the memory filesystem of the host: the values are
+    # shared by all the processes, and with ColumnarDisk all of them map the
+    # same pages of memory
+    if directory is None:
+        if not os.path.isdir(SHM_DIR):
+            raise ValueError(f"Shared memory directory {SHM_DIR!r} not found")
+        directory = os.path.join(SHM_DIR, "arcovid19_cache")
+    return _diskcache_backend(directory, size_limit, eviction_policy)
+
+
+def _memory_backend(directory, size_limit, eviction_policy):
+    return MemoryBackend(
+        size_limit=size_limit, eviction_policy=eviction_policy)
+
+
+#: Factories of the cache backends by name. Every one is called as
+#: ``factory(directory, size_limit, eviction_policy)`` and returns an object
+#: with the API of ``diskcache.Cache``. New backends can be registered here.
+CACHE_BACKENDS = {
+    "diskcache": _diskcache_backend,
+    "shm": _shm_backend,
+    "memory": _memory_backend}
+
+_CACHE_LOCK = threading.Lock()
+
+
+def _check_config(backend, eviction_policy):
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(
+            f"Unknown cache backend {backend!r}. "
+            f"Options: {', '.join(CACHE_BACKENDS)}")
+    if eviction_policy not in _EVICTION_ORDER:
+        raise ValueError(f"Unknown eviction policy {eviction_policy!r}")
+
+
+def get_cache():
+    """The cache instance (``CACHE``), created with the configuration of the
+    module the first time it's used.
+
+    """
+    cache = globals().get("CACHE")
+    if cache is None:
+        with _CACHE_LOCK:
+            cache = globals().get("CACHE")
+            if cache is None:
+                _check_config(CACHE_BACKEND, CACHE_EVICTION_POLICY)
+                factory = CACHE_BACKENDS[CACHE_BACKEND]
+                cache = factory(
+                    CACHE_DIR, CACHE_SIZE_LIMIT, CACHE_EVICTION_POLICY)
+                globals()["CACHE"] = cache
+    return cache
+
+
+def configure(
+    backend=None, directory=None, size_limit=None, eviction_policy=None,
+    compression=None
+):
+    """Change the configuration of the cache.
+
+    The current ``CACHE`` is closed, and the next one is created with the
+    new configuration when it's used. The parameters that are ``None`` keep
+    their current value.
+
+    Parameters
+    ----------
+
+    backend: str
+        One of ``CACHE_BACKENDS``: "diskcache" (the default), "shm" to store
+        the cache in the shared memory of the host, or "memory" to keep it
+        in the memory of the process.
+
+    directory: str or path-like
+        Directory of the cache for the "diskcache" and "shm" backends.
+
+    size_limit: int
+        Size in bytes over which the values are evicted.
+
+    eviction_policy: str
+        Which values are evicted first: "least-recently-stored",
+        "least-recently-used", "least-frequently-used" or "none".
+
+    compression: str
+        One of ``CODECS`` to compress the values of the "diskcache" and
+        "shm" backends, or "none".
+
+    """
+    global CACHE_BACKEND, CACHE_DIR, CACHE_SIZE_LIMIT, CACHE_EVICTION_POLICY
+    global CACHE_COMPRESSION
+
+    _check_config(
+        CACHE_BACKEND if backend is None else backend,
+        CACHE_EVICTION_POLICY if eviction_policy is None else eviction_policy)
+    if compression is not None and compression.lower() != "none":
+        _get_codec(compression)
+
+    with _CACHE_LOCK:
+        if backend is not None:
+            CACHE_BACKEND = backend
+        if directory is not None:
+            CACHE_DIR = os.fspath(directory)
+        if size_limit is not None:
+            CACHE_SIZE_LIMIT = size_limit
+        if eviction_policy is not None:
+            CACHE_EVICTION_POLICY = eviction_policy
+        if compression is not None:
+            CACHE_COMPRESSION = (
+                None if compression.lower() == "none" else compression)
+        cache = globals().pop("CACHE", None)
+
+    if cache is not None:
+        cache.close()
+    MEMORY_CACHE.clear()
+
+
+def __getattr__(name):
+    # CACHE is created the first time it's used, not when the module is
+    # imported
+    if name == "CACHE":
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+
+def cull(cache=None):
+    """Remove the expired values of the disk cache, and then evict values
+    with the eviction policy of the cache until its size is under its size
+    limit.
+
+    Parameters
+    ----------
+
+    cache: diskcache.Cache (default=CACHE)
+        The cache to cull.
+
+    Returns
+    -------
+
+    int:
+        The number of removed values.
+
+    """
+    cache = get_cache() if cache is None else cache
+    removed = cache.expire(retry=True)
+    removed += cache.cull(retry=True) or 0  # None with the "none" policy
+    return removed
+
+
+_CULL_KEY = ("arcovid19", "cull")
+
+#: Monotonic time of the next cull of this process
+_next_cull = None
+
+_CULL_LOCK = threading.Lock()
+
+
+def _cull(cache, interval):
+    try:
+        # only one process culls the cache every interval
+        if cache.add(
+            _CULL_KEY, None, expire=interval, tag="cache.cull", retry=True
+        ):
+            removed = cull(cache)
+            logger.debug(f"{removed} values culled from the cache")
+    except Exception:
+        logger.exception("Can't cull the cache")
+
+
+def _cull_in_background():
+    """Cull ``CACHE`` in a thread if ``CULL_INTERVAL`` seconds passed since
+    the last cull, so the readers of the cache never scan it.
+
+    """
+    global _next_cull
+
+    interval = CULL_INTERVAL
+    if interval is None:
+        return
+    now = time.monotonic()
+    with _CULL_LOCK:
+        if _next_cull is None:  # the first call of the process
+            _next_cull = now + interval
+        if now < _next_cull:
+            return
+        _next_cull = now + interval
+    thread = threading.Thread(
+        target=_cull, args=(get_cache(), interval),
+        name="arcovid19-cull", daemon=True)
+    thread.start()
+    return thread
+
+
+def clear(tag=None):
+    """Remove all the values of the cache, or only the values stored with
+    ``tag``.
+
+    Returns
+    -------
+
+    int:
+        The number of removed values.
+
+    Notes
+    -----
+
+    Only the ``MEMORY_CACHE`` of this process is cleared. Other processes
+    keep serving the values of their memory cache until they expire, no
+    more than ``CACHE_EXPIRE`` seconds.
+
+    """
+    cache = get_cache()
+    if tag is None:
+        removed = cache.clear(retry=True)
+    else:
+        removed = cache.evict(tag, retry=True)
+    MEMORY_CACHE.clear()
+    return removed
+
+
+# =============================================================================
+# STATS
+# =============================================================================
+
+#: The statistics collected for every tag: values served from the cache,
+#: values computed (or downloaded), stale contents served by ``fetch``,
+#: seconds computing the values, and bytes stored
+STATS_COUNTERS = ("hits", "misses", "stale", "compute_time", "bytes")
+
+#: The statistics of this process not written to the cache yet, by tag
+_STATS = {}
+
+_STATS_LOCK = threading.Lock()
+
+#: Monotonic time of the next write of the statistics of this process
+_next_stats_flush = None
+
+
+def _stats_key(tag, counter):
+    return ("arcovid19", "stats", tag, counter)
+
+
+def _flush_stats():
+    """Add the statistics collected by this process to the ones stored in
+    the cache.
+
+    """
+    with _STATS_LOCK:
+        pending = dict(_STATS)
+        _STATS.clear()
+    if not pending:
+        return
+    try:
+        cache = get_cache()
+        for tag, counters in pending.items():
+            for counter, delta in counters.items():
+                if delta:
+                    cache.incr(_stats_key(tag, counter), delta, retry=True)
+    except Exception:
+        logger.exception("Can't store the statistics of the cache")
+
+
+atexit.register(_flush_stats)
+
+
+def _count(tag, **deltas):
+    """Add ``deltas`` to the statistics of ``tag``.
+
+    They are kept in memory and written to the cache every
+    ``STATS_FLUSH_INTERVAL`` seconds.
+
+    """
+    global _next_stats_flush
+
+    now = time.monotonic()
+    with _STATS_LOCK:
+        counters = _STATS.setdefault(tag, dict.fromkeys(STATS_COUNTERS, 0))
+        for counter, delta in deltas.items():
+            counters[counter] += delta
+        if _next_stats_flush is not None and now < _next_stats_flush:
+            return
+        _next_stats_flush = now + STATS_FLUSH_INTERVAL
+    _flush_stats()
+
+
+def stats():
+    """Statistics of the use of the cache by tag, of all the processes that
+    share it.
+
+    Returns
+    -------
+
+    dict:
+        For every tag a dict with the counters of ``STATS_COUNTERS``, and
+        the ``hit_rate``: the fraction of the requests served from the
+        cache (including the stale contents), or ``None`` without
+        requests.
+
+    """
+    _flush_stats()
+    cache = get_cache()
+
+    result = {}
+    for key in list(cache):
+        if not (isinstance(key, tuple) and len(key) == 4):
+            continue
+        if key[:2] != ("arcovid19", "stats"):
+            continue
+        tag, counter = key[2:]
+        counters = result.setdefault(tag, dict.fromkeys(STATS_COUNTERS, 0))
+        counters[counter] = cache.get(key, default=0, retry=True)
+
+    for counters in result.values():
+        served = counters["hits"] + counters["stale"]
+        requests = served + counters["misses"]
+        counters["hit_rate"] = served / requests if requests else None
+    return dict(sorted(result.items()))
+
 
 # =============================================================================
 # FUNCTIONS
 # =============================================================================
 
+def code_salt(*objects):
+    """Hash of the version of arcovid19 and of the source code of
+    ``objects``.
+
+    Adding it to the parameters of a cached function invalidates the cached
+    values when the code that computes them changes.
+
+    """
+    digest = hashlib.sha1(__version__.encode())
+    for obj in objects:
+        if obj is None:
+            continue
+        obj = getattr(obj, "py_func", obj)  # numba functions
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):  # pragma: no cover
+            source = obj.__qualname__
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+def _lock_key(key):
+    return ("arcovid19", "lock", key)
+
+
+def _lock(cache, key):
+    """Lock shared by all the threads and processes that use the cache, so
+    only one computes the value of ``key``.
+
+    """
+    return dcache.Lock(
+        cache, _lock_key(key), expire=LOCK_EXPIRE, tag="cache.lock")
+
+
 def from_cache(tag, function, force=False, *args, **kwargs):
     """Simple cache orchestration.
 
@@ -74,22 +1102,272 @@ def from_cache(tag, function, force=False, *args, **kwargs):
     args and kwargs:
         All the parameters needed to execute the function.
 
+    Notes
+    -----
+
+    The values are looked up first in ``MEMORY_CACHE`` and then in the
+    disk ``CACHE``. The values served from memory are the same object for
+    every call, so they must not be modified.
+
+    If the value is missing only one caller computes it, even in other
+    threads or processes: the others wait for it and read it from the
+    cache.
+
+    The expired values are not removed here but culled in background
+    every ``CULL_INTERVAL`` seconds.
+
     """
     # start the cache orchestration
     key = dcache.core.args_to_key(
         base=("arcodiv19", tag), args=args, kwargs=kwargs, typed=False)
 
-    with CACHE as cache:
-        cache.expire()
+    try:
+        hash(key)
+    except TypeError:  # only the disk cache can store unhashable keys
+        memory = None
+    else:
+        memory = MEMORY_CACHE
+
+    if not force and memory is not None:
+        value = memory.get(key, default=dcache.core.ENOVAL)
+        if value is not dcache.core.ENOVAL:
+            _count(tag, hits=1)
+            return value
+
+    _cull_in_background()
 
-        value = (
-            dcache.core.ENOVAL if force else
-            cache.get(key, default=dcache.core.ENOVAL, retry=True))
+    with get_cache() as cache:
+        value, expire_time = (
+            (dcache.core.ENOVAL, None) if force else
+            cache.get(
+                key, default=dcache.core.ENOVAL,
+                expire_time=True, retry=True))
 
         if value is dcache.core.ENOVAL:
-            value = function(**kwargs)
-            cache.set(
-                key, value, expire=CACHE_EXPIRE,
-                tag=f"{tag}", retry=True)
+            with _lock(cache, key):
+                # maybe it was computed while we were waiting
+                value, expire_time = (
+                    (dcache.core.ENOVAL, None) if force else
+                    cache.get(
+                        key, default=dcache.core.ENOVAL,
+                        expire_time=True, retry=True))
 
+                if value is dcache.core.ENOVAL:
+                    start = time.perf_counter()
+                    value = function(**kwargs)
+                    compute_time = time.perf_counter() - start
+                    expire_time = time.time() + CACHE_EXPIRE
+                    cache.set(
+                        key, value, expire=CACHE_EXPIRE,
+                        tag=f"{tag}", retry=True)
+                    _count(
+                        tag, misses=1, compute_time=compute_time,
+                        bytes=_sizeof(value))
+                else:
+                    _count(tag, hits=1)
+        else:
+            _count(tag, hits=1)
+
+    if memory is not None:
+        memory.set(key, value, expire_time=expire_time)
     return value
+
+
+# =============================================================================
+# URLS
+# =============================================================================
+
+@attr.s(frozen=True, repr=False)
+class CachedURL:
+    """The content of an URL and the validators of the response that
+    returned it.
+
+    """
+
+    url = attr.ib()
+    content = attr.ib()
+    etag = attr.ib(default=None)
+    last_modified = attr.ib(default=None)
+    expire_time = attr.ib(default=None)
+    digest = attr.ib()
+
+    @digest.default
+    def _digest_default(self):
+        return hashlib.sha256(self.content).hexdigest()
+
+    def __repr__(self):
+        return f"CachedURL({self.url!r}, digest={self.digest[:12]!r})"
+
+    @property
+    def expired(self):
+        """If the content must be revalidated with the server."""
+        return self.expire_time is None or self.expire_time <= time.time()
+
+
+def _download(url, cached, timeout):
+    """Download ``url``, or only revalidate the ``cached`` content if it has
+    validators.
+
+    """
+    headers = {}
+    if cached is not None and cached.etag is not None:
+        headers["If-None-Match"] = cached.etag
+    if cached is not None and cached.last_modified is not None:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content = response.read()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+    except urllib.error.HTTPError as error:
+        if error.code != 304 or cached is None:
+            raise
+        # not modified: the cached content is valid for another period
+        return attr.evolve(cached, expire_time=time.time() + CACHE_EXPIRE)
+
+    return CachedURL(
+        url=url, content=content, etag=etag, last_modified=last_modified,
+        expire_time=time.time() + CACHE_EXPIRE)
+
+
+#: The keys of the URLs being revalidated in background, and their threads
+_REFRESHING = {}
+
+_REFRESHING_LOCK = threading.Lock()
+
+
+def _download_and_store(cache, key, url, cached, timeout, max_stale):
+    start = time.perf_counter()
+    cached = _download(url, cached, timeout)
+    compute_time = time.perf_counter() - start
+
+    # never expires in the disk, so it can be revalidated
+    cache.set(key, cached, tag="cache.fetch", retry=True)
+    MEMORY_CACHE.set(key, cached, expire_time=cached.expire_time + max_stale)
+
+    _count(
+        "cache.fetch", compute_time=compute_time, bytes=len(cached.content))
+    return cached
+
+
+def _refresh(key, cached, timeout, max_stale):
+    lock_key = _lock_key(key)
+    try:
+        with get_cache() as cache:
+            # other process is already revalidating it
+            if not cache.add(
+                lock_key, None, expire=LOCK_EXPIRE, tag="cache.lock",
+                retry=True
+            ):
+                return
+            try:
+                _download_and_store(
+                    cache, key, cached.url, cached, timeout, max_stale)
+            finally:
+                cache.delete(lock_key, retry=True)
+    except Exception:
+        logger.exception(f"Can't revalidate {cached.url!r}")
+    finally:
+        with _REFRESHING_LOCK:
+            del _REFRESHING[key]
+
+
+def _refresh_in_background(key, cached, timeout, max_stale):
+    """Revalidate an URL in a thread, unless it's already being revalidated.
+
+    """
+    with _REFRESHING_LOCK:
+        if key in _REFRESHING:
+            return
+        thread = threading.Thread(
+            target=_refresh, args=(key, cached, timeout, max_stale),
+            name=f"arcovid19-refresh-{cached.url}", daemon=True)
+        _REFRESHING[key] = thread
+    thread.start()
+
+
+def fetch(url, force=False, timeout=URL_TIMEOUT, max_stale=None):
+    """Retrieve the content of an HTTP URL through the cache.
+
+    The content is stored with the ``ETag`` and ``Last-Modified`` headers of
+    the response. After ``CACHE_EXPIRE`` seconds the server is asked if
+    the content changed (with ``If-None-Match`` and ``If-Modified-Since``),
+    and if the answer is 304 (not modified) the cached content is used for
+    another ``CACHE_EXPIRE`` seconds without downloading it again.
+
+    For ``max_stale`` seconds after the expiration the stale content is
+    returned immediately and a single thread revalidates it in background
+    (stale-while-revalidate). After that the callers wait for the server,
+    and only one of them (even in other processes) downloads the content.
+
+    Paths and ``file://`` URLs are read every time.
+
+    Parameters
+    ----------
+
+    url: str or path-like
+        The URL or path to read.
+
+    force: bool (default=False)
+        If the cached content must be ignored and downloaded again.
+
+    timeout: float (default=URL_TIMEOUT)
+        Seconds to wait for the server.
+
+    max_stale: float, optional
+        Seconds that the expired content can still be returned while
+        it's revalidated (``CACHE_MAX_STALE`` by default). ``0`` always
+        waits for the server.
+
+    Returns
+    -------
+
+    CachedURL: with the content, its sha256 ``digest`` and the validators.
+
+    """
+    url = os.fspath(url)
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        path = (
+            urllib.request.url2pathname(parsed.path)
+            if parsed.scheme == "file" else url)
+        with open(path, "rb") as fp:
+            return CachedURL(url=url, content=fp.read())
+
+    max_stale = CACHE_MAX_STALE if max_stale is None else max_stale
+    key = ("arcovid19", "fetch", url)
+
+    _cull_in_background()
+
+    cached = None
+    if not force:
+        cached = MEMORY_CACHE.get(key)
+        if cached is None:
+            with get_cache() as cache:
+                cached = cache.get(key, retry=True)
+            if cached is not None:
+                MEMORY_CACHE.set(
+                    key, cached, expire_time=cached.expire_time + max_stale)
+
+    if cached is not None and not cached.expired:
+        _count("cache.fetch", hits=1)
+        return cached
+
+    if cached is not None and time.time() < cached.expire_time + max_stale:
+        _refresh_in_background(key, cached, timeout, max_stale)
+        _count("cache.fetch", stale=1)
+        return cached
+
+    with get_cache() as cache:
+        with _lock(cache, key):
+            # maybe other process downloaded it while we were waiting
+            current = None if force else cache.get(key, retry=True)
+            if current is None or current.expired:
+                _count("cache.fetch", misses=1)
+                return _download_and_store(
+                    cache, key, url, current or cached, timeout, max_stale)
+    MEMORY_CACHE.set(key, current, expire_time=current.expire_time + max_stale)
+    _count("cache.fetch", hits=1)
+    return current
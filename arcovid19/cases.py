@@ -33,10 +33,12 @@ __all__ = [
 # IMPORTS
 # =============================================================================
 
+import io
 import datetime as dt
 import itertools as it
 
 import logging
+import functools
 
 import numpy as np
 
@@ -115,6 +117,11 @@ STATUS = {
 }
 
 
+#: Rows of the cases table with the cases of every province and status,
+#: the next ones are totals and notes
+CASES_ROWS = 96
+
+
 #: Pandemia Start 2020-03-11
 D0 = dt.datetime(year=2020, month=3, day=11)
 
@@ -744,6 +751,8 @@ def load_cases(cases_url=CASES_URL, areas_pop_url=AREAS_POP_URL, force=False):
 
     cases_url: str
         The url for the excel table to parse. Default is ivco19 team table.
+        The table can also be in csv, as the one exported by the
+        spreadsheet, or parquet; its format is detected from its content.
 
     areas_pop_url: str
         The url for the csv population table to parse.
@@ -762,70 +771,142 @@ def load_cases(cases_url=CASES_URL, areas_pop_url=AREAS_POP_URL, force=False):
         - level 0: cod_provincia - Argentina states
         - level 1: cod_status - Four states of disease patients (R, C, A, D)
 
+    Notes
+    -----
+
+    The tables are retrieved with ``arcovid19.cache.fetch``: when they
+    expire the cached tables are still returned while they are
+    revalidated in background, for up to ``cache.CACHE_MAX_STALE``
+    seconds.
+
+    The resulting ``CasesFrame`` is cached by the content of the tables,
+    so it's only parsed again if they change.
+
     """
-    df_infar = cache.from_cache(
+    cases = cache.fetch(cases_url, force=force)
+    areas_pop = cache.fetch(areas_pop_url, force=force)
+
+    cases_frame = cache.from_cache(
         tag="cases.load_cases",
+        function=lambda **kwargs: _parse_cases(
+            cases.content, areas_pop.content),
         force=force,
-        function=pd.read_excel,
-        io=cases_url,
-        sheet_name=0,
-        nrows=96,
+        cases_digest=cases.digest,
+        areas_pop_digest=areas_pop.digest,
+        salt=_parse_cases_salt(),
     )
 
-    areapop = cache.from_cache(
-        tag="cases.load_caces[areapop]",
-        force=force,
-        function=pd.read_csv,
-        filepath_or_buffer=areas_pop_url,
-    )
+    # the cached frame can be shared with other calls
+    return CasesFrame(
+        df=cases_frame.df.copy(),
+        extra={"areapop": cases_frame.areapop.copy()})
 
-    # load table and replace Nan by zeros
-    df_infar = df_infar.fillna(0)
 
-    # Parsear provincias en codigos standard
-    df_infar.rename(columns={"Provicia \\ día": "Pcia_status"}, inplace=True)
-    for irow, arow in df_infar.iterrows():
-        pst = arow["Pcia_status"].split()
-        stat = STATUS.get(pst[-1])
+@functools.lru_cache(maxsize=None)
+def _parse_cases_salt():
+    return cache.code_salt(
+        _parse_cases, _cases_format, *CASES_READERS.values(),
+        _parse_date_labels, CasesFrame)
 
-        pcia = pst[:-2]
-        if len(pcia) > 1:
-            provincia = ""
-            for ap in pcia:
-                provincia += ap + " "
-            provincia = provincia.strip()
 
-        else:
-            provincia = pcia[0].strip()
+def _cases_format(content):
+    """Format of the cases table from the first bytes of its content."""
+    if content.startswith((b"PK\x03\x04", b"\xd0\xcf\x11\xe0")):
+        return "excel"  # xlsx is a zip file, and xls an OLE2 file
+    elif content.startswith(b"PAR1"):
+        return "parquet"
+    return "csv"
 
-        provincia_code = PROVINCIAS.get(provincia)
 
-        df_infar.loc[irow, "cod_provincia"] = provincia_code
-        df_infar.loc[irow, "cod_status"] = stat
-        df_infar.loc[irow, "provincia_status"] = f"{provincia_code}_{stat}"
+def _parse_date_labels(labels):
+    """Datetimes of the labels of the date columns of a csv or parquet
+    cases table: iso dates, or "dd/mm" dates without the year as the csv
+    exported by the spreadsheet, that are in the year of the previous date
+    (starting in the year of ``D0``) or in the next one.
 
-    # reindex table with multi-index
-    index = pd.MultiIndex.from_frame(df_infar[["cod_provincia", "cod_status"]])
-    df_infar.index = index
+    """
+    dates, previous = [], dt.datetime(D0.year, 1, 1)
+    for label in labels:
+        try:
+            date = dt.datetime.fromisoformat(label)
+        except ValueError:
+            day, month = map(int, label.split("/"))
+            date = dt.datetime(previous.year, month, day)
+            if date < previous:
+                date = date.replace(year=previous.year + 1)
+        dates.append(date)
+        previous = date
+    return dates
+
+
+def _read_cases_excel(content):
+    return pd.read_excel(io.BytesIO(content), sheet_name=0, nrows=CASES_ROWS)
+
+
+def _read_cases_csv(content):
+    # the columns are read with their dtypes, instead of inferring them
+    # from the values, and the date labels are parsed once
+    labels = pd.read_csv(io.BytesIO(content), nrows=0).columns
+    dtype = dict.fromkeys(labels[1:], float)
+    dtype[labels[0]] = str
+    df = pd.read_csv(io.BytesIO(content), nrows=CASES_ROWS, dtype=dtype)
+    df.columns = [labels[0]] + _parse_date_labels(labels[1:])
+    return df
+
+
+def _read_cases_parquet(content):
+    df = pd.read_parquet(io.BytesIO(content)).head(CASES_ROWS)
+    labels = df.columns
+    df = df.astype(dict.fromkeys(labels[1:], float))
+    df.columns = [labels[0]] + _parse_date_labels(labels[1:])
+    return df
+
+
+#: Readers of the cases table by format. Every one takes the content of
+#: the table and returns its first ``CASES_ROWS`` rows, with the labels of
+#: the date columns as ``datetime``.
+CASES_READERS = {
+    "excel": _read_cases_excel,
+    "csv": _read_cases_csv,
+    "parquet": _read_cases_parquet}
+
+
+def _parse_cases(cases, areas_pop):
+    """Build the ``CasesFrame`` from the content of the cases table (excel,
+    csv or parquet) and of the population csv table.
 
-    # drop duplicate columns
-    df_infar.drop(columns=["cod_status", "cod_provincia"], inplace=True)
-    cols = list(df_infar.columns)
-    df_infar = df_infar[[cols[-1]] + cols[:-1]]
+    """
+    df_infar = CASES_READERS[_cases_format(cases)](cases)
+    areapop = pd.read_csv(io.BytesIO(areas_pop))
 
-    # calculate the total number per categorie per state, and the global
-    for astatus in np.unique(df_infar.index.get_level_values(1)):
-        filter_confirmados = df_infar.index.get_level_values(
-            "cod_status"
-        ).isin([astatus])
-        sums = df_infar[filter_confirmados].sum(axis=0)
-        dates = [date for date in sums.index if isinstance(date, dt.datetime)]
-        df_infar.loc[("ARG", astatus), dates] = sums[dates].astype(int)
+    # load table and replace Nan by zeros
+    df_infar = df_infar.fillna(0)
 
-        df_infar.loc[("ARG", astatus), "provincia_status"] = f"ARG_{astatus}"
+    # Parsear provincias en codigos standard: every row is
+    # "<provincia> Casos <status>", with the words split by any whitespace
+    df_infar.rename(columns={"Provicia \\ día": "Pcia_status"}, inplace=True)
+    words = df_infar["Pcia_status"].str.split()
+    cod_provincia = words.str[:-2].str.join(" ").map(PROVINCIAS)
+    cod_status = words.str[-1].map(STATUS)
+
+    # reindex table with multi-index
+    df_infar.index = pd.MultiIndex.from_arrays(
+        [cod_provincia, cod_status], names=["cod_provincia", "cod_status"])
+    df_infar.insert(
+        0, "provincia_status", (cod_provincia + "_" + cod_status).values)
 
-    n_c = df_infar.loc[("ARG", "C"), dates].values
+    # calculate the total number per categorie per state, and the global
+    dates = [col for col in df_infar.columns if isinstance(col, dt.datetime)]
+    totals = df_infar[dates].groupby(level="cod_status").sum().astype(int)
+    totals.index = pd.MultiIndex.from_product(
+        [["ARG"], totals.index], names=df_infar.index.names)
+    totals.insert(
+        0, "provincia_status", "ARG_" + totals.index.get_level_values(1))
+
+    n_c = totals.loc[("ARG", "C"), dates].values.astype(float)
     growth_rate_C = (n_c[1:] / n_c[:-1]) - 1
-    df_infar.loc[("ARG", "growth_rate_C"), dates[1:]] = growth_rate_C
+    totals.loc[("ARG", "growth_rate_C"), dates[1:]] = growth_rate_C
+
+    df_infar = pd.concat([df_infar, totals])
 
     return CasesFrame(df=df_infar, extra={"areapop": areapop})
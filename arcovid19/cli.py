@@ -19,7 +19,9 @@ COVID-19 data from the Arcovid19 group.
 
 """
 
-__all__ = ["main", "cases", "webserver"]
+__all__ = [
+    "main", "cases", "webserver", "warm",
+    "cache_cull", "cache_stats", "cache_clear"]
 
 
 # =============================================================================
@@ -29,7 +31,8 @@ __all__ = ["main", "cases", "webserver"]
 import sys
 
 from .cases import load_cases, CASES_URL
-from . import web
+from .warm import warm_cache
+from . import cache, web
 
 
 # =============================================================================
@@ -52,7 +55,8 @@ def cases(*, url=CASES_URL, force=False, out=None):
     """Retrieve and store the cases database in CSV format.
 
     url: str
-        The url for the excel table to parse. Default is ivco19 team table.
+        The url for the excel, csv or parquet table to parse. Default is
+        ivco19 team table.
 
     out: PATH (default=stdout)
         The output path to the CSV file. If it's not provided the
@@ -106,10 +110,80 @@ def webserver(
         load_dotenv=load_dotenv)
 
 
+def warm(*, force=False):
+    """Download and parse the cases tables and precompute the default model
+    runs, so the cache is hot before the first requests.
+
+    force:
+        Compute every value again even if it's in the cache.
+
+    """
+    rows = []
+    for name, result in warm_cache(force=force).items():
+        if isinstance(result, Exception):
+            rows.append(f"{name}: FAILED {result!r}")
+        else:
+            rows.append(f"{name}: {result:.3f} s")
+    return "\n".join(rows)
+
+
+def cache_cull():
+    """Remove the expired values of the cache and evict values until its
+    size is under the size limit.
+
+    """
+    removed = cache.cull()
+    volume = cache.CACHE.volume() / 2 ** 20
+    return f"{removed} values removed, the cache uses {volume:.2f} MiB"
+
+
+def cache_stats():
+    """Show the hits, misses, stale contents served, compute time and bytes
+    stored of every tag of the cache.
+
+    """
+    rows = [
+        f"{'tag':<32} {'hits':>8} {'misses':>8} {'stale':>8} "
+        f"{'hit rate':>8} {'compute [s]':>12} {'stored [MiB]':>12}"]
+    for tag, counters in cache.stats().items():
+        hit_rate = counters["hit_rate"]
+        hit_rate = "-" if hit_rate is None else f"{hit_rate:.1%}"
+        rows.append(
+            f"{tag:<32} {counters['hits']:>8} {counters['misses']:>8} "
+            f"{counters['stale']:>8} {hit_rate:>8} "
+            f"{counters['compute_time']:>12.3f} "
+            f"{counters['bytes'] / 2 ** 20:>12.2f}")
+    return "\n".join(rows)
+
+
+def cache_clear(*, tag=None):
+    """Remove the values of the cache.
+
+    The processes already running (like the web app) keep serving the values
+    in their own memory cache until they expire, for up to an hour.
+
+    tag: str
+        Remove only the values stored with this tag (for example
+        'cases.load_cases' or 'cache.fetch').
+
+    """
+    removed = cache.clear(tag=tag)
+    return f"{removed} values removed"
+
+
 def main():
     """Run the arcovid19 command line interface."""
     from clize import run
+    from clize.runner import SubcommandDispatcher
+
+    cache_commands = SubcommandDispatcher(
+        {"cull": cache_cull, "stats": cache_stats, "clear": cache_clear},
+        description="Maintenance of the cache.")
 
     run(
-        cases, webserver,
+        {
+            "cases": cases,
+            "webserver": webserver,
+            "warm": warm,
+            "cache": cache_commands},
         description=DESCRIPTION, footnotes=FOOTNOTES)
@@ -97,6 +97,9 @@ class Frame(metaclass=abc.ABCMeta):
         to the internal dataframe.
 
         """
+        # unpickling looks up attributes before df and extra are set
+        if a in ("df", "extra"):
+            raise AttributeError(a)
         if a in self.extra:
             return self.extra[a]
         return getattr(self.df, a)
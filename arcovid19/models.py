@@ -20,8 +20,12 @@ COVID-19 in Argentina.
 """
 
 __all__ = [
-    "NodeNotFoundError",
-    "Node", "Graph", "InfectionCurve",
+    "NodeNotFoundError", "SweepCancelledError",
+    "Node", "Graph", "CompiledGraph", "InfectionCurve",
+    "CompartmentalModel", "compile_model",
+    "GILLESPIE_MAX_POPULATION", "STOCHASTIC_METHODS", "P2Quantiles",
+    "SOLVERS", "DEFAULT_SOLVER_OPTIONS", "JIT", "STREAM_CHUNK_SIZE",
+    "StopCondition", "BelowThreshold", "PeakPassed",
     "load_infection_curve"]
 
 
@@ -29,6 +33,19 @@ __all__ = [
 # IMPORTS
 # =============================================================================
 
+import os
+import abc
+import bisect
+import heapq
+import functools
+import threading
+import importlib.util
+import itertools as it
+from collections.abc import Mapping
+from concurrent import futures
+
+import numpy as np
+
 import pandas as pd
 
 from matplotlib import pyplot as plt
@@ -38,13 +55,26 @@ import seaborn as sns
 
 import attr
 
-from . import core
+from . import cache, core
 
 
 # =============================================================================
 # CONSTANTS
 # =============================================================================
 
+#: Number of steps integrated at once when the full history of a model is
+#: not kept (for example with ``output_dt``).
+STREAM_CHUNK_SIZE = 1024
+
+# numba is imported when the first kernel is compiled
+_HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+#: If the models are integrated with the numba compiled kernels. Is true
+#: when numba is installed, unless the environment variable
+#: ``ARCOVID19_DISABLE_JIT`` is set.
+JIT = _HAS_NUMBA and not os.environ.get("ARCOVID19_DISABLE_JIT")
+
+
 # =============================================================================
 # EXCEPTIONS
 # =============================================================================
@@ -53,6 +83,10 @@ class NodeNotFoundError(KeyError):
     """If a node is not found inside a graph"""
 
 
+class SweepCancelledError(RuntimeError):
+    """If a sweep is cancelled before all the runs are integrated"""
+
+
 # =============================================================================
 # GRAPHS
 # =============================================================================
@@ -230,10 +264,17 @@ class Graph:
             raise NodeNotFoundError from e
 
     def get_edge(self, frm, to, field):
-        if frm not in self.vert_dict:
-            self.add_node(frm)
-        if to not in self.vert_dict:
-            self.add_node(to)
+        """Retrieve the value of a field of an edge.
+
+        Raises
+        ------
+
+        NodeNotFound:
+            If one of the node are not tregistered in the graph
+
+        """
+        if frm not in self.vert_dict or to not in self.vert_dict:
+            raise NodeNotFoundError(frm if frm not in self.vert_dict else to)
 
         v_frm = self.get_node(frm)
         v_to = self.get_node(to)
@@ -297,6 +338,724 @@ class Graph:
             upgrades.append(self.get_edge(a.id, nnode, key))
         return upgrades
 
+    def compile(self):
+        """Retrieve an array based representation of the graph.
+
+        Returns
+        -------
+           compiled: CompiledGraph
+
+        """
+        return CompiledGraph.from_graph(self)
+
+
+@attr.s(repr=False, frozen=True)
+class CompiledGraph:
+    """Array based representation of a Graph.
+
+    The nodes are identified by their position in ``nodes`` and every
+    field of the edges is stored in a dense matrix of ``n_nodes x n_nodes``
+    (the rows are the origin of the edge and the columns the destination),
+    so retrieve the value of an edge costs only an array read.
+
+    Several compiled graphs with the same nodes can be stacked to store
+    the values of many graphs at once; in that case all the arrays have an
+    extra leading dimension.
+
+    Example
+    -------
+
+    >>> g = Graph()
+    >>> for inode in ['A', 'B', 'C']:
+    ...     g.add_node(inode, 0)
+    >>> g.add_edge('A', 'B', ['prob', 'lag'], [0.5, 10])
+    >>> cg = g.compile()
+    >>> cg.get_edge('A', 'B', 'lag')
+    10.0
+    >>> cg.weights['prob']
+    array([[0. , 0.5, 0. ],
+           [0. , 0. , 0. ],
+           [0. , 0. , 0. ]])
+
+    Attributes
+    ----------
+    nodes: tuple
+        The ids of the nodes.
+    values: numpy.ndarray
+        The values of the nodes.
+    adjacency: numpy.ndarray
+        Boolean matrix with the existing edges.
+    weights: dict
+        A matrix with the values of every field of the edges.
+
+    """
+
+    nodes = attr.ib(converter=tuple)
+    values = attr.ib()
+    adjacency = attr.ib()
+    weights = attr.ib()
+    index = attr.ib(init=False)
+
+    @index.default
+    def _index_default(self):
+        return {n: idx for idx, n in enumerate(self.nodes)}
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Create a new compiled graph from a ``Graph``."""
+        nodes = graph.get_node_ids()
+        index = {n: idx for idx, n in enumerate(nodes)}
+        size = len(nodes)
+
+        values = np.array([graph.get_node_value(n) for n in nodes], float)
+        adjacency = np.zeros((size, size), dtype=bool)
+        weights = {}
+        for node in graph:
+            frm = index[node.id]
+            for neighbor in node.get_connections():
+                to = index[neighbor.id]
+                adjacency[frm, to] = True
+                for field, value in node.get_weight(neighbor).items():
+                    if field not in weights:
+                        weights[field] = np.zeros((size, size))
+                    weights[field][frm, to] = value
+
+        return cls(
+            nodes=nodes, values=values, adjacency=adjacency, weights=weights)
+
+    @classmethod
+    def stack(cls, cgraphs):
+        """Join many compiled graphs with the same nodes in a single one."""
+        cgraphs = list(cgraphs)
+        nodes = cgraphs[0].nodes
+        if any(cg.nodes != nodes for cg in cgraphs):
+            raise ValueError("All the graphs must have the same nodes")
+
+        fields = dict.fromkeys(
+            it.chain.from_iterable(cg.weights for cg in cgraphs))
+        weights = {
+            field: np.stack([
+                cg.weights.get(field, np.zeros(cg.adjacency.shape))
+                for cg in cgraphs])
+            for field in fields}
+
+        return cls(
+            nodes=nodes,
+            values=np.stack([cg.values for cg in cgraphs]),
+            adjacency=np.stack([cg.adjacency for cg in cgraphs]),
+            weights=weights)
+
+    def __repr__(self):
+        return (
+            f"<CompiledGraph nodes={list(self.nodes)} "
+            f"fields={list(self.weights)} shape={self.adjacency.shape}>")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _node_index(self, n):
+        try:
+            return self.index[n]
+        except KeyError as e:
+            raise NodeNotFoundError(n) from e
+
+    def get_node_value(self, n):
+        """Returns the value of the node (or the values if the graph is
+        stacked).
+
+        """
+        return self.values[..., self._node_index(n)]
+
+    def get_edge(self, frm, to, field):
+        """Returns the value of a field of an edge (or the values if the
+        graph is stacked).
+
+        """
+        frm, to = self._node_index(frm), self._node_index(to)
+        if not np.all(self.adjacency[..., frm, to]):
+            raise KeyError(f"No edge {self.nodes[frm]} -> {self.nodes[to]}")
+        return self.weights[field][..., frm, to]
+
+
+# =============================================================================
+# INTEGRATION KERNELS
+# =============================================================================
+
+def _time_grid(t_max, dt):
+    """Retrieve the time series of a model integrated from ``0`` to ``t_max``.
+
+    The values are exactly the same obtained by adding ``dt`` to ``0.`` until
+    ``t_max`` is reached or exceeded (the way the models was originally
+    integrated) but without the Python loop.
+
+    """
+    if dt <= 0:
+        raise ValueError(f"dt must be positive. Found {dt}")
+    n_guess = max(int(np.ceil(t_max / dt)), 0) + 2
+    ts = np.cumsum(np.append(0., np.full(n_guess, dt)))
+    n_steps = int(np.argmax(ts >= t_max))
+    return ts[:n_steps + 1]
+
+
+def _output_every(dt, output_dt):
+    """Number of integration steps between the rows of a result reported
+    every ``output_dt``.
+
+    """
+    if output_dt is None:
+        return 1
+    every = int(round(output_dt / dt))
+    if every < 1 or not np.isclose(every * dt, output_dt):
+        raise ValueError(
+            f"output_dt must be a multiple of dt. Found {output_dt}")
+    return every
+
+
+def _delayed(x, k, lag, offset=0):
+    """Value of the compartment ``x`` ``lag`` steps before the row ``k``.
+
+    Emulates ``x[-lag]`` over the ``k + offset`` already integrated values
+    (so a ``lag`` of 0 points to the initial value), and returns 0 if the
+    history is not long enough.
+
+    ``offset`` is the step of the row ``k`` minus ``k``, when ``x`` is a
+    window over the last integrated steps that keeps the initial value in
+    its row 0 (see ``_iter_integrate``).
+
+    """
+    if lag >= k + offset:
+        return 0.
+    return x[k - lag] if lag else x[0]
+
+
+def _sir_kernel(
+    I, C, R, *, prob_II, prob_IC, lag_IC, prob_CR, lag_CR,  # noqa
+    dt, population, minimum=min, maximum=max, start=1, offset=0
+):
+    for k in range(start, len(I)):
+        update_IC = _delayed(I, k, lag_IC, offset)
+        update_CR = _delayed(C, k, lag_CR, offset)
+
+        # (( I ))
+        n_I = (
+            minimum(I[k - 1] + I[k - 1] * prob_II * dt, population) -  # noqa
+            update_IC * prob_IC * dt)
+        I[k] = maximum(n_I, 0)
+
+        # (( C ))
+        n_C = (
+            minimum(C[k - 1] + update_IC * prob_IC * dt, population) -  # noqa
+            update_CR * prob_CR * dt)
+        C[k] = maximum(n_C, 0)
+
+        # (( R ))
+        n_R = minimum(R[k - 1] + update_CR * prob_CR * dt, population)
+        R[k] = maximum(n_R, 0)
+
+
+def _seir_kernel(
+    S, E, I, R, *, prob_SS, prob_EE, prob_EI, lag_EI,  # noqa
+    prob_IR, lag_IR, prob_II, dt, population, minimum=min, maximum=max,
+    start=1, offset=0
+):
+    for k in range(start, len(S)):
+        # (( S ))
+        dS = - S[k - 1] * (I[k - 1] / population) * prob_SS
+        S[k] = S[k - 1] + dS * dt
+
+        # (( E ))
+        dE = - dS - prob_EE * E[k - 1]
+        E[k] = E[k - 1] + dE * dt
+
+        # (( I ))
+        update_EI = _delayed(E, k, lag_EI, offset)
+        update_IR = _delayed(I, k, lag_IR, offset)
+
+        dI = prob_EI * update_EI - prob_IR * update_IR
+        dI = -dI   # porque ????
+        I[k] = minimum(I[k - 1] + dI * dt, population)
+
+        # (( R ))
+        dR = prob_II * I[k - 1]
+        R[k] = minimum(R[k - 1] + maximum(dR * dt, 0), population)
+
+
+def _seirf_kernel(
+    S, E, I, R, F, *, prob_SE, prob_EE, lag_EE, prob_EI, lag_EI,  # noqa
+    prob_II, lag_II, prob_IR, lag_IR, prob_IF, lag_IF,
+    dt, population, minimum=min, maximum=max, start=1, offset=0
+):
+    for k in range(start, len(S)):
+        # (( S ))
+        dS = - S[k - 1] * (I[k - 1] / population) * prob_SE
+        S[k] = S[k - 1] + dS * dt
+
+        # (( E ))
+        update_EE = _delayed(E, k, lag_EE, offset)
+        dE = - dS - prob_EE * update_EE
+        E[k] = E[k - 1] + dE * dt
+
+        # (( I ))
+        update_EI = _delayed(E, k, lag_EI, offset)
+        update_II = _delayed(I, k, lag_II, offset)
+        update_IR = _delayed(I, k, lag_IR, offset)
+
+        dI = (
+            prob_EI * update_EI +  # noqa
+            prob_II * update_II -  # noqa
+            prob_IR * update_IR)
+        I[k] = minimum(I[k - 1] + dI * dt, population)
+
+        # (( R ))
+        update_IF = _delayed(I, k, lag_IF, offset)
+
+        dR = prob_IR * update_IR - prob_IF * update_IF
+        R[k] = minimum(R[k - 1] + maximum(dR * dt, 0), population)
+
+        # (( F ))
+        F[k] = minimum(I[k - 1] + maximum(dR * dt, 0), population)
+
+
+# the same kernels compiled with numba: every run is integrated with its
+# own loop over scalars, so the runs don't need to share the lags. numba is
+# only imported when the first kernel runs, so importing arcovid19 doesn't
+# pay for it
+
+_JIT_FUNCTIONS = []
+
+_JIT_COMPILED = {}
+
+_JIT_LOCK = threading.Lock()
+
+
+def _compile_jit():
+    """Import numba and compile all the ``_jit`` functions.
+
+    The compiled functions replace the originals in the module, so the
+    kernels call the compiled helpers.
+
+    """
+    if not _JIT_COMPILED:
+        with _JIT_LOCK:
+            if not _JIT_COMPILED:
+                import numba
+
+                compiled = {}
+                for function in _JIT_FUNCTIONS:
+                    name = function.__name__
+                    compiled[name] = numba.njit(cache=True)(function)
+                    globals()[name] = compiled[name]
+                _JIT_COMPILED.update(compiled)
+    return _JIT_COMPILED
+
+
+def _jit(function):
+    _JIT_FUNCTIONS.append(function)
+
+    @functools.wraps(function)
+    def lazy(*args, **kwargs):
+        return _compile_jit()[function.__name__](*args, **kwargs)
+
+    lazy.py_func = function  # as the numba functions, for cache.code_salt
+    return lazy
+
+
+@_jit
+def _delayed_run(x, j, k, lag, offset):
+    if lag >= k + offset:
+        return 0.
+    return x[k - lag, j] if lag else x[0, j]
+
+
+@_jit
+def _sir_jit_kernel(
+    I, C, R, prob_II, prob_IC, lag_IC, prob_CR, lag_CR,  # noqa
+    dt, population, start, offset
+):
+    for j in range(I.shape[1]):
+        for k in range(start, I.shape[0]):
+            update_IC = _delayed_run(I, j, k, lag_IC[j], offset)
+            update_CR = _delayed_run(C, j, k, lag_CR[j], offset)
+
+            gain_I = min(I[k - 1, j] + I[k - 1, j] * prob_II[j] * dt,
+                         population[j])
+            I[k, j] = max(gain_I - update_IC * prob_IC[j] * dt, 0)
+
+            gain_C = min(C[k - 1, j] + update_IC * prob_IC[j] * dt,
+                         population[j])
+            C[k, j] = max(gain_C - update_CR * prob_CR[j] * dt, 0)
+
+            n_R = min(
+                R[k - 1, j] + update_CR * prob_CR[j] * dt, population[j])
+            R[k, j] = max(n_R, 0)
+
+
+@_jit
+def _seir_jit_kernel(
+    S, E, I, R, prob_SS, prob_EE, prob_EI, lag_EI,  # noqa
+    prob_IR, lag_IR, prob_II, dt, population, start, offset
+):
+    for j in range(S.shape[1]):
+        for k in range(start, S.shape[0]):
+            dS = - S[k - 1, j] * (I[k - 1, j] / population[j]) * prob_SS[j]
+            S[k, j] = S[k - 1, j] + dS * dt
+
+            dE = - dS - prob_EE[j] * E[k - 1, j]
+            E[k, j] = E[k - 1, j] + dE * dt
+
+            update_EI = _delayed_run(E, j, k, lag_EI[j], offset)
+            update_IR = _delayed_run(I, j, k, lag_IR[j], offset)
+
+            dI = prob_EI[j] * update_EI - prob_IR[j] * update_IR
+            dI = -dI
+            I[k, j] = min(I[k - 1, j] + dI * dt, population[j])
+
+            dR = prob_II[j] * I[k - 1, j]
+            R[k, j] = min(R[k - 1, j] + max(dR * dt, 0), population[j])
+
+
+@_jit
+def _seirf_jit_kernel(
+    S, E, I, R, F, prob_SE, prob_EE, lag_EE, prob_EI, lag_EI,  # noqa
+    prob_II, lag_II, prob_IR, lag_IR, prob_IF, lag_IF, dt, population,
+    start, offset
+):
+    for j in range(S.shape[1]):
+        for k in range(start, S.shape[0]):
+            dS = - S[k - 1, j] * (I[k - 1, j] / population[j]) * prob_SE[j]
+            S[k, j] = S[k - 1, j] + dS * dt
+
+            update_EE = _delayed_run(E, j, k, lag_EE[j], offset)
+            dE = - dS - prob_EE[j] * update_EE
+            E[k, j] = E[k - 1, j] + dE * dt
+
+            update_EI = _delayed_run(E, j, k, lag_EI[j], offset)
+            update_II = _delayed_run(I, j, k, lag_II[j], offset)
+            update_IR = _delayed_run(I, j, k, lag_IR[j], offset)
+
+            dI = (
+                prob_EI[j] * update_EI +  # noqa
+                prob_II[j] * update_II -  # noqa
+                prob_IR[j] * update_IR)
+            I[k, j] = min(I[k - 1, j] + dI * dt, population[j])
+
+            update_IF = _delayed_run(I, j, k, lag_IF[j], offset)
+
+            dR = prob_IR[j] * update_IR - prob_IF[j] * update_IF
+            R[k, j] = min(R[k - 1, j] + max(dR * dt, 0), population[j])
+
+            F[k, j] = min(I[k - 1, j] + max(dR * dt, 0), population[j])
+
+
+#: Relative to the population, how close to a bound a compartment is
+#: considered to be at the bound by the adaptive solvers.
+_BOUND_TOLERANCE = 1e-9
+
+
+def _bounded_rate(x, gain, loss, population, floor=True):
+    """Rate of change of a compartment updated by the kernels as
+    ``max(min(x + gain * dt, population) - loss * dt, 0)``, in the limit
+    of ``dt -> 0``.
+
+    Once the compartment reaches the population (or 0) it stays there
+    while the rate pushes it outside.
+
+    """
+    tolerance = _BOUND_TOLERANCE * population
+    rate = gain - loss
+    if x >= population - tolerance and rate > 0:
+        rate = 0.
+    if floor and x <= tolerance and rate < 0:
+        rate = 0.
+    return rate
+
+
+def _sir_rhs(
+    I, C, R, *, update_IC, update_CR,  # noqa
+    prob_II, prob_IC, prob_CR, population
+):
+    return (
+        _bounded_rate(I, I * prob_II, update_IC * prob_IC, population),
+        _bounded_rate(
+            C, update_IC * prob_IC, update_CR * prob_CR, population),
+        _bounded_rate(R, update_CR * prob_CR, 0., population))
+
+
+def _seir_rhs(
+    S, E, I, R, *, update_EI, update_IR,  # noqa
+    prob_SS, prob_EE, prob_EI, prob_IR, prob_II, population
+):
+    dS = - S * (I / population) * prob_SS
+    dE = - dS - prob_EE * E
+    dI = - (prob_EI * update_EI - prob_IR * update_IR)
+    dR = max(prob_II * I, 0.)
+    return (
+        dS, dE,
+        _bounded_rate(I, dI, 0., population, floor=False),
+        _bounded_rate(R, dR, 0., population, floor=False))
+
+
+def _seirf_rhs(
+    S, E, I, R, F, *, update_EE, update_EI, update_II, update_IR,  # noqa
+    update_IF, prob_SE, prob_EE, prob_EI, prob_II, prob_IR, prob_IF,
+    population
+):
+    dS = - S * (I / population) * prob_SE
+    dE = - dS - prob_EE * update_EE
+    dI = prob_EI * update_EI + prob_II * update_II - prob_IR * update_IR
+    dR = max(prob_IR * update_IR - prob_IF * update_IF, 0.)
+    return (
+        dS, dE,
+        _bounded_rate(I, dI, 0., population, floor=False),
+        _bounded_rate(R, dR, 0., population, floor=False),
+        0.)
+
+
+def _seirf_derived(series, population):
+    # the kernel updates F as min(I[k - 1] + dR * dt, population), that is
+    # just the infected in the limit of dt -> 0
+    series["F"][1:] = np.minimum(series["I"][1:], population)
+
+
+# =============================================================================
+# STREAMING QUANTILES
+# =============================================================================
+
+@attr.s(repr=False)
+class P2Quantiles:
+    """Streaming estimation of quantiles with the P² algorithm.
+
+    Estimates the quantiles of every element of an array of ``shape`` (for
+    example one per time step and compartment) from a stream of
+    observations of that array, using five markers per quantile and
+    element instead of keeping the observations.
+
+    With less than five observations the quantiles are exact.
+
+    Parameters
+    ----------
+    quantiles: sequence of float
+        Quantiles to estimate, between 0 and 1 (exclusive).
+    shape: tuple of int
+        Shape of every observation.
+
+    References
+    ----------
+
+    Jain, R., & Chlamtac, I. (1985). The P² algorithm for dynamic
+    calculation of quantiles and histograms without storing observations.
+    Communications of the ACM, 28(10), 1076-1085.
+
+    Example
+    -------
+
+    >>> agg = P2Quantiles([0.05, 0.5, 0.95], shape=(3,))
+    >>> agg.update_many(np.random.normal(size=(10000, 3)))
+    >>> agg.result().shape
+    (3, 3)
+
+    """
+
+    quantiles = attr.ib(converter=lambda q: np.asarray(q, dtype=float))
+    shape = attr.ib(converter=tuple)
+
+    count = attr.ib(init=False, default=0)
+    _heights = attr.ib(init=False)
+    _positions = attr.ib(init=False)
+    _increments = attr.ib(init=False)
+
+    @quantiles.validator
+    def _check_quantiles(self, attribute, value):
+        if value.ndim != 1 or not np.all((value > 0) & (value < 1)):
+            raise ValueError(
+                "quantiles must be a sequence of floats in (0, 1)")
+
+    def __attrs_post_init__(self):
+        # the markers of every quantile and element are the columns of
+        # (5, n_quantiles * size) arrays
+        size = int(np.prod(self.shape, dtype=int))
+        p = np.repeat(self.quantiles, size)
+        self._heights = np.empty((5, len(p)))
+        self._positions = np.tile(np.arange(1., 6.)[:, np.newaxis], len(p))
+        self._increments = np.vstack(
+            [np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)])
+
+    def __repr__(self):
+        return (
+            f"<P2Quantiles quantiles={list(self.quantiles)} "
+            f"shape={self.shape} count={self.count}>")
+
+    def update(self, x):
+        """Add one observation (an array of ``shape``)."""
+        x = np.tile(np.asarray(x, dtype=float).ravel(), len(self.quantiles))
+        q, n = self._heights, self._positions
+
+        if self.count < 5:
+            q[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                q.sort(axis=0)
+            return
+
+        # find the cell of x and move the extreme markers
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        n[1] += x < q[1]
+        n[2] += x < q[2]
+        n[3] += x < q[3]
+        n[4] += 1
+
+        self.count += 1
+
+        # adjust the heights of the middle markers
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in (1, 2, 3):
+                dn_right = n[i + 1] - n[i]
+                dn_left = n[i] - n[i - 1]
+                desired = 1 + (self.count - 1) * self._increments[i]
+                d = desired - n[i]
+                up = (d >= 1) & (dn_right > 1)
+                down = (d <= -1) & (dn_left > 1)
+                d = up.astype(float) - down
+                if not d.any():
+                    continue
+
+                slope_right = (q[i + 1] - q[i]) / dn_right
+                slope_left = (q[i] - q[i - 1]) / dn_left
+                parabolic = q[i] + d / (dn_right + dn_left) * (
+                    (dn_left + d) * slope_right +  # noqa
+                    (dn_right - d) * slope_left)
+                linear = q[i] + np.where(d > 0, slope_right, -slope_left)
+
+                inside = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+                q[i] = np.where(
+                    d == 0, q[i], np.where(inside, parabolic, linear))
+                n[i] += d
+
+    def update_many(self, xs):
+        """Add the observations stacked in the first axis of ``xs``."""
+        for x in xs:
+            self.update(x)
+
+    def result(self):
+        """The estimated quantiles, an array of shape
+        ``(len(quantiles),) + shape``.
+
+        """
+        if self.count == 0:
+            raise ValueError("No observations")
+        n_q = len(self.quantiles)
+        if self.count < 5:
+            size = self._heights.shape[1] // n_q
+            observations = self._heights[:self.count, :size]
+            bands = np.quantile(observations, self.quantiles, axis=0)
+        else:
+            bands = self._heights[2]
+        return bands.reshape((n_q,) + self.shape)
+
+
+def _bands_df(bands, compartments, quantiles, ts):
+    """Table of ``bands`` with shape ``(n_quantiles, n_steps + 1,
+    n_compartments)`` with columns indexed by compartment and quantile.
+
+    """
+    columns = pd.MultiIndex.from_product(
+        [list(compartments), quantiles], names=["compartment", "quantile"])
+    df = pd.DataFrame(
+        bands.transpose(1, 2, 0).reshape(len(ts), -1),
+        columns=columns, index=ts)
+    df.index.name = "ts"
+    return df
+
+
+# =============================================================================
+# STOP CONDITIONS
+# =============================================================================
+
+class StopCondition(metaclass=abc.ABCMeta):
+    """Base class of the conditions that stop the ``iter_*`` models before
+    ``t_max``.
+
+    Subclasses implement ``checker()``, that returns a new function
+    ``check(df)`` for every integration. ``check`` receives every chunk of
+    the model (a DataFrame indexed by time), in order, and returns the
+    position of the row of the chunk where the model must stop, or None to
+    continue.
+
+    """
+
+    @abc.abstractmethod
+    def checker(self):
+        pass
+
+
+@attr.s(frozen=True)
+class BelowThreshold(StopCondition):
+    """Stop when a compartment stays below ``threshold`` for ``days``
+    days.
+
+    The days are counted from the start of the model too, so the threshold
+    must be under the initial value to wait for the end of an outbreak.
+
+    """
+
+    compartment = attr.ib(default="I")
+    threshold = attr.ib(default=1.)
+    days = attr.ib(default=0.)
+
+    def checker(self):
+        since = None  # when the compartment went below the threshold
+
+        def check(df):
+            nonlocal since
+            ts = df.index.values
+            below = df[self.compartment].values < self.threshold
+
+            positions = np.arange(len(ts))
+            last_above = np.maximum.accumulate(np.where(below, -1, positions))
+            starts = np.where(
+                last_above >= 0,
+                ts[np.minimum(last_above + 1, len(ts) - 1)],
+                ts[0] if since is None else since)
+
+            done = below & (ts - starts >= self.days)
+            since = starts[-1] if below[-1] else None
+            return int(np.argmax(done)) if done.any() else None
+
+        return check
+
+
+@attr.s(frozen=True)
+class PeakPassed(StopCondition):
+    """Stop ``days`` days after the maximum of a compartment, if the
+    compartment is below that maximum.
+
+    """
+
+    compartment = attr.ib(default="I")
+    days = attr.ib(default=1.)
+
+    def checker(self):
+        peak, peak_t = -np.inf, np.nan  # the maximum so far and its time
+
+        def check(df):
+            nonlocal peak, peak_t
+            ts = df.index.values
+            values = df[self.compartment].values
+
+            running = np.maximum.accumulate(np.append(peak, values))
+            positions = np.arange(len(ts))
+            last_new = np.maximum.accumulate(
+                np.where(values > running[:-1], positions, -1))
+            peak_ts = np.where(
+                last_new >= 0, ts[np.maximum(last_new, 0)], peak_t)
+
+            done = (values < running[1:]) & (ts - peak_ts >= self.days)
+            peak, peak_t = running[-1], peak_ts[-1]
+            return int(np.argmax(done)) if done.any() else None
+
+        return check
+
 
 # =============================================================================
 # API
@@ -319,6 +1078,10 @@ class ModelResultPlotter(core.Plotter):
             If its true a all the area bellow the curve are filled with the
             same color of the curve with en alpha of ``0.1``. If fill is a
             float the value is interpreted as the alpha of the fill.
+            For results with quantiles (the columns are indexed by
+            compartment and quantile) the median is plotted as a line and
+            the band between the lowest and highest quantiles is always
+            filled (with an alpha of ``0.2`` by default).
         log : boolean, default=False
             if
         ax : matplotlib Axes, optional
@@ -347,12 +1110,16 @@ class ModelResultPlotter(core.Plotter):
 
         # our default values
         kwargs.setdefault("linewidth", 2)
-        kwargs.setdefault("sort", False)
-        kwargs.setdefault("dashes", False)
 
-        sns.lineplot(data=df, ax=ax, **kwargs)
+        if isinstance(df.columns, pd.MultiIndex):
+            alpha = 0.2 if isinstance(fill, bool) else fill
+            self._plot_bands(df, alpha=alpha, ax=ax, **kwargs)
+        else:
+            kwargs.setdefault("sort", False)
+            kwargs.setdefault("dashes", False)
+            sns.lineplot(data=df, ax=ax, **kwargs)
 
-        if fill:
+        if fill and not isinstance(df.columns, pd.MultiIndex):
             alpha = 0.1 if isinstance(fill, bool) else fill
             for line in ax.lines[:len(df.columns)]:
                 color = line.get_color()
@@ -370,6 +1137,20 @@ class ModelResultPlotter(core.Plotter):
 
         return ax
 
+    def _plot_bands(self, df, alpha, ax, **kwargs):
+        compartments = df.columns.get_level_values(0).unique()
+        for compartment in compartments:
+            bands = df[compartment]
+            quantiles = bands.columns.values
+            median = quantiles[np.argmin(np.abs(quantiles - 0.5))]
+
+            line, = ax.plot(
+                bands.index, bands[median], label=compartment, **kwargs)
+            ax.fill_between(
+                bands.index, bands[quantiles.min()], bands[quantiles.max()],
+                color=line.get_color(), alpha=alpha)
+        ax.legend()
+
 
 class ModelResultFrame(core.Frame):
     """Wrapper around the model results table..
@@ -382,6 +1163,79 @@ class ModelResultFrame(core.Frame):
     plot_cls = ModelResultPlotter
 
 
+class ModelSweepPlotter(core.Plotter):
+    default_plot_name_method = "infection_curve"
+
+    def infection_curve(self, only=None, log=False, ax=None, **kwargs):
+        """Plots the infection curve of every run of the sweep.
+
+        Parameters
+        ----------
+        only : list, optional
+            List of subset of columns of the models to be plotted.
+        log : boolean, default=False
+            If its true the y axis is in log scale.
+        ax : matplotlib Axes, optional
+            Axes object to draw the plot onto, otherwise uses the current Axes.
+        kwargs : key, value mappings
+            Other keyword arguments are passed down to
+            :meth:`seaborn.lineplot`.
+
+        Returns
+        -------
+        ax : matplotlib Axes
+            Returns the Axes object with the plot drawn onto it.
+
+        """
+        df = self.frame.df
+        if only is not None:
+            df = df[only]
+
+        if ax is None:
+            ax = plt.gca()
+
+        if log:
+            ax.set(yscale="log")
+            ax.yaxis.set_major_formatter(
+                ticker.FuncFormatter(lambda y, _: '{:g}'.format(y)))
+
+        # our default values
+        kwargs.setdefault("linewidth", 1)
+        kwargs.setdefault("alpha", 0.5)
+
+        data = df.reset_index().melt(
+            id_vars=["run", "ts"], var_name="compartment", value_name="N")
+        sns.lineplot(
+            data=data, x="ts", y="N", hue="compartment",
+            units="run", estimator=None, ax=ax, **kwargs)
+
+        ax.set_xlabel('Time [days]')
+        ax.set_ylabel('Number infected')
+
+        mname = self.frame.model_name
+        n_runs = len(self.frame.params)
+        ax.set_title(f"Infection curve - Model: {mname} - Runs: {n_runs}")
+
+        return ax
+
+
+class ModelSweepFrame(core.Frame):
+    """Wrapper around the results of a parameter sweep.
+
+    The table is indexed by the id of the run and the time, and the
+    parameters of every run are stored in ``instance.params``.
+
+    """
+    plot_cls = ModelSweepPlotter
+
+    def run(self, run_id):
+        """Retrieve the result of a single run as a ``ModelResultFrame``."""
+        df = self.df.loc[run_id]
+        extra = self.params.loc[run_id].to_dict()
+        extra["model_name"] = self.model_name
+        return ModelResultFrame(df=df, extra=extra)
+
+
 @attr.s(frozen=True)
 class InfectionCurve:
     """MArce documentame me siento sola.
@@ -449,28 +1303,8 @@ class InfectionCurve:
     sigma: float = attr.ib(default=1.1)
     gamma: float = attr.ib(default=1.1)
 
-    def do_SIR(self, t_max=200, dt=1.):
-        """This function implements a SIR model without vital dynamics
-        under the assumption of a closed population.
-
-        Recovered individuals become immune for ever.
-        In this model exposed individuals become instantly infectious,
-        i.e., there is no latency period like in the SEIR model.
-
-        Parameters
-        ----------
-        t_max: int (default=200)
-            Time range [days].
-        dt: float (default=1.)
-            Time step [days].
-
-        Returns
-        -------
-           value: Time series for S, I and R
-
-        """
-        dt = float(dt)
-
+    # graphs ----------------------------------------------
+    def _SIR_graph(self, dt):
         g = Graph()
 
         for node in ['I', 'C', 'R', 'H', 'B', 'U', 'D']:
@@ -478,12 +1312,6 @@ class InfectionCurve:
 
         g.set_node('I', self.N_init)
 
-        # cumulative time series
-        I = [g.get_node_value('I')]  # noqa Infected
-        C = [g.get_node_value('C')]  # Confirmed
-        R = [g.get_node_value('R')]  # Recovered
-
-        ts = [0.]  # time series
         nms = ['prob', 'lag']
 
         # En este modelo todos los infectados se confirman a los 10
@@ -497,53 +1325,138 @@ class InfectionCurve:
         g.add_edge('I', 'C', nms, [f_IC, T_IC])
         g.add_edge('C', 'R', nms, [f_CR, T_CR])
 
-        t, time_steps = 0., 0
-        while t < t_max:
+        return g
 
-            time_steps = time_steps + 1
+    def _SEIR_graph(self, dt):
+        g = Graph()
 
-            t = t + dt
-            ts.append(t)
+        for node in ['S', 'E', 'I', 'R']:
+            g.add_node(node, 0)
 
-            # (( I ))
-            prob_II = g.get_edge('I', 'I', 'prob')
+        g.set_node('S', self.population)
+        g.set_node('E', 0)
+        g.set_node('I', self.N_init)
+        g.set_node('R', 0)
 
-            prob_IC = g.get_edge('I', 'C', 'prob')
-            lag_IC = g.get_edge('I', 'C', 'lag')
-            update_IC = I[-lag_IC] if lag_IC < len(I) else 0.
+        nms = ['prob', 'lag']
 
-            n_I = (
-                min(I[-1] + I[-1] * prob_II * dt, self.population) - # noqa
-                update_IC * prob_IC * dt)
-            n_I = max(n_I, 0)
+        g.add_edge('S', 'S', nms, [0.1, 2])
+        g.add_edge('E', 'E', nms, [0.4, 21])
+        g.add_edge('I', 'I', nms, [0.1, 2])
 
-            I.append(n_I)
+        g.add_edge('S', 'E', nms, [1.2, 1])
+        g.add_edge('E', 'I', nms, [0.1, 14])  # [, tiempo de incubacion]
+        g.add_edge('I', 'R', nms, [0.7, 2])  # [, tiempo de recuperacion]
+
+        return g
+
+    def _SEIRF_graph(self, dt):
+        g = Graph()
+
+        for node in ['S', 'E', 'I', 'R', 'F']:
+            g.add_node(node, 0)
 
-            # (( C ))
-            prob_CR = g.get_edge('C', 'R', 'prob')
-            lag_CR = g.get_edge('C', 'R', 'lag')
-            update_CR = C[-lag_CR] if lag_CR < len(C) else 0.
+        g.set_node('S', self.population)
+        g.set_node('E', 0)
+        g.set_node('I', self.N_init)
+        g.set_node('R', 0)
+        g.set_node('F', 0)
 
-            n_C = (
-                min(C[-1] + update_IC * prob_IC * dt, self.population) -  # noqa
-                update_CR * prob_CR * dt)
-            n_C = max(n_C, 0)
-            C.append(n_C)
+        nms = ['prob', 'lag']
+
+        g.add_edge('S', 'E', nms, [0.2, 0])
+        g.add_edge('E', 'E', nms, [0.1, 0])
+        g.add_edge('E', 'I', nms, [0.7, 14])
+        g.add_edge('I', 'I', nms, [1.2, 14])
+        g.add_edge('I', 'R', nms, [0.98, 30])
+        g.add_edge('I', 'F', nms, [0.02, 30])
 
-            # (( R ))
-            # recuperados nuevos
-            n_R = min(R[-1] + update_CR * prob_CR * dt, self.population)
-            n_R = max(n_R, 0)
-            R.append(n_R)
+        return g
 
+    # models ----------------------------------------------
+    def _do(
+        self, model_name, t_max, dt, solver="euler", solver_options=None,
+        output_dt=None, force=False
+    ):
+        if solver not in SOLVERS:
+            raise ValueError(
+                f"solver must be one of {SOLVERS}. Found {solver!r}")
+
+        spec = _MODELS[model_name]
+        values = cache.from_cache(
+            tag=f"models.InfectionCurve.do_{model_name}",
+            function=_run_model,
+            force=force,
+            salt=_model_salt(model_name),
+            model_name=model_name,
+            params=tuple(attr.asdict(self).items()),
+            t_max=t_max,
+            dt=float(dt),
+            solver=solver,
+            solver_options=tuple(sorted((solver_options or {}).items())),
+            output_dt=output_dt)
+
+        # the cached values can be shared with other calls
         df = pd.DataFrame(
-            {'ts': ts, 'I': I, 'C': C, 'R': R}).set_index("ts")
+            values[:, 1:], columns=spec.compartments,
+            index=pd.Index(values[:, 0], name="ts"), copy=True)
 
         extra = attr.asdict(self)
-        extra["model_name"] = "SIR"
+        extra["model_name"] = model_name
+        extra["solver"] = solver
         return ModelResultFrame(df=df, extra=extra)
 
-    def do_SEIR(self, t_max=200, dt=1.):
+    def do_SIR(
+        self, t_max=200, dt=1., *, solver="euler", solver_options=None,
+        output_dt=None, force=False
+    ):
+        """This function implements a SIR model without vital dynamics
+        under the assumption of a closed population.
+
+        Recovered individuals become immune for ever.
+        In this model exposed individuals become instantly infectious,
+        i.e., there is no latency period like in the SEIR model.
+
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        solver: str (default="euler")
+            "euler" integrates with fixed steps of ``dt``. The other
+            ``SOLVERS`` are the adaptive methods of
+            ``scipy.integrate.solve_ivp`` and the result is sampled every
+            ``dt``. They take the delays of the model as ``lag * dt`` days
+            and have no step error, so they only agree with "euler" for a
+            small ``dt``: with the default ``dt=1.`` the results differ by
+            up to the whole population, and by a few percent with
+            ``dt=0.01``.
+        solver_options: dict, optional
+            Extra arguments for ``solve_ivp`` (``DEFAULT_SOLVER_OPTIONS``
+            by default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``). With "euler" the
+            steps in between are not kept, so the memory is bounded by
+            the longest lag and ``STREAM_CHUNK_SIZE`` steps.
+        force: bool (default=False)
+            The results are cached by the parameters of the curve and of
+            the model. If it's True the model is integrated again.
+
+        Returns
+        -------
+           value: Time series for S, I and R
+
+        """
+        return self._do(
+            "SIR", t_max=t_max, dt=dt, solver=solver,
+            solver_options=solver_options, output_dt=output_dt, force=force)
+
+    def do_SEIR(
+        self, t_max=200, dt=1., *, solver="euler", solver_options=None,
+        output_dt=None, force=False
+    ):
         """This function implements a SEIR model without vital dynamics
         under the assumption of a closed population.
         Recovered individuals become immune for ever.
@@ -555,6 +1468,26 @@ class InfectionCurve:
             Time range [days].
         dt: float (default=1.)
             Time step [days].
+        solver: str (default="euler")
+            "euler" integrates with fixed steps of ``dt``. The other
+            ``SOLVERS`` are the adaptive methods of
+            ``scipy.integrate.solve_ivp`` and the result is sampled every
+            ``dt``. They take the delays of the model as ``lag * dt`` days
+            and have no step error, so they only agree with "euler" for a
+            small ``dt``: with the default ``dt=1.`` the results differ by
+            up to the whole population, and by a few percent with
+            ``dt=0.01``.
+        solver_options: dict, optional
+            Extra arguments for ``solve_ivp`` (``DEFAULT_SOLVER_OPTIONS``
+            by default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``). With "euler" the
+            steps in between are not kept, so the memory is bounded by
+            the longest lag and ``STREAM_CHUNK_SIZE`` steps.
+        force: bool (default=False)
+            The results are cached by the parameters of the curve and of
+            the model. If it's True the model is integrated again.
 
         Returns
         -------
@@ -562,91 +1495,1106 @@ class InfectionCurve:
 
 
         """
-        dt = float(dt)
-        g = Graph()
+        return self._do(
+            "SEIR", t_max=t_max, dt=dt, solver=solver,
+            solver_options=solver_options, output_dt=output_dt, force=force)
 
-        for node in ['S', 'E', 'I', 'R']:
-            g.add_node(node, 0)
+    def do_SEIRF(
+        self, t_max=200, dt=1., *, solver="euler", solver_options=None,
+        output_dt=None, force=False
+    ):
+        """Documentame MARCE
 
-        g.set_node('S', self.population)
-        g.set_node('E', 0)
-        g.set_node('I', self.N_init)
-        g.set_node('R', 0)
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        solver: str (default="euler")
+            "euler" integrates with fixed steps of ``dt``. The other
+            ``SOLVERS`` are the adaptive methods of
+            ``scipy.integrate.solve_ivp`` and the result is sampled every
+            ``dt``. They take the delays of the model as ``lag * dt`` days
+            and have no step error, so they only agree with "euler" for a
+            small ``dt``: with the default ``dt=1.`` the results differ by
+            up to the whole population, and by a few percent with
+            ``dt=0.01``.
+        solver_options: dict, optional
+            Extra arguments for ``solve_ivp`` (``DEFAULT_SOLVER_OPTIONS``
+            by default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``). With "euler" the
+            steps in between are not kept, so the memory is bounded by
+            the longest lag and ``STREAM_CHUNK_SIZE`` steps.
+        force: bool (default=False)
+            The results are cached by the parameters of the curve and of
+            the model. If it's True the model is integrated again.
 
-        # cumulative time series
-        S = [g.get_node_value('S')]  # Susceptible
-        E = [g.get_node_value('E')]  # Exposed
-        I = [g.get_node_value('I')]  # noqa Infected
-        R = [g.get_node_value('R')]  # Recovered
+        Returns
+        -------
+           value: Time series for S, E, I, R and F
 
-        ts = [0.]  # time series
-        nms = ['prob', 'lag']
+        """
+        return self._do(
+            "SEIRF", t_max=t_max, dt=dt, solver=solver,
+            solver_options=solver_options, output_dt=output_dt, force=force)
 
-        g.add_edge('S', 'S', nms, [0.1, 2])
-        g.add_edge('E', 'E', nms, [0.4, 21])
-        g.add_edge('I', 'I', nms, [0.1, 2])
+    def _iter(self, model_name, t_max, dt, stop, chunk_size, output_dt):
+        dt = float(dt)
+        spec = _MODELS[model_name]
+        every = _output_every(dt, output_dt)
+
+        if isinstance(stop, StopCondition):
+            stop = [stop]
+        checks = [condition.checker() for condition in stop or ()]
+
+        ts = _time_grid(t_max, dt)
+        n_steps, ts = len(ts), ts[::every]
+
+        rows = _iter_rows(spec, [self], n_steps, dt, every, chunk_size)
+        for row, chunk in rows:
+            index = ts[row:row + len(chunk[spec.compartments[0]])]
+            df = pd.DataFrame(
+                {c: chunk[c][:, 0] for c in spec.compartments},
+                index=pd.Index(index, name="ts"))
+
+            positions = [check(df) for check in checks]
+            positions = [pos for pos in positions if pos is not None]
+            if positions:
+                yield df.iloc[:min(positions) + 1]
+                return
+            yield df
+
+    def iter_SIR(
+        self, t_max=200, dt=1., *, stop=None, chunk_size=None,
+        output_dt=None
+    ):
+        """Integrate the SIR model (see ``do_SIR``) chunk by chunk.
 
-        g.add_edge('S', 'E', nms, [1.2, 1])
-        g.add_edge('E', 'I', nms, [0.1, 14])  # [, tiempo de incubacion]
-        g.add_edge('I', 'R', nms, [0.7, 2])  # [, tiempo de recuperacion]
+        Only the history needed by the lags of the model is kept in
+        memory, and the integration can be stopped before ``t_max`` with
+        ``stop`` or by not consuming more chunks.
+
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Maximum time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        stop: StopCondition or list of StopCondition, optional
+            The model stops at the first row where any of the conditions
+            is met (the row is included in the last chunk).
+        chunk_size: int, optional
+            Steps integrated for every chunk (``STREAM_CHUNK_SIZE`` by
+            default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``).
+
+        Yields
+        ------
+           chunk: DataFrame indexed by time with the values of
+           I, C and R. The first chunk has only the initial values.
 
-        t, time_steps = 0., 0
-        while t < t_max:
+        Example
+        -------
 
-            time_steps = time_steps + 1
+        >>> curve = InfectionCurve()
+        >>> chunks = curve.iter_SIR(stop=BelowThreshold("I", 1., days=7))
+        >>> df = pd.concat(chunks)
 
-            t = t + dt
-            ts.append(t)
+        """
+        return self._iter(
+            "SIR", t_max=t_max, dt=dt, stop=stop,
+            chunk_size=chunk_size, output_dt=output_dt)
 
-            # (( S ))
-            prob_SS = g.get_edge('S', 'S', 'prob')  # beta
+    def iter_SEIR(
+        self, t_max=200, dt=1., *, stop=None, chunk_size=None,
+        output_dt=None
+    ):
+        """Integrate the SEIR model (see ``do_SEIR``) chunk by chunk.
 
-            dS = - S[-1] * (I[-1] / self.population) * prob_SS
+        Only the history needed by the lags of the model is kept in
+        memory, and the integration can be stopped before ``t_max`` with
+        ``stop`` or by not consuming more chunks.
 
-            # n_S = min(S[-1] + min(dS * dt, 0), self.population)
-            n_S = S[-1] + dS * dt
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Maximum time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        stop: StopCondition or list of StopCondition, optional
+            The model stops at the first row where any of the conditions
+            is met (the row is included in the last chunk).
+        chunk_size: int, optional
+            Steps integrated for every chunk (``STREAM_CHUNK_SIZE`` by
+            default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``).
+
+        Yields
+        ------
+           chunk: DataFrame indexed by time with the values of
+           S, E, I and R. The first chunk has only the initial values.
 
-            # (( E ))
-            prob_EE = g.get_edge('E', 'E', 'prob')
-            dE = - dS - prob_EE * E[-1]
+        """
+        return self._iter(
+            "SEIR", t_max=t_max, dt=dt, stop=stop,
+            chunk_size=chunk_size, output_dt=output_dt)
 
-            # n_E = min(E[-1] + max(dE * dt, 0), self.population)
-            n_E = E[-1] + dE * dt
+    def iter_SEIRF(
+        self, t_max=200, dt=1., *, stop=None, chunk_size=None,
+        output_dt=None
+    ):
+        """Integrate the SEIRF model (see ``do_SEIRF``) chunk by chunk.
 
-            # (( I ))
-            prob_EI = g.get_edge('E', 'I', 'prob')
-            lag_EI = g.get_edge('E', 'I', 'lag')
-            update_EI = E[-lag_EI] if lag_EI < len(E) else 0.
+        Only the history needed by the lags of the model is kept in
+        memory, and the integration can be stopped before ``t_max`` with
+        ``stop`` or by not consuming more chunks.
 
-            prob_IR = g.get_edge('I', 'R', 'prob')
-            lag_IR = g.get_edge('I', 'R', 'lag')
-            update_IR = I[-lag_IR] if lag_IR < len(I) else 0.
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Maximum time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        stop: StopCondition or list of StopCondition, optional
+            The model stops at the first row where any of the conditions
+            is met (the row is included in the last chunk).
+        chunk_size: int, optional
+            Steps integrated for every chunk (``STREAM_CHUNK_SIZE`` by
+            default).
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt`` (it must be a multiple of ``dt``).
+
+        Yields
+        ------
+           chunk: DataFrame indexed by time with the values of
+           S, E, I, R and F. The first chunk has only the initial values.
 
-            prob_II = g.get_edge('I', 'I', 'prob')
+        """
+        return self._iter(
+            "SEIRF", t_max=t_max, dt=dt, stop=stop,
+            chunk_size=chunk_size, output_dt=output_dt)
+
+    def sweep(
+        self, param_grid, model="SIR", t_max=200, dt=1., quantiles=None,
+        n_jobs=1, chunk_size=None, progress=None, cancel=None,
+        output_dt=None
+    ):
+        """Run a model for many combinations of parameters at once.
 
-            dI = prob_EI * update_EI - prob_IR * update_IR
-            dI = -dI   # porque ????
-            n_I = min(I[-1] + dI * dt, self.population)
+        Every run is a copy of this curve with some parameters replaced,
+        and all the runs are integrated together over arrays with one
+        column per run.
 
-            # (( R ))
-            prob_II = g.get_edge('I', 'I', 'prob')
-            dR = prob_II * I[-1]
-            n_R = min(R[-1] + max(dR * dt, 0), self.population)
+        Big sweeps can be split in chunks of runs and distributed over a
+        pool of processes with ``n_jobs``. Every worker receives only the
+        values of the swept parameters of its chunk, and the results are
+        always returned in the order of the grid.
 
-            S.append(n_S)
-            E.append(n_E)
-            I.append(n_I)
-            R.append(n_R)
+        Parameters
+        ----------
+        param_grid: dict or list of dicts
+            Maps parameters of the curve to sequences of values. The runs
+            are every combination of the values (as in
+            ``sklearn.model_selection.ParameterGrid``). If it's a list of
+            dicts the runs of every grid are concatenated.
+        model: str (default="SIR")
+            The name of the model to run ("SIR", "SEIR" or "SEIRF").
+        t_max: int (default=200)
+            Time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        quantiles: sequence of float, optional
+            If it's given, only these quantiles of all the runs are returned
+            for every time step. They are estimated chunk by chunk with
+            ``P2Quantiles``, so the runs are never kept in memory.
+        n_jobs: int (default=1)
+            Number of processes used to integrate the chunks. ``1`` runs
+            everything in the current process, and ``-1`` or ``None`` uses
+            all the available cores.
+        chunk_size: int, optional
+            Maximum number of runs integrated together. By default the
+            runs are split in four chunks per job.
+        progress: callable, optional
+            Called as ``progress(done, total)`` with the number of
+            integrated runs every time a chunk is finished.
+        cancel: threading.Event, optional
+            If the event is set the chunks not started are cancelled and
+            a ``SweepCancelledError`` is raised.
+        output_dt: float, optional
+            Report the result every ``output_dt`` days instead of every
+            ``dt``, without keeping the steps in between (it must be a
+            multiple of ``dt``).
 
+        Returns
+        -------
+        ModelSweepFrame:
+            The time series of every run indexed by run id and time, and
+            the parameters of every run in the ``params`` table. With
+            ``quantiles`` a ``ModelResultFrame`` with the columns indexed by
+            compartment and quantile.
+
+        Example
+        -------
+
+        >>> curve = InfectionCurve()
+        >>> sweep = curve.sweep({"R": [1.1, 1.2], "N_init": [10, 100]})
+        >>> sweep.params[["R", "N_init"]]
+               R  N_init
+        run
+        0    1.1      10
+        1    1.1     100
+        2    1.2      10
+        3    1.2     100
+
+        """
+        dt = float(dt)
+        spec = _MODELS[model]
+        every = _output_every(dt, output_dt)
+
+        base = attr.asdict(self)
+        runs = list(_expand_grid(param_grid))
+        n_runs = len(runs)
+
+        swept = dict.fromkeys(it.chain.from_iterable(runs))
+        fields = attr.fields_dict(type(self))
+        for name in swept:
+            if name not in fields:
+                raise ValueError(
+                    f"Unknown parameter {name!r} in param_grid. "
+                    f"Options: {', '.join(fields)}")
+        columns = {
+            name: np.array([run.get(name, base[name]) for run in runs])
+            for name in swept}
+        for name in columns:
+            del base[name]
+
+        ts = _time_grid(t_max, dt)[::every]
+        params = pd.DataFrame(
+            {
+                name: columns[name] if name in columns else base[name]
+                for name in fields},
+            index=pd.RangeIndex(n_runs, name="run"))
+
+        extra = {
+            "model_name": model, "params": params, "t_max": t_max, "dt": dt,
+            "output_dt": output_dt}
+
+        if quantiles is not None:
+            quantiles = np.asarray(quantiles, dtype=float)
+            bands = _run_sweep(
+                model=model, base=base, columns=columns, n_runs=n_runs,
+                t_max=t_max, dt=dt, every=every, n_jobs=n_jobs,
+                chunk_size=chunk_size, progress=progress, cancel=cancel,
+                quantiles=quantiles)
+            df = _bands_df(bands, spec.compartments, quantiles, ts)
+            populations = params.population.unique()
+            extra["population"] = (
+                populations[0] if len(populations) == 1
+                else tuple(populations))
+            return ModelResultFrame(df=df, extra=extra)
+
+        series = _run_sweep(
+            model=model, base=base, columns=columns, n_runs=n_runs,
+            t_max=t_max, dt=dt, every=every, n_jobs=n_jobs,
+            chunk_size=chunk_size, progress=progress, cancel=cancel)
+
+        index = pd.MultiIndex.from_product(
+            [range(n_runs), ts], names=["run", "ts"])
         df = pd.DataFrame(
-            {'ts': ts, 'S': S, 'E': E, 'I': I, 'R': R}).set_index("ts")
+            {c: s.T.ravel() for c, s in zip(spec.compartments, series)},
+            index=index)
+
+        return ModelSweepFrame(df=df, extra=extra)
+
+    def stochastic_SIR(
+        self, t_max=200, dt=1., n_realizations=1000,
+        quantiles=(0.05, 0.5, 0.95), method="auto", seed=None,
+        streaming=False, n_jobs=1, chunk_size=1000,
+        progress=None, cancel=None
+    ):
+        """Simulate many realizations of a stochastic SIR model.
+
+        The infection rate is ``beta * S * I / population`` with
+        ``beta = R / t_infectious`` and the recovery rate is ``gamma * I``
+        with ``gamma = 1 / t_infectious``.
+
+        With "tau-leaping" the number of infections and recoveries of every
+        step of size ``dt`` are drawn from binomial distributions. With
+        "gillespie" every event is simulated (exact, but the cost grows with
+        the population) and ``dt`` is only the sampling of the result.
+        "auto" uses "gillespie" for populations up to
+        ``GILLESPIE_MAX_POPULATION``.
+
+        The realizations are simulated at once over arrays, in chunks of
+        ``chunk_size`` that can be distributed in a pool of ``n_jobs``
+        processes. Every chunk uses an independent stream of random
+        numbers spawned from ``seed``.
+
+        Parameters
+        ----------
+        t_max: int (default=200)
+            Time range [days].
+        dt: float (default=1.)
+            Time step [days].
+        n_realizations: int (default=1000)
+            Number of realizations.
+        quantiles: sequence of float (default=(0.05, 0.5, 0.95))
+            Quantiles of the realizations in the result.
+        method: str (default="auto")
+            "auto", "tau-leaping" or "gillespie".
+        seed: int or numpy.random.SeedSequence, optional
+            Seed of the random streams.
+        streaming: bool (default=False)
+            If it's true the quantiles are estimated chunk by chunk with
+            ``P2Quantiles``, so the memory doesn't grow with the number of
+            realizations. Otherwise all the realizations are kept and the
+            quantiles are exact.
+        n_jobs: int (default=1)
+            Number of processes. ``-1`` or ``None`` uses all the CPUs.
+        chunk_size: int (default=1000)
+            Number of realizations simulated together.
+        progress: callable, optional
+            Called as ``progress(done, total)`` after every chunk.
+        cancel: threading.Event, optional
+            If it's set the simulation stops and a ``SweepCancelledError``
+            is raised.
+
+        Returns
+        -------
+            ModelResultFrame: The quantiles of the realizations. The
+            columns are indexed by compartment and quantile.
+
+        Example
+        -------
+
+        >>> curve = arcovid19.load_infection_curve(population=1000)
+        >>> result = curve.stochastic_SIR(n_realizations=500, seed=42)
+        >>> result.df["I"].columns
+        Float64Index([0.05, 0.5, 0.95], dtype='float64', name='quantile')
+
+        """
+        if method not in STOCHASTIC_METHODS:
+            raise ValueError(
+                f"method must be one of {STOCHASTIC_METHODS}. "
+                f"Found {method!r}")
+        if method == "auto":
+            method = (
+                "gillespie" if self.population <= GILLESPIE_MAX_POPULATION
+                else "tau-leaping")
+
+        dt = float(dt)
+        ts = _time_grid(t_max, dt)
+        params = {
+            "S0": self.population - self.N_init,
+            "I0": self.N_init,
+            "beta": self.R / self.t_infectious,
+            "gamma": 1. / self.t_infectious,
+            "population": self.population}
+
+        quantiles = np.asarray(quantiles, dtype=float)
+        bands = _run_stochastic(
+            method=method, params=params, n_realizations=n_realizations,
+            ts=ts, dt=dt, seed=seed, quantiles=quantiles,
+            streaming=streaming, n_jobs=n_jobs, chunk_size=chunk_size,
+            progress=progress, cancel=cancel)
+
+        df = _bands_df(bands, ["S", "I", "R"], quantiles, ts)
 
         extra = attr.asdict(self)
-        extra["model_name"] = "SEIR"
+        extra.update(
+            model_name="stochastic_SIR", method=method,
+            n_realizations=n_realizations, t_max=t_max, dt=dt)
         return ModelResultFrame(df=df, extra=extra)
 
-    def do_SEIRF(self, t_max=200, dt=1.):
-        """Documentame MARCE
+
+# =============================================================================
+# MODELS REGISTRY
+# =============================================================================
+
+@attr.s(frozen=True)
+class _ModelSpec:
+    """How to integrate a model.
+
+    The kernel integrates the ``compartments`` (with the initial values
+    taken from the nodes of the graph) using as parameters the edge fields
+    mapped in ``edges``.
+
+    ``rhs`` are the derivatives of the compartments in continuous time,
+    used by the adaptive solvers, ``derived`` computes the compartments
+    that are not integrated, and ``capped`` and ``floored`` are the
+    compartments that the kernel keeps under the population and over 0.
+
+    ``jit_kernel`` is the same kernel compiled with numba, that takes
+    arrays with one value per run for every parameter.
+
+    """
+
+    graph = attr.ib()
+    kernel = attr.ib()
+    compartments = attr.ib()
+    edges = attr.ib()
+    rhs = attr.ib()
+    derived = attr.ib(default=None)
+    capped = attr.ib(default=())
+    floored = attr.ib(default=())
+    jit_kernel = attr.ib(default=None)
+
+
+_MODELS = {
+    "SIR": _ModelSpec(
+        graph=InfectionCurve._SIR_graph,
+        kernel=_sir_kernel,
+        jit_kernel=_sir_jit_kernel,
+        rhs=_sir_rhs,
+        capped=('I', 'C', 'R'),
+        floored=('I', 'C', 'R'),
+        compartments=['I', 'C', 'R'],
+        edges={
+            "prob_II": ('I', 'I', 'prob'),
+            "prob_IC": ('I', 'C', 'prob'),
+            "lag_IC": ('I', 'C', 'lag'),
+            "prob_CR": ('C', 'R', 'prob'),
+            "lag_CR": ('C', 'R', 'lag')}),
+    "SEIR": _ModelSpec(
+        graph=InfectionCurve._SEIR_graph,
+        kernel=_seir_kernel,
+        jit_kernel=_seir_jit_kernel,
+        rhs=_seir_rhs,
+        capped=('I', 'R'),
+        compartments=['S', 'E', 'I', 'R'],
+        edges={
+            "prob_SS": ('S', 'S', 'prob'),  # beta
+            "prob_EE": ('E', 'E', 'prob'),
+            "prob_EI": ('E', 'I', 'prob'),
+            "lag_EI": ('E', 'I', 'lag'),
+            "prob_IR": ('I', 'R', 'prob'),
+            "lag_IR": ('I', 'R', 'lag'),
+            "prob_II": ('I', 'I', 'prob')}),
+    "SEIRF": _ModelSpec(
+        graph=InfectionCurve._SEIRF_graph,
+        kernel=_seirf_kernel,
+        jit_kernel=_seirf_jit_kernel,
+        rhs=_seirf_rhs,
+        capped=('I', 'R'),
+        derived=_seirf_derived,
+        compartments=['S', 'E', 'I', 'R', 'F'],
+        edges={
+            "prob_SE": ('S', 'E', 'prob'),  # beta
+            "prob_EE": ('E', 'E', 'prob'),
+            "lag_EE": ('E', 'E', 'lag'),
+            "prob_EI": ('E', 'I', 'prob'),
+            "lag_EI": ('E', 'I', 'lag'),
+            "prob_II": ('I', 'I', 'prob'),
+            "lag_II": ('I', 'I', 'lag'),
+            "prob_IR": ('I', 'R', 'prob'),
+            "lag_IR": ('I', 'R', 'lag'),
+            "prob_IF": ('I', 'F', 'prob'),
+            "lag_IF": ('I', 'F', 'lag')}),
+}
+
+
+def _run_model(
+    *, model_name, params, t_max, dt, solver, solver_options, output_dt,
+    salt=None
+):
+    """Integrate a model of the curve with the parameters ``params`` (the
+    items of ``attr.asdict(curve)``).
+
+    Returns an array with the time in the first column and a column for
+    every compartment: the compact form in which ``do_*`` caches the
+    results. ``salt`` is not used, it's only part of the cache key.
+
+    """
+    curve = InfectionCurve(**dict(params))
+    spec = _MODELS[model_name]
+    every = _output_every(dt, output_dt)
+
+    ts = _time_grid(t_max, dt)
+    if solver == "euler":
+        series = _integrate(spec, [curve], ts, dt, every=every)
+        series = {c: arr[:, 0] for c, arr in series.items()}
+        ts = ts[::every]
+    else:
+        ts = ts[::every]
+        series = _solve_ivp(
+            spec, curve, ts, dt, solver, dict(solver_options))
+
+    return np.column_stack([ts] + [series[c] for c in spec.compartments])
+
+
+@functools.lru_cache(maxsize=None)
+def _model_salt(model_name):
+    """Hash of the code that integrates a model, so the cached results are
+    invalidated when the model changes.
+
+    """
+    spec = _MODELS[model_name]
+    return cache.code_salt(
+        spec.graph, spec.kernel, spec.jit_kernel, spec.rhs, spec.derived,
+        _time_grid, _delayed, _kernel_runner, _integrate, _iter_integrate,
+        _iter_rows, _solve_ivp, _bounded_rate, _run_model)
+
+
+def _expand_grid(param_grid):
+    """Iterate over all the combinations of parameters of a grid."""
+    if isinstance(param_grid, Mapping):
+        param_grid = [param_grid]
+    for grid in param_grid:
+        names = list(grid)
+        for values in it.product(*(grid[n] for n in names)):
+            yield dict(zip(names, values))
+
+
+def _kernel_runner(spec, curves, dt):
+    """Resolve the parameters of a model for every curve.
+
+    Returns the initial values of every compartment (with one value per
+    curve), the longest lag of the edges, and a function
+    ``run(series, start, offset)`` that integrates in place from the row
+    ``start`` of ``series`` (a dict with an array of shape
+    ``(n_rows, len(curves))`` for every compartment, see ``_delayed`` for
+    ``offset``).
+
+    With ``JIT`` the numba kernel integrates every run with its own loop.
+    Otherwise a single curve is integrated over scalars, or the runs are
+    grouped by the lags of their edges (which must be integers to index the
+    history) and every group is integrated vectorized over the runs.
+
+    """
+    graph = CompiledGraph.stack(
+        spec.graph(curve, dt).compile() for curve in curves)
+    n_runs = len(curves)
+
+    params = {
+        pname: graph.get_edge(*edge) for pname, edge in spec.edges.items()}
+    lag_names = [pname for pname in spec.edges if pname.startswith("lag_")]
+    for pname in lag_names:
+        params[pname] = params[pname].astype(int)
+    params["population"] = np.array([c.population for c in curves])
+    init = {c: graph.get_node_value(c) for c in spec.compartments}
+    max_lag = max((int(params[pname].max()) for pname in lag_names), default=0)
+
+    if JIT and spec.jit_kernel is not None:
+        params["population"] = params["population"].astype(float)
+        params = {
+            pname: np.ascontiguousarray(values)
+            for pname, values in params.items()}
+
+        def run(series, start, offset):
+            spec.jit_kernel(
+                *series.values(), dt=dt, start=start, offset=offset, **params)
+
+        return init, max_lag, run
+
+    if n_runs == 1:
+        params = {pname: values.item() for pname, values in params.items()}
+
+        def run(series, start, offset):
+            spec.kernel(
+                *(arr[:, 0] for arr in series.values()), dt=dt,
+                start=start, offset=offset, **params)
+
+        return init, max_lag, run
+
+    lags = np.column_stack(
+        [params[pname] for pname in lag_names] or [np.zeros(n_runs)])
+    groups, group_of = np.unique(
+        lags, axis=0, return_inverse=True)
+
+    group_params = []
+    for gidx, group_lags in enumerate(groups):
+        runs = np.flatnonzero(group_of.ravel() == gidx)
+        kwargs = {pname: values[runs] for pname, values in params.items()}
+        kwargs.update(zip(lag_names, group_lags.tolist()))
+        group_params.append((runs, kwargs))
+
+    def run(series, start, offset):
+        for runs, kwargs in group_params:
+            group_series = {c: arr[:, runs] for c, arr in series.items()}
+            spec.kernel(
+                *group_series.values(), dt=dt,
+                minimum=np.minimum, maximum=np.maximum,
+                start=start, offset=offset, **kwargs)
+            for c, arr in group_series.items():
+                series[c][start:, runs] = arr[start:]
+
+    return init, max_lag, run
+
+
+def _integrate(spec, curves, ts, dt, every=1):
+    """Integrate a model for every curve at once.
+
+    Returns a dict with an array of shape ``(len(ts[::every]),
+    len(curves))`` for every compartment of the model. If ``every`` is
+    greater than 1 the full history is never kept (see
+    ``_iter_integrate``).
+
+    """
+    if every > 1:
+        n_rows = len(range(0, len(ts), every))
+        series = {
+            c: np.empty((n_rows, len(curves))) for c in spec.compartments}
+        for row, chunk in _iter_rows(spec, curves, len(ts), dt, every):
+            for c, arr in chunk.items():
+                series[c][row:row + len(arr)] = arr
+        return series
+
+    init, _, run = _kernel_runner(spec, curves, dt)
+    series = {c: np.empty((len(ts), len(curves))) for c in spec.compartments}
+    for c, arr in series.items():
+        arr[0] = init[c]
+    run(series, start=1, offset=0)
+    return series
+
+
+def _iter_integrate(spec, curves, n_steps, dt, chunk_size=None):
+    """Integrate ``n_steps`` (including the initial values) of a model for
+    every curve, keeping in memory only the history needed by the lags.
+
+    The compartments are integrated over a window of
+    ``1 + max_lag + chunk_size`` rows: the row 0 keeps the initial values,
+    the next ``max_lag`` rows the last integrated steps, and the rest the
+    new steps (``STREAM_CHUNK_SIZE`` by default). When the window is full
+    the last ``max_lag`` steps are moved back to the start, as in a ring
+    buffer that is rotated once per chunk instead of once per step, so the
+    kernels still read contiguous rows.
+
+    Yields ``(step, chunk)`` with the number of the first step of the chunk
+    and a dict with an array of shape ``(n, len(curves))`` for every
+    compartment. The first chunk is only the initial values. The arrays are
+    views over the window, overwritten by the next chunk.
+
+    """
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_SIZE
+
+    init, max_lag, run = _kernel_runner(spec, curves, dt)
+    history = max(max_lag, 1)
+
+    window = {
+        c: np.empty((1 + history + chunk_size, len(curves)))
+        for c in spec.compartments}
+    for c, arr in window.items():
+        arr[0] = init[c]
+    yield 0, {c: arr[:1] for c, arr in window.items()}
+
+    step, start = 1, 1
+    while step < n_steps:
+        stop = min(len(window[spec.compartments[0]]), start + n_steps - step)
+        series = {c: arr[:stop] for c, arr in window.items()}
+        run(series, start=start, offset=step - start)
+        yield step, {c: arr[start:] for c, arr in series.items()}
+
+        step += stop - start
+        keep = min(history, stop - 1)
+        for arr in window.values():
+            arr[1:1 + keep] = arr[stop - keep:stop]
+        start = 1 + keep
+
+
+def _iter_rows(spec, curves, n_steps, dt, every=1, chunk_size=None):
+    """Same as ``_iter_integrate`` but only with a row every ``every``
+    steps.
+
+    Yields ``(row, chunk)`` with the number of the first row of the chunk
+    (the step divided by ``every``), skipping the chunks without rows.
+
+    """
+    chunks = _iter_integrate(spec, curves, n_steps, dt, chunk_size)
+    for step, chunk in chunks:
+        first = -(-step // every) * every
+        chunk = {c: arr[first - step::every] for c, arr in chunk.items()}
+        if len(chunk[spec.compartments[0]]):
+            yield first // every, chunk
+
+
+# =============================================================================
+# ADAPTIVE SOLVERS
+# =============================================================================
+
+SOLVERS = ("euler", "RK45", "RK23", "DOP853", "Radau", "BDF", "LSODA")
+
+DEFAULT_SOLVER_OPTIONS = {"rtol": 1e-6, "atol": 1e-3}
+
+
+def _solve_ivp(spec, curve, ts, dt, solver, solver_options):
+    """Integrate a model with ``scipy.integrate.solve_ivp``.
+
+    The lags of the graph are delays of ``lag * dt`` days (as in the
+    fixed-step kernels, a lag of 0 is the initial value and the delayed
+    value is 0 before the delay), so the model is a delay differential
+    equation integrated by the method of steps: the time range is split
+    in segments no longer than the shortest delay and every segment is
+    integrated with the dense output of the previous ones as history.
+
+    The segments also end when a compartment reaches one of its bounds (0
+    or the population), and the times where that kink reaches the delayed
+    terms are added as new ends, so the dense output never interpolates
+    over a discontinuity.
+
+    """
+    try:
+        from scipy import integrate
+    except ImportError:  # pragma: no cover
+        raise ImportError(
+            f"The solver {solver!r} requires scipy. Install it or use "
+            "solver='euler'")
+
+    options = dict(DEFAULT_SOLVER_OPTIONS)
+    options.update(solver_options or {})
+
+    population = curve.population
+    graph = spec.graph(curve, dt).compile()
+    compartments = list(spec.compartments)
+    y0 = np.array(
+        [graph.get_node_value(c) for c in compartments], dtype=float)
+
+    params, delays = {}, {}
+    for pname, edge in spec.edges.items():
+        value = graph.get_edge(*edge)
+        if pname.startswith("lag_"):
+            source = compartments.index(edge[0])
+            delays["update_" + pname[4:]] = (source, float(value) * dt)
+        else:
+            params[pname] = float(value)
+    params["population"] = population
+
+    # the segments end at every multiple of every delay
+    t_max = ts[-1]
+    positive = sorted({d for _, d in delays.values() if d > 0})
+    shortest = positive[0] if positive else t_max
+    breaks = [np.arange(0., t_max, shortest)]
+    breaks.extend(np.arange(d, t_max, d) for d in positive)
+    breaks = np.unique(np.append(np.concatenate(breaks), t_max)).tolist()
+    heapq.heapify(breaks)
+
+    # and every time a compartment reaches a bound
+    tolerance = _BOUND_TOLERANCE * population
+    events, bounds = [], []
+    for idx, c in enumerate(compartments):
+        if c in spec.capped:
+            events.append(
+                lambda t, y, idx=idx: y[idx] - (population - tolerance))
+            events[-1].direction = 1
+            bounds.append((idx, population))
+        if c in spec.floored:
+            events.append(lambda t, y, idx=idx: y[idx] - tolerance)
+            events[-1].direction = -1
+            bounds.append((idx, 0.))
+    for event in events:
+        event.terminal = True
+
+    starts, solutions = [], []
+    t0 = 0.
+
+    def history(source, delay, t):
+        if delay == 0:
+            return y0[source]
+        past = t - delay
+        # a segment that starts at the delay uses the values after the jump
+        if past < 0 or (past == 0 and t > t0):
+            return 0.
+        idx = max(bisect.bisect_left(starts, past) - 1, 0)
+        return solutions[idx](past)[source]
+
+    def fun(t, y):
+        updates = {
+            uname: history(source, delay, t)
+            for uname, (source, delay) in delays.items()}
+        return spec.rhs(*y, **updates, **params)
+
+    y = y0
+    while t0 < t_max:
+        t1 = heapq.heappop(breaks)
+        if t1 <= t0:
+            continue
+
+        sol = integrate.solve_ivp(
+            fun, (t0, t1), y, method=solver, dense_output=True,
+            events=events or None, **options)
+        if sol.status == -1:
+            raise RuntimeError(sol.message)
+
+        starts.append(t0)
+        solutions.append(sol.sol)
+        t0, y = sol.t[-1], sol.y[:, -1].copy()
+
+        if sol.status == 1:
+            # stopped at a bound: pin the compartment and try again
+            heapq.heappush(breaks, t1)
+            for idx, (source, bound) in enumerate(bounds):
+                if len(sol.t_events[idx]):
+                    y[source] = bound
+            for delay in positive:
+                if t0 + delay < t_max:
+                    heapq.heappush(breaks, t0 + delay)
+
+    # sample the dense output over the time grid
+    segment = np.clip(
+        np.searchsorted(starts, ts, side="right") - 1, 0, len(solutions) - 1)
+    values = np.empty((len(compartments), len(ts)))
+    for idx, sol in enumerate(solutions):
+        in_segment = segment == idx
+        if in_segment.any():
+            values[:, in_segment] = sol(ts[in_segment])
+    values[:, 0] = y0
+
+    # the bounds are crossed by less than the tolerance
+    for source, bound in bounds:
+        if bound:
+            np.minimum(values[source], bound, out=values[source])
+        else:
+            np.maximum(values[source], bound, out=values[source])
+
+    series = dict(zip(compartments, values))
+    if spec.derived is not None:
+        spec.derived(series, population)
+    return series
+
+
+# =============================================================================
+# SWEEPS EXECUTION
+# =============================================================================
+
+def _sweep_chunk(model, base, columns, t_max, dt, every=1):
+    """Integrate a chunk of runs of a sweep.
+
+    The curves are rebuilt from the common parameters (``base``) and the
+    arrays with the values of the swept parameters of every run
+    (``columns``). Returns an array of shape
+    ``(n_compartments, n_rows, n_runs)`` with a row ``every`` steps.
+
+    """
+    spec = _MODELS[model]
+    n_runs = len(next(iter(columns.values()))) if columns else 1
+    curves = [
+        InfectionCurve(
+            **base, **{name: col[idx].item() for name, col in columns.items()})
+        for idx in range(n_runs)]
+    ts = _time_grid(t_max, dt)
+    series = _integrate(spec, curves, ts, dt, every=every)
+    return np.stack([series[c] for c in spec.compartments])
+
+
+def _map_chunks(function, chunks, *, total, n_jobs, progress, cancel):
+    """Call ``function(*args)`` for every ``(start, stop, args)`` chunk, in
+    the current process or in a pool of ``n_jobs`` processes.
+
+    Yields ``(start, stop, result)`` as the chunks are finished.
+
+    """
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise SweepCancelledError(
+                f"Sweep cancelled after {done} of {total} runs")
+
+    done = 0
+    if n_jobs == 1:
+        for start, stop, args in chunks:
+            check_cancel()
+            result = function(*args)
+            done += stop - start
+            if progress is not None:
+                progress(done, total)
+            yield start, stop, result
+        return
+
+    with futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = {
+            executor.submit(function, *args): (start, stop)
+            for start, stop, args in chunks}
+        try:
+            while pending:
+                check_cancel()
+                finished, _ = futures.wait(
+                    pending, timeout=0.1,
+                    return_when=futures.FIRST_COMPLETED)
+                for future in finished:
+                    check_cancel()
+                    start, stop = pending.pop(future)
+                    result = future.result()
+                    done += stop - start
+                    if progress is not None:
+                        progress(done, total)
+                    yield start, stop, result
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def _in_order(results):
+    """Reorder the chunks yielded by ``_map_chunks`` by their start."""
+    waiting, expected = {}, 0
+    for start, stop, result in results:
+        waiting[start] = (stop, result)
+        while expected in waiting:
+            stop, result = waiting.pop(expected)
+            yield expected, stop, result
+            expected = stop
+
+
+def _n_jobs(n_jobs):
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def _run_sweep(
+    *, model, base, columns, n_runs, t_max, dt,
+    n_jobs, chunk_size, progress, cancel, every=1, quantiles=None
+):
+    """Split the runs of a sweep in chunks and integrate them, in the
+    current process or in a pool of ``n_jobs`` processes.
+
+    Returns the series of every run or, if ``quantiles`` is given, only
+    their quantiles with shape ``(n_quantiles, n_rows, n_compartments)``.
+
+    """
+    n_jobs = _n_jobs(n_jobs)
+    if chunk_size is None:
+        chunk_size = max(int(np.ceil(n_runs / (n_jobs * 4))), 1)
+
+    spec = _MODELS[model]
+    n_rows = len(_time_grid(t_max, dt)[::every])
+
+    if quantiles is not None:
+        # the runs of a grid are usually sorted by their parameters and P²
+        # is very inaccurate with sorted streams
+        order = np.random.default_rng(0).permutation(n_runs)
+        columns = {name: col[order] for name, col in columns.items()}
+
+    chunks = []
+    for start in range(0, n_runs, chunk_size):
+        stop = min(start + chunk_size, n_runs)
+        chunk_columns = {
+            name: col[start:stop] for name, col in columns.items()}
+        chunks.append(
+            (start, stop, (model, base, chunk_columns, t_max, dt, every)))
+
+    results = _map_chunks(
+        _sweep_chunk, chunks, total=n_runs,
+        n_jobs=n_jobs, progress=progress, cancel=cancel)
+
+    if quantiles is not None:
+        aggregator = P2Quantiles(
+            quantiles, shape=(n_rows, len(spec.compartments)))
+        for _, _, result in _in_order(results):
+            aggregator.update_many(result.transpose(2, 1, 0))
+        return aggregator.result()
+
+    series = np.empty((len(spec.compartments), n_rows, n_runs))
+    for start, stop, result in results:
+        series[..., start:stop] = result
+
+    return series
+
+
+# =============================================================================
+# COMPARTMENTAL MODELS COMPILER
+# =============================================================================
+
+@attr.s(frozen=True, repr=False)
+class _CompartmentalKernel:
+    """Vectorized step kernel of a graph structure.
+
+    All the flows of a step are computed at once as an array with one
+    element per edge, and are added to (and removed from) the compartments
+    with the ``gains`` and ``losses`` incidence matrices.
+
+    """
+
+    nodes = attr.ib()
+    src = attr.ib()
+    lag = attr.ib()
+    contact = attr.ib()
+    gains = attr.ib()
+    losses = attr.ib()
+
+    def __call__(
+        self, H, prob, dt, population, minimum=np.minimum, maximum=np.maximum
+    ):
+        current = self.lag == 0
+        back = np.where(current, 1, self.lag)
+        mass = np.flatnonzero(self.contact >= 0)
+        contact = self.contact[mass]
+
+        for k in range(1, len(H)):
+            idx = k - back
+            values = np.where(
+                (current | (idx >= 1))[(...,) + (np.newaxis,) * (H.ndim - 2)],
+                H[np.maximum(idx, 0), self.src], 0.)
+            if len(mass):
+                values[mass] = values[mass] * (H[k - 1, contact] / population)
+            flows = values * prob * dt
+
+            H[k] = maximum(
+                minimum(H[k - 1] + self.gains @ flows, population) -  # noqa
+                self.losses @ flows, 0)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_structure(nodes, edges, contacts):
+    """Build (and cache) the kernel of a graph structure.
+
+    ``edges`` is a tuple of ``(frm, to, lag)`` and ``contacts`` a tuple of
+    ``((frm, to), contact_node)``.
+
+    """
+    index = {n: idx for idx, n in enumerate(nodes)}
+    contacts = dict(contacts)
+
+    src = np.array([index[frm] for frm, _, _ in edges], dtype=int)
+    lag = np.array([lag for _, _, lag in edges], dtype=int)
+    contact = np.array(
+        [
+            index[contacts[(frm, to)]] if (frm, to) in contacts else -1
+            for frm, to, _ in edges],
+        dtype=int)
+
+    gains = np.zeros((len(nodes), len(edges)))
+    losses = np.zeros((len(nodes), len(edges)))
+    for eidx, (frm, to, _) in enumerate(edges):
+        gains[index[to], eidx] = 1.
+        if frm != to:
+            losses[index[frm], eidx] = 1.
+
+    return _CompartmentalKernel(
+        nodes=nodes, src=src, lag=lag, contact=contact,
+        gains=gains, losses=losses)
+
+
+@attr.s(frozen=True, repr=False)
+class CompartmentalModel:
+    """A compartmental model compiled from a graph.
+
+    Created with ``compile_model()``.
+
+    """
+
+    kernel = attr.ib()
+    prob = attr.ib()
+    initial = attr.ib()
+
+    def __repr__(self):
+        return f"<CompartmentalModel nodes={list(self.nodes)}>"
+
+    @property
+    def nodes(self):
+        return self.kernel.nodes
+
+    def integrate(
+        self, t_max=200, dt=1., population=np.inf, model_name="Compiled"
+    ):
+        """Integrate the model.
 
         Parameters
         ----------
@@ -654,106 +2602,234 @@ class InfectionCurve:
             Time range [days].
         dt: float (default=1.)
             Time step [days].
+        population: float (default=inf)
+            Population. Is the maximum value of every compartment and is
+            needed by the edges with contacts.
+        model_name: str (default="Compiled")
+            Name of the model in the result.
 
         Returns
         -------
-           value: Time series for S, E, I, R and F
+           value: Time series for every node of the graph.
 
         """
         dt = float(dt)
-        g = Graph()
+        ts = _time_grid(t_max, dt)
 
-        for node in ['S', 'E', 'I', 'R', 'F']:
-            g.add_node(node, 0)
+        H = np.empty((len(ts), len(self.nodes)))
+        H[0] = self.initial
+        self.kernel(H, prob=self.prob, dt=dt, population=population)
 
-        g.set_node('S', self.population)
-        g.set_node('E', 0)
-        g.set_node('I', self.N_init)
-        g.set_node('R', 0)
-        g.set_node('F', 0)
+        df = pd.DataFrame(H, columns=list(self.nodes), index=ts)
+        df.index.name = "ts"
 
-        # cumulative time series
-        S = [g.get_node_value('S')]  # Susceptible
-        E = [g.get_node_value('E')]  # Exposed
-        I = [g.get_node_value('I')]  # noqa Infected
-        R = [g.get_node_value('R')]  # Recovered
-        F = [g.get_node_value('F')]  # Fatalities
+        extra = {"model_name": model_name, "population": population}
+        return ModelResultFrame(df=df, extra=extra)
 
-        ts = [0.]  # time series
-        nms = ['prob', 'lag']
 
-        g.add_edge('S', 'E', nms, [0.2, 0])
-        g.add_edge('E', 'E', nms, [0.1, 0])
-        g.add_edge('E', 'I', nms, [0.7, 14])
-        g.add_edge('I', 'I', nms, [1.2, 14])
-        g.add_edge('I', 'R', nms, [0.98, 30])
-        g.add_edge('I', 'F', nms, [0.02, 30])
+def compile_model(graph, contacts=None):
+    """Compile a graph of compartments into a ``CompartmentalModel``.
 
-        t, time_steps = 0., 0
-        while t < t_max:
+    The nodes of the graph are the compartments (their values are the
+    initial conditions) and every edge ``frm -> to`` with the fields
+    ``prob`` and ``lag`` is a flow between them. In every step of size
+    ``dt`` the flow of an edge is::
 
-            time_steps = time_steps + 1
+        prob * X_frm[k - lag] * dt
 
-            t = t + dt
-            ts.append(t)
+    A ``lag`` of 0 uses the last value of the compartment and, if the
+    history is shorter than the lag, the flow is 0. The edges listed in
+    ``contacts`` are proportional to the fraction of the population in a
+    third compartment (``S -> E`` with contact ``I`` is
+    ``prob * S * I / population * dt``).
 
-            # (( S ))
-            prob_SE = g.get_edge('S', 'E', 'prob')  # beta
-            dS = - S[-1] * (I[-1] / self.population) * prob_SE
-            n_S = S[-1] + dS * dt
+    The flows are added to the destination and removed from the origin
+    (an edge from a node to itself only adds), and every compartment is
+    kept between 0 and the population: first the gains are added and
+    capped and then the losses are removed.
 
-            # (( E ))
-            prob_EE = g.get_edge('E', 'E', 'prob')
-            lag_EE = g.get_edge('E', 'E', 'lag')
-            update_EE = E[-lag_EE] if lag_EE < len(E) else 0.
+    The kernels are cached by the structure of the graph (nodes, edges,
+    lags and contacts), so graphs with the same structure and different
+    probabilities or initial values share the kernel.
 
-            dE = - dS - prob_EE * update_EE
-            n_E = E[-1] + dE * dt
+    Parameters
+    ----------
+    graph: Graph
+        The compartments and their flows.
+    contacts: dict, optional
+        Maps ``(frm, to)`` edges to the node that drives the contagion.
 
-            # (( I ))
-            prob_EI = g.get_edge('E', 'I', 'prob')
-            lag_EI = g.get_edge('E', 'I', 'lag')
-            update_EI = E[-lag_EI] if lag_EI < len(E) else 0.
+    Returns
+    -------
+    CompartmentalModel
 
-            prob_II = g.get_edge('I', 'I', 'prob')
-            lag_II = g.get_edge('I', 'I', 'lag')
-            update_II = I[-lag_II] if lag_II < len(I) else 0.
+    Example
+    -------
 
-            prob_IR = g.get_edge('I', 'R', 'prob')
-            lag_IR = g.get_edge('I', 'R', 'lag')
-            update_IR = I[-lag_IR] if lag_IR < len(I) else 0.
+    >>> g = Graph()
+    >>> for node, value in [('S', 999), ('I', 1), ('R', 0)]:
+    ...     g.add_node(node, value)
+    >>> g.add_edge('S', 'I', ['prob', 'lag'], [0.3, 0])
+    >>> g.add_edge('I', 'R', ['prob', 'lag'], [0.1, 0])
+    >>> model = compile_model(g, contacts={('S', 'I'): 'I'})
+    >>> result = model.integrate(t_max=100, population=1000)
 
-            prob_II = g.get_edge('I', 'I', 'prob')
+    """
+    contacts = {} if contacts is None else dict(contacts)
+    cg = graph.compile()
 
-            dI = (
-                prob_EI * update_EI +  # noqa
-                prob_II * update_II -  # noqa
-                prob_IR * update_IR)
-            n_I = min(I[-1] + dI * dt, self.population)
+    frm, to = np.nonzero(cg.adjacency)
+    if "prob" not in cg.weights:
+        raise ValueError("The edges of the graph must have a 'prob' field")
+    lags = cg.weights.get("lag", np.zeros(cg.adjacency.shape))
 
-            # (( R ))
-            prob_IF = g.get_edge('I', 'F', 'prob')
-            lag_IF = g.get_edge('I', 'F', 'lag')
-            update_IF = I[-lag_IF] if lag_IF < len(R) else 0.
+    edges = tuple(
+        (cg.nodes[i], cg.nodes[j], int(lags[i, j])) for i, j in zip(frm, to))
+    for edge, contact in contacts.items():
+        if not cg.adjacency[cg._node_index(edge[0]), cg._node_index(edge[1])]:
+            raise KeyError(f"No edge {edge[0]} -> {edge[1]}")
+        cg._node_index(contact)
 
-            dR = prob_IR * update_IR - prob_IF * update_IF
-            n_R = min(R[-1] + max(dR * dt, 0), self.population)
+    kernel = _compile_structure(
+        cg.nodes, edges, tuple(sorted(contacts.items(), key=repr)))
+    return CompartmentalModel(
+        kernel=kernel, prob=cg.weights["prob"][frm, to], initial=cg.values)
 
-            # (( F ))
-            n_F = min(I[-1] + max(dR * dt, 0), self.population)
 
-            S.append(n_S)
-            E.append(n_E)
-            I.append(n_I)
-            R.append(n_R)
-            F.append(n_F)
+# =============================================================================
+# STOCHASTIC SIMULATION
+# =============================================================================
 
-        df = pd.DataFrame(
-            {'ts': ts, 'S': S, 'E': E, 'I': I, 'R': R, 'F': F}).set_index("ts")
+#: Populations up to this size are simulated with the exact Gillespie
+#: algorithm when the method is "auto".
+GILLESPIE_MAX_POPULATION = 1000
 
-        extra = attr.asdict(self)
-        extra["model_name"] = "SEIRF"
-        return ModelResultFrame(df=df, extra=extra)
+STOCHASTIC_METHODS = ("auto", "tau-leaping", "gillespie")
+
+
+def _tau_leaping_SIR(rng, n, *, S0, I0, beta, gamma, population, ts, dt):
+    """Simulate ``n`` realizations of the SIR model with fixed steps.
+
+    The number of infections and recoveries of every step are drawn from
+    binomial distributions, so the compartments are never negative.
+
+    """
+    out = np.empty((len(ts), 3, n), dtype=np.int64)
+    S = np.full(n, S0, dtype=np.int64)
+    I = np.full(n, I0, dtype=np.int64)  # noqa
+    R = np.zeros(n, dtype=np.int64)
+    out[0] = S, I, R
+
+    p_recovery = -np.expm1(-gamma * dt)
+    for k in range(1, len(ts)):
+        p_infection = -np.expm1(-beta * I / population * dt)
+        infections = rng.binomial(S, p_infection)
+        recoveries = rng.binomial(I, p_recovery)
+        S = S - infections
+        I = I + infections - recoveries  # noqa
+        R = R + recoveries
+        out[k] = S, I, R
+
+    return out
+
+
+def _gillespie_SIR(rng, n, *, S0, I0, beta, gamma, population, ts, dt):
+    """Simulate ``n`` realizations of the SIR model event by event.
+
+    All the realizations advance one event per iteration, each one with
+    its own clock, and their state is recorded at the times of ``ts``.
+
+    """
+    n_steps = len(ts)
+    out = np.empty((n_steps, 3, n), dtype=np.int64)
+    S = np.full(n, S0, dtype=np.int64)
+    I = np.full(n, I0, dtype=np.int64)  # noqa
+    R = np.zeros(n, dtype=np.int64)
+
+    t = np.zeros(n)
+    recorded = np.zeros(n, dtype=int)
+    runs = np.arange(n)
+
+    while True:
+        active = recorded < n_steps
+        if not active.any():
+            break
+
+        infection_rate = beta * S * I / population
+        total_rate = infection_rate + gamma * I
+        with np.errstate(divide="ignore"):
+            t_next = t + rng.exponential(size=n) / total_rate
+
+        # every grid time before the next event sees the current state
+        stop = np.searchsorted(ts, t_next, side="left")
+        counts = np.where(active, stop - recorded, 0)
+        if counts.any():
+            offsets = np.cumsum(counts) - counts
+            rows = (
+                np.arange(counts.sum()) - np.repeat(offsets, counts) +  # noqa
+                np.repeat(recorded, counts))
+            cols = np.repeat(runs, counts)
+            out[rows, 0, cols] = S[cols]
+            out[rows, 1, cols] = I[cols]
+            out[rows, 2, cols] = R[cols]
+            recorded = np.maximum(recorded, stop)
+
+        event = active & np.isfinite(t_next) & (recorded < n_steps)
+        infection = rng.random(n) * total_rate < infection_rate
+        infected = event & infection
+        recovered = event & ~infection
+        S = S - infected
+        I = I + infected - recovered  # noqa
+        R = R + recovered
+        t = np.where(event, t_next, t)
+
+    return out
+
+
+def _stochastic_chunk(method, seed, n, params, ts, dt):
+    """Simulate a chunk of realizations with its own random stream."""
+    rng = np.random.default_rng(seed)
+    simulate = (
+        _gillespie_SIR if method == "gillespie" else _tau_leaping_SIR)
+    return simulate(rng, n, ts=ts, dt=dt, **params)
+
+
+def _run_stochastic(
+    *, method, params, n_realizations, ts, dt, seed, quantiles, streaming,
+    n_jobs, chunk_size, progress, cancel
+):
+    """Simulate the realizations in chunks, every one with an independent
+    stream spawned from ``seed``, and return their quantiles with shape
+    ``(n_quantiles, n_steps + 1, 3)``.
+
+    The streams depend only on the chunks (and the chunks are aggregated
+    in order), so the result doesn't change with ``n_jobs``.
+
+    """
+    bounds = [
+        (start, min(start + chunk_size, n_realizations))
+        for start in range(0, n_realizations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+
+    chunks = [
+        (start, stop, (method, chunk_seed, stop - start, params, ts, dt))
+        for (start, stop), chunk_seed in zip(bounds, seeds)]
+
+    results = _map_chunks(
+        _stochastic_chunk, chunks, total=n_realizations,
+        n_jobs=_n_jobs(n_jobs), progress=progress, cancel=cancel)
+
+    if streaming:
+        aggregator = P2Quantiles(quantiles, shape=(len(ts), 3))
+        for _, _, result in _in_order(results):
+            aggregator.update_many(result.transpose(2, 0, 1))
+        return aggregator.result()
+
+    series = np.empty((len(ts), 3, n_realizations), dtype=np.int64)
+    for start, stop, result in results:
+        series[..., start:stop] = result
+
+    return np.quantile(series, quantiles, axis=-1)
 
 
 # =============================================================================
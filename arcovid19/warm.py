@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Warming of the arcovid19 cache, so the first users after a deploy don't
+pay for the downloads, the parsing and the model runs.
+
+"""
+
+__all__ = ["MODELS", "warm_cache", "warm_cache_in_background"]
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import time
+import logging
+import threading
+from concurrent import futures
+
+from . import cache
+from .cases import load_cases, CASES_URL, AREAS_POP_URL
+from .models import InfectionCurve, load_infection_curve
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+#: The model runs precomputed by default: every ``do_*`` method of
+#: InfectionCurve with its default parameters, as the web app runs them
+MODELS = tuple(
+    mname for mname, method in vars(InfectionCurve).items()
+    if mname.startswith("do_") and callable(method))
+
+logger = logging.getLogger("arcovid19.warm")
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def _run_model(mname, force):
+    curve = load_infection_curve()
+    getattr(curve, mname)(force=force)
+
+
+def warm_cache(
+    cases_url=CASES_URL, areas_pop_url=AREAS_POP_URL, models=MODELS,
+    force=False, max_workers=None
+):
+    """Download the cases tables, parse them and precompute the default
+    model runs into the cache.
+
+    The tables are downloaded at the same time as the models run, and the
+    cases are parsed as soon as both tables are available. A failed task
+    is logged and doesn't stop the others.
+
+    Parameters
+    ----------
+
+    cases_url: str
+        The url of the cases table (see ``load_cases``).
+
+    areas_pop_url: str
+        The url of the population table (see ``load_cases``).
+
+    models: iterable of str (default=MODELS)
+        The names of the ``InfectionCurve.do_*`` methods to run with their
+        default parameters.
+
+    force: bool (default=False)
+        If the cached values must be ignored and computed again. The
+        tables are then downloaded again by ``load_cases``, and not by the
+        previous downloads.
+
+    max_workers: int, optional
+        Maximum number of threads (the default of
+        ``concurrent.futures.ThreadPoolExecutor``).
+
+    Returns
+    -------
+
+    dict:
+        The seconds that took every task, or the exception that made it
+        fail, by task name.
+
+    """
+    with futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="arcovid19-warm"
+    ) as executor:
+        # with force load_cases downloads the tables again, so here they
+        # are not forced to not download them twice
+        downloads = {
+            f"fetch {url}": executor.submit(_timed, cache.fetch, url)
+            for url in (cases_url, areas_pop_url)}
+        runs = {
+            mname: executor.submit(_timed, _run_model, mname, force)
+            for mname in models}
+
+        # the tables are already in the cache when they are parsed
+        futures.wait(downloads.values())
+        parse = executor.submit(
+            _timed, load_cases,
+            cases_url=cases_url, areas_pop_url=areas_pop_url, force=force)
+
+    tasks = dict(downloads, load_cases=parse, **runs)
+    results = {}
+    for name, task in tasks.items():
+        error = task.exception()
+        if error is not None:
+            logger.error(f"Can't warm {name}: {error!r}")
+            results[name] = error
+        else:
+            results[name] = task.result()
+    return results
+
+
+def warm_cache_in_background(**kwargs):
+    """Run ``warm_cache`` in a daemon thread.
+
+    Parameters
+    ----------
+
+    kwargs:
+        The parameters of ``warm_cache``.
+
+    Returns
+    -------
+
+    threading.Thread: The running thread.
+
+    """
+    thread = threading.Thread(
+        target=warm_cache, kwargs=kwargs, name="arcovid19-warm", daemon=True)
+    thread.start()
+    return thread
@@ -34,6 +34,7 @@ import flask
 from flask_babel import Babel
 
 from . import bp
+from ..warm import warm_cache_in_background
 
 
 # =============================================================================
@@ -52,6 +53,8 @@ DEFAULT_LOCALE = os.environ.get("ARCOVID19_DEFAULT_LOCALE")
 
 TRANSLATION_DIRECTORY = str(PATH / "translations")
 
+WARM = os.environ.get("ARCOVID19_WARM", "false").lower() == "true"
+
 
 # =============================================================================
 # PUBLIC API
@@ -60,6 +63,10 @@ TRANSLATION_DIRECTORY = str(PATH / "translations")
 def create_app(**kwargs):
     """Retrieve a flask app for arcovid 19 using the internal blueprint.
 
+    If the ``WARM`` setting is true (or the ``ARCOVID19_WARM`` environment
+    variable is "true") the cases and the default model runs are loaded
+    into the cache in background (see ``arcovid19.warm.warm_cache``).
+
     """
     kwargs.setdefault("DEBUG", DEBUG)
     kwargs.setdefault("TESTING", TESTING)
@@ -68,6 +75,8 @@ def create_app(**kwargs):
     kwargs.setdefault('BABEL_DEFAULT_LOCALE', DEFAULT_LOCALE)
     kwargs.setdefault('BABEL_TRANSLATION_DIRECTORIES', TRANSLATION_DIRECTORY)
 
+    kwargs.setdefault("WARM", WARM)
+
     app = flask.Flask("arcovid19.web")
     app.register_blueprint(bp.wavid19)
 
@@ -75,5 +84,8 @@ def create_app(**kwargs):
 
     babel = Babel(app)  # noqa
 
+    if app.config["WARM"]:
+        warm_cache_in_background()
+
     # ========== RETURN
     return app
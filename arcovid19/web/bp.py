@@ -123,8 +123,11 @@ class InfectionCurveView(TemplateView):
             method = getattr(InfectionCurve, method_name)
 
             # extract all the parameters for the model itself
-            parameters = list(inspect.signature(method).parameters)[1:]
-            model_params = {p: data.pop(p) for p in parameters}
+            parameters = list(
+                inspect.signature(method).parameters.values())[1:]
+            model_params = {
+                p.name: data.pop(p.name) for p in parameters
+                if p.kind == p.POSITIONAL_OR_KEYWORD}
 
             # remove all unused models params
             # TODO: remove all unused models params
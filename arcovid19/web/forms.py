@@ -106,11 +106,14 @@ def make_InfectionCurveForm():
             for p in mtd_docs.get("Parameters")
         }
 
-        # extract all the parameters
+        # extract all the parameters (the keyword only parameters are
+        # not exposed in the form)
         params = inspect.signature(method).parameters
         for idx, param in enumerate(params.values()):
             if idx == 0 or param.name in form_fields:
                 continue
+            if param.kind != param.POSITIONAL_OR_KEYWORD:
+                continue
 
             # extract doc
             description = docs.get(param.name)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Benchmarks of the serialization of the arcovid19 cache.
+
+Run it as a script from the root of the repository::
+
+    $ python benchmarks/bench_cache.py
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import os
+import timeit
+import tempfile
+
+import numpy as np
+
+import diskcache as dcache
+
+import arcovid19
+from arcovid19 import cache
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+PATH = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+LOCAL_CASES = os.path.join(PATH, "databases", "cases.xlsx")
+
+LOCAL_AREA_POP = os.path.join(PATH, "databases", "extra", "arg_provs.dat")
+
+#: The disk settings compared: diskcache with pickles, the raw columnar
+#: files, and every codec compressing only the pickles or the arrays too
+DISKS = [
+    ("pickle", {"disk": dcache.Disk}),
+    ("columnar", {"disk": cache.ColumnarDisk})]
+DISKS.extend(
+    (f"{codec}{'+arrays' if arrays else ''}", {
+        "disk": cache.ColumnarDisk, "disk_compression": codec,
+        "disk_compress_arrays": arrays})
+    for codec in cache.CODECS for arrays in (False, True))
+
+REPEAT = 20
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+def values():
+    """The values of the benchmark: the downloaded cases spreadsheet, the
+    cases table, a model run and a large ensemble of runs.
+
+    """
+    cases = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP, force=True)
+    curve = arcovid19.load_infection_curve()
+    run = curve.do_SEIRF(dt=0.01, force=True)
+    sweep = curve.sweep({"R": np.linspace(1., 3., 200)}, model="SEIRF")
+    return {
+        "cases.xlsx": cache.fetch(LOCAL_CASES),
+        "cases": cases,
+        "do_SEIRF(dt=0.01)": run.df,
+        "sweep(200 runs)": sweep.df}
+
+
+def _size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, fname))
+        for root, _, fnames in os.walk(directory)
+        for fname in fnames if not fname.startswith("cache.db"))
+
+
+def bench_disk(disks=DISKS, repeat=REPEAT):
+    """Time to store and to load every value with every disk, and the size
+    of the files and the database.
+
+    """
+    rows = []
+    for name, value in values().items():
+        for disk_name, settings in disks:
+            with tempfile.TemporaryDirectory() as directory, dcache.Cache(
+                directory=directory, disk_min_file_size=0, **settings
+            ) as dc:
+                store = min(timeit.Timer(
+                    lambda: dc.set("value", value)).repeat(repeat, 1))
+                load = min(timeit.Timer(
+                    lambda: dc.get("value")).repeat(repeat, 1))
+                (db_size,), = dc._sql(
+                    "SELECT length(value) FROM Cache").fetchall()
+                size = _size(directory) + (db_size or 0)
+            rows.append((name, disk_name, store, load, size / 2 ** 20))
+    return rows
+
+
+def main():
+    print(
+        f"{'value':<20} {'disk':<14} {'store [ms]':>10} "
+        f"{'load [ms]':>10} {'size [MiB]':>11}")
+    for name, disk, store, load, size in bench_disk():
+        print(
+            f"{name:<20} {disk:<14} {store * 1e3:>10.3f} "
+            f"{load * 1e3:>10.3f} {size:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Benchmarks of the arcovid19 infection curve models.
+
+Run it as a script from the root of the repository::
+
+    $ python benchmarks/bench_models.py
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import arcovid19
+from arcovid19 import cache, models
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+MODELS = ["do_SIR", "do_SEIR", "do_SEIRF"]
+
+DTS = [1., 0.1, 0.01]
+
+T_MAX = 200
+
+REPEAT = 5
+
+SUBSTEPS = [1, 10, 100, 1000]
+
+SOLVERS = ["RK45", "DOP853", "LSODA"]
+
+REFERENCE_OPTIONS = {"rtol": 1e-10, "atol": 1e-8}
+
+STREAM_DTS = [0.01, 0.001]
+
+SWEEP_GRID = {
+    "R": [1 + i * 0.02 for i in range(100)],
+    "t_incubation": [3., 4., 5., 6., 7.],
+    "N_init": [1, 5, 10, 50, 100]}
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+def bench_integration(models=MODELS, dts=DTS, t_max=T_MAX, repeat=REPEAT):
+    """Time a single run of every model for every ``dt``.
+
+    The runs use ``force=True``, so every repetition integrates the model
+    again instead of reading the result from the cache.
+
+    """
+    curve = arcovid19.load_infection_curve()
+    rows = []
+    for mname in models:
+        method = getattr(curve, mname)
+        for dt in dts:
+            timer = timeit.Timer(
+                lambda: method(t_max=t_max, dt=dt, force=True))
+            best = min(timer.repeat(repeat=repeat, number=1))
+            n_steps = int(t_max / dt)
+            rows.append((mname, dt, n_steps, best, best / n_steps * 1e6))
+    return rows
+
+
+def bench_sweep(model_names=MODELS, grid=SWEEP_GRID, t_max=T_MAX):
+    """Time a sweep against the same runs integrated one by one."""
+    curve = arcovid19.load_infection_curve()
+    runs = list(models._expand_grid(grid))
+    rows = []
+    for mname in model_names:
+        model = mname.split("_", 1)[-1]
+
+        sweep = timeit.Timer(
+            lambda: curve.sweep(grid, model=model, t_max=t_max))
+        sweep_time = min(sweep.repeat(repeat=1, number=1))
+
+        def loop():
+            for run in runs:
+                method = getattr(arcovid19.load_infection_curve(**run), mname)
+                method(t_max=t_max, force=True)
+
+        loop_time = min(timeit.Timer(loop).repeat(repeat=1, number=1))
+        rows.append((model, len(runs), loop_time, sweep_time))
+    return rows
+
+
+def _euler(spec, curve, t_max, dt, substeps):
+    """Integrate with steps of ``dt / substeps`` but the delays of ``dt``
+    (``do_*`` with a smaller ``dt`` would change the delays of the model).
+
+    """
+    graph = spec.graph(curve, dt).compile()
+    params = {
+        pname: (
+            int(graph.get_edge(*edge)) * substeps if pname.startswith("lag_")
+            else graph.get_edge(*edge).item())
+        for pname, edge in spec.edges.items()}
+
+    ts = models._time_grid(t_max, dt / substeps)
+    series = {c: np.empty(len(ts)) for c in spec.compartments}
+    for c, arr in series.items():
+        arr[0] = graph.get_node_value(c)
+    spec.kernel(
+        *series.values(), dt=dt / substeps,
+        population=curve.population, **params)
+
+    series = {c: arr[::substeps] for c, arr in series.items()}
+    if spec.derived is not None:
+        spec.derived(series, curve.population)
+    return np.array(list(series.values()))
+
+
+def bench_solvers(
+    models_names=MODELS, substeps=SUBSTEPS, solvers=SOLVERS,
+    t_max=T_MAX, dt=1., repeat=REPEAT
+):
+    """Error against cost of Euler (with substeps) and the adaptive
+    solvers, relative to a tight solution of the same delayed model.
+
+    """
+    curve = arcovid19.load_infection_curve()
+    ts = models._time_grid(t_max, dt)
+    rows = []
+    for mname in models_names:
+        model = mname.split("_", 1)[-1]
+        spec = models._MODELS[model]
+        reference = np.array(list(models._solve_ivp(
+            spec, curve, ts, dt, "DOP853", REFERENCE_OPTIONS).values()))
+
+        candidates = [
+            (f"euler/{m}", lambda m=m: _euler(spec, curve, t_max, dt, m))
+            for m in substeps]
+        candidates.extend(
+            (solver, lambda solver=solver: np.array(list(models._solve_ivp(
+                spec, curve, ts, dt, solver, None).values())))
+            for solver in solvers)
+
+        for name, function in candidates:
+            timer = timeit.Timer(function)
+            best = min(timer.repeat(repeat=repeat, number=1))
+            error = np.abs(function() - reference).max() / curve.population
+            rows.append((model, name, best, error))
+    return rows
+
+
+def bench_streaming(dts=STREAM_DTS, t_max=T_MAX, output_dt=1.):
+    """Peak memory and time of a fine SEIRF run keeping every step against
+    reporting only every ``output_dt`` days.
+
+    """
+    curve = arcovid19.load_infection_curve()
+    curve.do_SEIRF(t_max=t_max)  # compile the JIT kernels before measuring
+    rows = []
+    for dt in dts:
+        for every in (None, output_dt):
+            tracemalloc.start()
+            elapsed = timeit.Timer(
+                lambda: curve.do_SEIRF(
+                    t_max=t_max, dt=dt, output_dt=every, force=True)
+            ).timeit(number=1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append((dt, every, elapsed, peak / 2 ** 20))
+    return rows
+
+
+def main():
+    # the forced runs still store their results, so keep them in the memory
+    # of the process instead of writing them to the cache of the user
+    cache.configure(backend="memory")
+
+    print(f"numba JIT: {models.JIT}")
+    print()
+    print(
+        f"{'model':<10} {'dt':>6} {'steps':>8} "
+        f"{'time [s]':>10} {'step [us]':>10}")
+    for mname, dt, n_steps, best, per_step in bench_integration():
+        print(
+            f"{mname:<10} {dt:>6} {n_steps:>8} "
+            f"{best:>10.4f} {per_step:>10.3f}")
+
+    print()
+    print(f"{'model':<10} {'solver':<12} {'time [s]':>10} {'error':>10}")
+    for model, name, best, error in bench_solvers():
+        print(f"{model:<10} {name:<12} {best:>10.4f} {error:>10.2e}")
+
+    print()
+    print(
+        f"{'dt':>8} {'output_dt':>10} {'time [s]':>10} {'peak [MiB]':>11}")
+    for dt, every, elapsed, peak in bench_streaming():
+        print(f"{dt:>8} {str(every):>10} {elapsed:>10.4f} {peak:>11.2f}")
+
+    print()
+    print(f"{'sweep':<10} {'runs':>8} {'loop [s]':>10} {'sweep [s]':>10}")
+    for model, n_runs, loop_time, sweep_time in bench_sweep():
+        print(
+            f"{model:<10} {n_runs:>8} "
+            f"{loop_time:>10.4f} {sweep_time:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
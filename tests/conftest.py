@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Fixtures shared by the test suite
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import threading
+from http import server
+
+import pytest
+
+import diskcache as dcache
+
+from arcovid19 import cache
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+@pytest.fixture
+def private_cache(tmp_path, monkeypatch):
+    """A disk cache only for the test, with an empty memory cache and empty
+    stats.
+
+    The default cache is shared with (and cleared by) the tests running in
+    other processes, and the memory cache and the stats live as long as the
+    process.
+
+    """
+    with dcache.Cache(
+        directory=str(tmp_path / "cache"), disk=cache.ColumnarDisk
+    ) as private:
+        # getattr(cache, "CACHE") would create the default cache
+        monkeypatch.setitem(vars(cache), "CACHE", private)
+        monkeypatch.setattr(cache, "MEMORY_CACHE", cache.MemoryCache())
+        monkeypatch.setattr(cache, "_STATS", {})
+        yield private
+
+
+@pytest.fixture
+def http_server():
+    """Start local HTTP servers for the test.
+
+    The fixture is a function that serves the requests with ``handler`` (a
+    ``http.server.BaseHTTPRequestHandler`` or a factory of them) and
+    returns the base url of the server. The servers are stopped at the end
+    of the test.
+
+    """
+    servers = []
+
+    def start(handler):
+        httpd = server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        servers.append(httpd)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        host, port = httpd.server_address
+        return f"http://{host}:{port}"
+
+    try:
+        yield start
+    finally:
+        for httpd in servers:
+            httpd.shutdown()
+            httpd.server_close()
@@ -0,0 +1,1013 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Test suite
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import os
+import sys
+import time
+import pickle
+import sqlite3
+import threading
+import subprocess
+import multiprocessing
+import urllib.error
+from http import server
+
+import pytest
+
+import numpy as np
+
+import pandas as pd
+
+import attr
+
+import diskcache as dcache
+
+from arcovid19 import cache, cli
+
+
+# =============================================================================
+# SETUP
+# =============================================================================
+
+pytestmark = pytest.mark.usefixtures("private_cache")
+
+
+class Resource(server.BaseHTTPRequestHandler):
+    """Serve ``content`` with an ETag and/or a Last-Modified header and
+    honor the conditional requests.
+
+    """
+
+    content = b"a,b\n1,2\n"
+    use_etag = True
+    use_last_modified = True
+    requests = []
+
+    @property
+    def etag(self):
+        return f'"{hash(self.content)}"'
+
+    last_modified = "Sat, 09 May 2020 10:00:00 GMT"
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+
+        same_etag = self.headers.get("If-None-Match") == self.etag
+        same_date = self.headers.get("If-Modified-Since") == self.last_modified
+        not_modified = any([
+            self.use_etag and same_etag,
+            self.use_last_modified and same_date])
+
+        self.send_response(304 if not_modified else 200)
+        if self.use_etag:
+            self.send_header("ETag", self.etag)
+        if self.use_last_modified:
+            self.send_header("Last-Modified", self.last_modified)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_resource(http_server):
+    handler = type("Handler", (Resource,), {"requests": []})
+    handler.url = f"{http_server(handler)}/data.csv"
+    return handler
+
+
+def expire_all(stale=False):
+    """Expire every url cached. If ``stale`` is False they are also too old
+    to be returned while they are revalidated.
+
+    """
+    expire_time = time.time() - (1 if stale else cache.CACHE_MAX_STALE + 1)
+    cache.MEMORY_CACHE.clear()
+    for key in list(cache.CACHE):
+        if key[:2] == ("arcovid19", "fetch"):
+            cached = cache.CACHE[key]
+            cache.CACHE[key] = attr.evolve(cached, expire_time=expire_time)
+
+
+def wait_refresh():
+    for thread in list(cache._REFRESHING.values()):
+        thread.join()
+
+
+class Counter:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        return dict(kwargs, call=self.calls)
+
+
+# =============================================================================
+# DISK
+# =============================================================================
+
+def mode_of(dc, key):
+    (mode, filename), = dc._sql(
+        "SELECT mode, filename FROM Cache WHERE key = ?", (key,)).fetchall()
+    return mode, filename
+
+
+def test_columnar_disk_array(private_cache):
+    arr = np.arange(2 ** 13, dtype=float).reshape(-1, 4)
+    private_cache.set("arr", arr)
+    private_cache.set("fortran", np.asfortranarray(arr))
+
+    result = private_cache.get("arr")
+    np.testing.assert_array_equal(result, arr)
+    assert not result.flags.writeable
+
+    result = private_cache.get("fortran")
+    np.testing.assert_array_equal(result, arr)
+    assert result.flags.f_contiguous
+
+    assert mode_of(private_cache, "arr")[0] == cache.MODE_COLUMNAR
+
+
+def test_columnar_disk_small_arrays(private_cache):
+    arr = np.arange(1000, dtype=float)
+    private_cache.set("arr", arr)
+
+    result = private_cache.get("arr")
+    np.testing.assert_array_equal(result, arr)
+    assert mode_of(private_cache, "arr") == (dcache.core.MODE_PICKLE, None)
+
+
+def test_columnar_disk_without_out_of_band(private_cache, monkeypatch):
+    # Python 3.7, without the protocol 5
+    monkeypatch.setattr(cache, "_PICKLE_PROTOCOL", 4)
+    monkeypatch.setattr(cache, "_OUT_OF_BAND", False)
+    arr = np.arange(2 ** 13, dtype=float)
+    private_cache.set("arr", arr)
+
+    result = private_cache.get("arr")
+    np.testing.assert_array_equal(result, arr)
+    assert result.flags.writeable
+    mode, filename = mode_of(private_cache, "arr")
+    assert mode == dcache.core.MODE_PICKLE and filename is not None
+
+
+def test_columnar_disk_old_format(private_cache):
+    # the values stored before the compression without codec
+    arr = np.arange(2 ** 13, dtype=float)
+    private_cache.set("arr", arr)
+    (value,), = private_cache._sql("SELECT value FROM Cache").fetchall()
+    header, spans, codec = pickle.loads(value)
+    old = sqlite3.Binary(pickle.dumps((header, spans)))
+    private_cache._sql("UPDATE Cache SET value = ?", (old,))
+
+    np.testing.assert_array_equal(private_cache.get("arr"), arr)
+
+
+def test_columnar_disk_dataframe(private_cache):
+    df = pd.DataFrame({
+        "a": np.arange(100, dtype=float),
+        "b": np.arange(100),
+        "c": ["x"] * 100}, index=pd.date_range("2020-03-01", periods=100))
+    private_cache.set("df", {"df": df, "alignment": [np.arange(3)]})
+
+    result = private_cache.get("df")
+    pd.testing.assert_frame_equal(result["df"], df)
+    np.testing.assert_array_equal(result["alignment"][0], np.arange(3))
+
+
+@pytest.mark.parametrize("value", [
+    b"bytes", "text", 1, 1.5, {"a": [1, 2]}, np.array([]),
+    np.arange(10, dtype=object)])
+def test_columnar_disk_other_values(private_cache, value):
+    private_cache.set("value", value)
+    result = private_cache.get("value")
+    if isinstance(value, np.ndarray):
+        np.testing.assert_array_equal(result, value)
+    else:
+        assert result == value
+
+    (mode,), = private_cache._sql("SELECT mode FROM Cache").fetchall()
+    assert mode != cache.MODE_COLUMNAR
+
+
+def test_columnar_disk_removes_file(private_cache):
+    private_cache.set("arr", np.arange(2 ** 13))
+    (filename,), = private_cache._sql(
+        "SELECT filename FROM Cache").fetchall()
+    path = os.path.join(private_cache.directory, filename)
+    assert os.path.exists(path)
+
+    del private_cache["arr"]
+
+    assert not os.path.exists(path)
+
+
+@pytest.fixture
+def compressed_cache(tmp_path):
+    with dcache.Cache(
+        directory=str(tmp_path / "compressed"), disk=cache.ColumnarDisk,
+        disk_compression="zlib"
+    ) as compressed:
+        yield compressed
+
+
+@pytest.mark.parametrize("size, filename", [(100, False), (100000, True)])
+def test_columnar_disk_compression(compressed_cache, size, filename):
+    value = {"text": [f"arcovid19-{idx}" for idx in range(size)]}
+    compressed_cache.set("value", value)
+
+    assert compressed_cache.get("value") == value
+    mode, stored = mode_of(compressed_cache, "value")
+    assert mode == cache.MODE_COMPRESSED
+    assert (stored is not None) == filename
+
+
+def test_columnar_disk_compression_small_or_random(compressed_cache):
+    compressed_cache.set("small", {"a": 1})
+    compressed_cache.set("random", {"a": os.urandom(10000)})
+
+    assert mode_of(compressed_cache, "small")[0] == dcache.core.MODE_PICKLE
+    assert mode_of(compressed_cache, "random")[0] == dcache.core.MODE_PICKLE
+    assert compressed_cache.get("small") == {"a": 1}
+
+
+@pytest.mark.parametrize("min_ratio, mode", [
+    (0.8, dcache.core.MODE_PICKLE), (0.95, cache.MODE_COMPRESSED)])
+def test_columnar_disk_compress_min_ratio(tmp_path, min_ratio, mode):
+    # about 10% of the value can be compressed
+    value = {"a": os.urandom(9000) + bytes(1000)}
+    with dcache.Cache(
+        directory=str(tmp_path), disk=cache.ColumnarDisk,
+        disk_compression="zlib", disk_compress_min_ratio=min_ratio
+    ) as dc:
+        dc.set("value", value)
+        assert mode_of(dc, "value")[0] == mode
+        assert dc.get("value") == value
+
+
+def test_columnar_disk_compression_columnar(compressed_cache):
+    df = pd.DataFrame({
+        "a": np.arange(2 ** 13, dtype=float),
+        "b": ["arcovid19"] * 2 ** 13})
+    compressed_cache.set("df", df)
+
+    pd.testing.assert_frame_equal(compressed_cache.get("df"), df)
+    assert mode_of(compressed_cache, "df")[0] == cache.MODE_COLUMNAR
+    (value,), = compressed_cache._sql("SELECT value FROM Cache").fetchall()
+    assert pickle.loads(value)[2] == "zlib"
+
+
+def test_columnar_disk_compress_arrays(tmp_path):
+    arr = np.zeros(2 ** 13)
+    with dcache.Cache(
+        directory=str(tmp_path), disk=cache.ColumnarDisk,
+        disk_compression="zlib", disk_compress_arrays=True
+    ) as dc:
+        dc.set("arr", arr)
+        result = dc.get("arr")
+        mode, filename = mode_of(dc, "arr")
+
+    np.testing.assert_array_equal(result, arr)
+    assert result.flags.writeable
+    assert mode == cache.MODE_COMPRESSED
+    assert filename is None  # 64 KiB of zeros are very small compressed
+
+
+def test_columnar_disk_unknown_codec(tmp_path):
+    with pytest.raises(ValueError):
+        dcache.Cache(
+            directory=str(tmp_path), disk=cache.ColumnarDisk,
+            disk_compression="snappy")
+
+
+# =============================================================================
+# MEMORY CACHE
+# =============================================================================
+
+def test_memory_cache_lru():
+    memory = cache.MemoryCache(maxsize=2)
+    memory.set("a", 1)
+    memory.set("b", 2)
+    assert memory.get("a") == 1
+
+    memory.set("c", 3)
+
+    assert memory.get("b") is None
+    assert memory.get("a") == 1
+    assert memory.get("c") == 3
+    assert memory.stats() == {
+        "hits": 3, "misses": 1, "size": 2, "maxsize": 2}
+
+
+def test_memory_cache_expire():
+    memory = cache.MemoryCache(ttl=60)
+    memory.set("a", 1, expire_time=time.time() - 1)
+    memory.set("b", 2, expire_time=time.time() + 3600)
+
+    assert memory.get("a", default="miss") == "miss"
+    assert len(memory) == 1
+    assert memory._data["b"][0] <= time.time() + 60
+
+
+def test_memory_cache_disabled():
+    memory = cache.MemoryCache(maxsize=0)
+    memory.set("a", 1)
+    assert memory.get("a") is None
+    assert len(memory) == 0
+
+
+def test_memory_cache_clear():
+    memory = cache.MemoryCache()
+    memory.set("a", 1)
+    memory.get("a")
+
+    memory.clear()
+
+    assert memory.stats() == {
+        "hits": 0, "misses": 0, "size": 0, "maxsize": memory.maxsize}
+    assert repr(memory) == "MemoryCache(size=0, maxsize=32, hits=0, misses=0)"
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+@pytest.fixture
+def config(monkeypatch):
+    # configure changes these globals
+    for name in (
+        "CACHE", "CACHE_BACKEND", "CACHE_DIR", "CACHE_SIZE_LIMIT",
+        "CACHE_EVICTION_POLICY", "CACHE_COMPRESSION"
+    ):
+        monkeypatch.setitem(vars(cache), name, vars(cache).get(name))
+
+
+def test_import_does_not_create_cache(tmp_path):
+    directory = tmp_path / "configured"
+    code = (
+        "import os, arcovid19; "
+        f"assert not os.path.exists({str(directory)!r}); "
+        "arcovid19.CACHE; "
+        f"assert os.path.exists({str(directory)!r})")
+    env = dict(os.environ, ARCOVID19_CACHE_DIR=str(directory))
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+def test_configure(config, tmp_path):
+    cache.configure(
+        backend="diskcache", directory=tmp_path / "configured",
+        size_limit=2 ** 20, eviction_policy="least-recently-used")
+
+    result = cache.get_cache()
+    assert isinstance(result, dcache.Cache)
+    assert result.directory == str(tmp_path / "configured")
+    assert result.size_limit == 2 ** 20
+    assert result.eviction_policy == "least-recently-used"
+    assert cache.CACHE is result
+    assert cache.get_cache() is result
+
+    cache.configure(backend="memory")
+
+    result = cache.get_cache()
+    assert isinstance(result, cache.MemoryBackend)
+    assert result.size_limit == 2 ** 20
+    assert result.eviction_policy == "least-recently-used"
+
+
+@pytest.mark.parametrize("compression, expected", [
+    ("zlib", "zlib"), ("none", None)])
+def test_configure_compression(config, tmp_path, compression, expected):
+    cache.configure(
+        backend="diskcache", directory=tmp_path / "configured",
+        compression=compression)
+
+    assert cache.get_cache().disk.compression == expected
+    assert cache.get_cache().disk.min_file_size == cache.CACHE_MIN_FILE_SIZE
+
+
+def test_default_compression():
+    code = (
+        "from arcovid19 import cache; "
+        "print(cache.CACHE_COMPRESSION)")
+    env = {
+        k: v for k, v in os.environ.items()
+        if k != "ARCOVID19_CACHE_COMPRESSION"}
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True,
+        capture_output=True, text=True)
+
+    expected = next(
+        (codec for codec in ("zstd", "lz4") if codec in cache.CODECS), None)
+    assert result.stdout.strip() == str(expected)
+
+
+def test_configure_shm(config, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "SHM_DIR", str(tmp_path))
+    cache.configure(backend="shm")
+    assert cache.get_cache().directory == str(tmp_path / "arcovid19_cache")
+
+    monkeypatch.setattr(cache, "SHM_DIR", str(tmp_path / "missing"))
+    cache.configure(backend="shm")
+    with pytest.raises(ValueError):
+        cache.get_cache()
+
+
+def test_configure_invalid(config):
+    with pytest.raises(ValueError):
+        cache.configure(backend="redis")
+    with pytest.raises(ValueError):
+        cache.configure(eviction_policy="random")
+    with pytest.raises(ValueError):
+        cache.configure(compression="snappy")
+    assert cache.CACHE_BACKEND != "redis"
+
+
+def test_memory_backend():
+    backend = cache.MemoryBackend()
+    assert backend.set("a", 1, tag="t")
+    assert not backend.add("a", 2)
+    assert backend.add("b", 2, expire=-1)
+    assert backend.add("b", 3, expire=60)
+
+    assert backend.get("a") == 1
+    assert backend.get("b", expire_time=True)[0] == 3
+    assert backend.get("c", expire_time=True, tag=True) == (None, None, None)
+    assert backend.get("a", tag=True) == (1, "t")
+    assert backend["b"] == 3
+    assert "a" in backend
+    assert list(backend) == ["a", "b"]
+    with pytest.raises(KeyError):
+        backend["c"]
+
+    assert backend.evict("t") == 1
+    assert list(backend) == ["b"]
+
+    backend.set("c", 4, expire=-1)
+    assert "c" not in backend
+    assert backend.expire() == 1
+
+    del backend["b"]
+    assert len(backend) == 0
+    assert backend.volume() == 0
+
+
+@pytest.mark.parametrize("out_of_band", [True, False])
+def test_sizeof(out_of_band, monkeypatch):
+    monkeypatch.setattr(cache, "_OUT_OF_BAND", out_of_band)
+    arr = np.zeros(1000)
+    assert cache._sizeof(arr) >= arr.nbytes
+
+    backend = cache.MemoryBackend()
+    backend.set("arr", arr)
+    assert backend.volume() == cache._sizeof(arr)
+
+
+@pytest.mark.parametrize("policy, remaining", [
+    ("least-recently-stored", ["b", "c"]),
+    ("least-recently-used", ["a", "c"]),
+    ("least-frequently-used", ["a", "c"]),
+    ("none", ["a", "b", "c"])])
+def test_memory_backend_eviction(policy, remaining):
+    arr = np.zeros(100)
+    size = cache._sizeof(arr)
+
+    backend = cache.MemoryBackend(
+        size_limit=size * 2, eviction_policy=policy)
+    backend.set("a", arr)
+    time.sleep(0.001)
+    backend.set("b", arr)
+    time.sleep(0.001)
+    backend.get("a")
+    backend.set("c", arr)
+
+    assert sorted(backend) == remaining
+
+
+def test_from_cache_memory_backend(config):
+    cache.configure(backend="memory")
+    function = Counter()
+
+    cache.from_cache(tag="test", function=function, a=1)
+    cache.MEMORY_CACHE.clear()
+    result = cache.from_cache(tag="test", function=function, a=1)
+
+    assert result == {"a": 1, "call": 1}
+    assert isinstance(cache.CACHE, cache.MemoryBackend)
+
+
+# =============================================================================
+# FROM CACHE
+# =============================================================================
+
+def test_from_cache_memory_hit():
+    function = Counter()
+
+    first = cache.from_cache(tag="test", function=function, x=1)
+    second = cache.from_cache(tag="test", function=function, x=1)
+
+    assert function.calls == 1
+    assert second is first
+    assert cache.MEMORY_CACHE.hits == 1
+
+
+def test_from_cache_disk_hit():
+    function = Counter()
+    first = cache.from_cache(tag="test", function=function, x=1)
+    cache.MEMORY_CACHE.clear()
+
+    second = cache.from_cache(tag="test", function=function, x=1)
+    third = cache.from_cache(tag="test", function=function, x=1)
+
+    assert function.calls == 1
+    assert second == first and second is not first
+    assert third is second
+    assert cache.MEMORY_CACHE.stats()["hits"] == 1
+    assert cache.MEMORY_CACHE.stats()["misses"] == 1
+
+
+def test_from_cache_memory_agrees_with_disk(private_cache):
+    cache.from_cache(tag="test", function=Counter(), x=1)
+
+    ((key, (memory_expire, _)),) = cache.MEMORY_CACHE._data.items()
+    _, disk_expire = private_cache.get(key, expire_time=True)
+
+    assert memory_expire == pytest.approx(disk_expire, abs=1)
+
+
+def test_from_cache_force():
+    function = Counter()
+    cache.from_cache(tag="test", function=function, x=1)
+
+    forced = cache.from_cache(tag="test", function=function, force=True, x=1)
+    cached = cache.from_cache(tag="test", function=function, x=1)
+
+    assert function.calls == 2
+    assert forced["call"] == 2
+    assert cached is forced
+
+
+def slow_count(path, delay=0.3):
+    """Append a line to ``path`` and return the number of lines."""
+    with open(path, "a") as fp:
+        fp.write("call\n")
+    time.sleep(delay)
+    with open(path) as fp:
+        return len(fp.readlines())
+
+
+def test_from_cache_single_flight_threads(tmp_path):
+    path = tmp_path / "calls.txt"
+    results = []
+
+    def run():
+        results.append(
+            cache.from_cache(tag="test", function=slow_count, path=path))
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [1] * 8
+    assert path.read_text() == "call\n"
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="the private cache is shared with fork")
+def test_from_cache_single_flight_processes(tmp_path):
+    path = tmp_path / "calls.txt"
+    context = multiprocessing.get_context("fork")
+
+    def run():
+        cache.MEMORY_CACHE.clear()
+        cache.from_cache(tag="test", function=slow_count, path=path)
+
+    processes = [context.Process(target=run) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [p.exitcode for p in processes] == [0] * 4
+    assert path.read_text() == "call\n"
+    assert cache.from_cache(tag="test", function=slow_count, path=path) == 1
+
+
+def test_from_cache_lock_released_on_error(private_cache):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        cache.from_cache(tag="test", function=fail)
+
+    assert len(private_cache) == 0
+    assert cache.from_cache(tag="test", function=lambda: 1) == 1
+
+
+def test_from_cache_unhashable_key():
+    function = Counter()
+
+    cache.from_cache(tag="test", function=function, x=[1, 2])
+    result = cache.from_cache(tag="test", function=function, x=[1, 2])
+
+    assert function.calls == 1
+    assert result == {"x": [1, 2], "call": 1}
+    assert len(cache.MEMORY_CACHE) == 0
+
+
+def test_from_cache_does_not_expire(private_cache, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("expire in the request path")
+
+    monkeypatch.setattr(private_cache, "expire", fail)
+    monkeypatch.setattr(private_cache, "cull", fail)
+
+    cache.from_cache(tag="test", function=lambda: 1)
+    cache.MEMORY_CACHE.clear()
+
+    assert cache.from_cache(tag="test", function=lambda: 2) == 1
+
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+
+@pytest.fixture
+def no_cull_on_set(private_cache):
+    # by default diskcache removes some expired values in every set
+    private_cache.reset("cull_limit", 0)
+
+
+def test_cull(private_cache, no_cull_on_set):
+    private_cache.reset("size_limit", 2 ** 20)
+    private_cache.set("expired", 1, expire=-1)
+    for idx in range(20):  # 64 KiB each
+        private_cache.set(idx, np.zeros(2 ** 16 // 8))
+
+    # diskcache evicts the oldest values in batches of 10
+    assert cache.cull() == 11
+    assert list(private_cache) == list(range(10, 20))
+    assert private_cache.volume() < 2 ** 20
+
+
+def test_cull_policy_none(private_cache, no_cull_on_set):
+    private_cache.reset("size_limit", 0)
+    private_cache.reset("eviction_policy", "none")
+    private_cache.set("expired", 1, expire=-1)
+    private_cache.set("value", 1)
+
+    assert cache.cull() == 1
+    assert list(private_cache) == ["value"]
+
+
+def test_cull_in_background(private_cache, no_cull_on_set, monkeypatch):
+    monkeypatch.setattr(cache, "CULL_INTERVAL", 60)
+    monkeypatch.setattr(cache, "_next_cull", None)
+    private_cache.set("expired", 1, expire=-1)
+
+    # the first call only schedules the next cull
+    assert cache._cull_in_background() is None
+
+    monkeypatch.setattr(cache, "_next_cull", time.monotonic())
+    cache._cull_in_background().join()
+    assert "expired" not in private_cache.iterkeys()
+
+    # other process culled the cache in this interval
+    private_cache.set("expired", 1, expire=-1)
+    monkeypatch.setattr(cache, "_next_cull", time.monotonic())
+    cache._cull_in_background().join()
+    assert "expired" in private_cache.iterkeys()
+
+    # and before the next cull of this process
+    assert cache._cull_in_background() is None
+
+
+def test_cull_in_background_disabled(monkeypatch):
+    monkeypatch.setattr(cache, "CULL_INTERVAL", None)
+    monkeypatch.setattr(cache, "_next_cull", 0)
+    assert cache._cull_in_background() is None
+
+
+def test_cli_cache_cull(private_cache, no_cull_on_set):
+    private_cache.set("expired", 1, expire=-1)
+    assert cli.cache_cull().startswith("1 values removed")
+    assert len(private_cache) == 0
+
+
+# =============================================================================
+# URLS
+# =============================================================================
+
+def test_fetch(http_resource):
+    first = cache.fetch(http_resource.url)
+    second = cache.fetch(http_resource.url)
+
+    assert first.content == http_resource.content
+    assert first.etag == f'"{hash(http_resource.content)}"'
+    assert first.last_modified == http_resource.last_modified
+    assert not first.expired
+    assert second is first
+    assert len(http_resource.requests) == 1
+
+
+@pytest.mark.parametrize(
+    "use_etag, use_last_modified, header",
+    [(True, False, "If-None-Match"), (False, True, "If-Modified-Since")])
+def test_fetch_revalidate(
+    http_resource, use_etag, use_last_modified, header
+):
+    http_resource.use_etag = use_etag
+    http_resource.use_last_modified = use_last_modified
+
+    first = cache.fetch(http_resource.url)
+    expire_all()
+    second = cache.fetch(http_resource.url)
+
+    assert len(http_resource.requests) == 2
+    assert header in http_resource.requests[1]
+    assert second.content == first.content
+    assert second.digest == first.digest
+    assert not second.expired
+
+    # the new expiration is stored in the disk
+    cache.MEMORY_CACHE.clear()
+    cache.fetch(http_resource.url)
+    assert len(http_resource.requests) == 2
+
+
+def test_fetch_modified(http_resource):
+    cache.fetch(http_resource.url)
+    http_resource.content = b"a,b\n3,4\n"
+    http_resource.last_modified = "Sun, 10 May 2020 10:00:00 GMT"
+    expire_all()
+
+    result = cache.fetch(http_resource.url)
+
+    assert result.content == b"a,b\n3,4\n"
+    assert len(http_resource.requests) == 2
+
+
+def test_fetch_force(http_resource):
+    cache.fetch(http_resource.url)
+    cache.fetch(http_resource.url, force=True)
+
+    assert len(http_resource.requests) == 2
+    assert "If-None-Match" not in http_resource.requests[1]
+
+
+def test_fetch_not_found(http_resource):
+    http_resource.do_GET = lambda self: self.send_error(404)
+    with pytest.raises(urllib.error.HTTPError):
+        cache.fetch(http_resource.url)
+
+
+def test_fetch_path(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+
+    from_path = cache.fetch(path)
+    from_url = cache.fetch(path.as_uri())
+
+    assert from_path.content == from_url.content == b"a,b\n1,2\n"
+    assert from_path.expired
+
+
+def test_fetch_stale_while_revalidate(http_resource):
+    first = cache.fetch(http_resource.url)
+    http_resource.content = b"a,b\n3,4\n"
+    http_resource.last_modified = "Sun, 10 May 2020 10:00:00 GMT"
+    expire_all(stale=True)
+
+    stale = cache.fetch(http_resource.url)
+    wait_refresh()
+    fresh = cache.fetch(http_resource.url)
+
+    assert stale.content == first.content
+    assert fresh.content == b"a,b\n3,4\n"
+    assert not fresh.expired
+    assert len(http_resource.requests) == 2
+
+
+def test_fetch_stale_single_refresh(http_resource):
+    cache.fetch(http_resource.url)
+    expire_all(stale=True)
+
+    release = threading.Event()
+    do_GET = http_resource.do_GET
+
+    def slow_GET(self):
+        release.wait(10)
+        do_GET(self)
+
+    http_resource.do_GET = slow_GET
+    results = [cache.fetch(http_resource.url) for _ in range(5)]
+    release.set()
+    wait_refresh()
+
+    assert len({r.digest for r in results}) == 1
+    assert len(http_resource.requests) == 2
+    assert not cache.fetch(http_resource.url).expired
+
+
+def test_fetch_stale_refresh_error(http_resource, caplog):
+    first = cache.fetch(http_resource.url)
+    expire_all(stale=True)
+    http_resource.do_GET = lambda self: self.send_error(500)
+
+    stale = cache.fetch(http_resource.url)
+    wait_refresh()
+
+    assert stale.content == first.content
+    assert cache.fetch(http_resource.url).expired
+    assert "Can't revalidate" in caplog.text
+    wait_refresh()
+
+
+def test_fetch_max_stale_zero(http_resource):
+    cache.fetch(http_resource.url)
+    http_resource.content = b"a,b\n3,4\n"
+    http_resource.last_modified = "Sun, 10 May 2020 10:00:00 GMT"
+    expire_all(stale=True)
+
+    result = cache.fetch(http_resource.url, max_stale=0)
+
+    assert result.content == b"a,b\n3,4\n"
+    assert cache._REFRESHING == {}
+
+
+def test_fetch_single_flight(http_resource):
+    release = threading.Event()
+    do_GET = http_resource.do_GET
+
+    def slow_GET(self):
+        release.wait(10)
+        do_GET(self)
+
+    http_resource.do_GET = slow_GET
+    results = []
+
+    def run():
+        results.append(cache.fetch(http_resource.url))
+
+    threads = [threading.Thread(target=run) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    assert {r.content for r in results} == {http_resource.content}
+    assert len(http_resource.requests) == 1
+
+
+def test_fetch_stale_refresh_locked_by_other_process(http_resource):
+    cache.fetch(http_resource.url)
+    expire_all(stale=True)
+
+    key = ("arcovid19", "fetch", http_resource.url)
+    cache.CACHE.add(cache._lock_key(key), None)
+
+    stale = cache.fetch(http_resource.url)
+    wait_refresh()
+
+    assert stale.expired
+    assert len(http_resource.requests) == 1
+
+
+# =============================================================================
+# STATS
+# =============================================================================
+
+def test_stats_from_cache():
+    def function():
+        time.sleep(0.01)
+        return np.zeros(1000)
+
+    cache.from_cache(tag="test", function=function)
+    cache.from_cache(tag="test", function=function)  # memory
+    cache.MEMORY_CACHE.clear()
+    cache.from_cache(tag="test", function=function)  # disk
+    cache.from_cache(tag="other", function=lambda: 1)
+
+    stats = cache.stats()
+    assert list(stats) == ["other", "test"]
+
+    test = stats["test"]
+    assert test["hits"] == 2
+    assert test["misses"] == 1
+    assert test["stale"] == 0
+    assert test["hit_rate"] == pytest.approx(2 / 3)
+    assert test["compute_time"] >= 0.01
+    assert test["bytes"] >= 8000
+
+    assert stats["other"]["hits"] == 0
+    assert stats["other"]["hit_rate"] == 0
+
+
+def test_stats_fetch(http_resource):
+    cache.fetch(http_resource.url)
+    cache.fetch(http_resource.url)
+    expire_all(stale=True)
+    cache.fetch(http_resource.url)
+    wait_refresh()
+
+    stats = cache.stats()["cache.fetch"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["stale"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["bytes"] == 2 * len(http_resource.content)
+
+
+def test_stats_flush_interval(private_cache, monkeypatch):
+    monkeypatch.setattr(cache, "STATS_FLUSH_INTERVAL", 60)
+    monkeypatch.setattr(cache, "_next_stats_flush", None)
+
+    cache.from_cache(tag="test", function=lambda: 1)
+    cache.from_cache(tag="test", function=lambda: 1)
+
+    # only the first call was written
+    assert private_cache.get(cache._stats_key("test", "misses")) == 1
+    assert private_cache.get(cache._stats_key("test", "hits")) is None
+    assert cache.stats()["test"]["hits"] == 1
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="the private cache is shared with fork")
+def test_stats_processes():
+    context = multiprocessing.get_context("fork")
+
+    def run():
+        cache.from_cache(tag="test", function=lambda: 1)
+        cache._flush_stats()
+
+    processes = [context.Process(target=run) for _ in range(4)]
+    for process in processes:
+        process.start()
+        process.join()
+
+    stats = cache.stats()["test"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 3
+
+
+def test_clear_tag():
+    cache.from_cache(tag="test", function=lambda: 1)
+    cache.from_cache(tag="other", function=lambda: 2)
+
+    assert cache.clear(tag="test") == 1
+    assert len(cache.MEMORY_CACHE) == 0
+    assert cache.from_cache(tag="test", function=lambda: 3) == 3
+    assert cache.from_cache(tag="other", function=lambda: 4) == 2
+
+
+def test_cli_cache_stats():
+    cache.from_cache(tag="test", function=lambda: 1)
+    cache.from_cache(tag="test", function=lambda: 1)
+
+    header, row = cli.cache_stats().splitlines()
+    assert header.split()[:4] == ["tag", "hits", "misses", "stale"]
+    assert row.split()[:5] == ["test", "1", "1", "0", "50.0%"]
+
+
+def test_cli_cache_clear(private_cache):
+    cache.from_cache(tag="test", function=lambda: 1)
+    cache.from_cache(tag="other", function=lambda: 1)
+
+    assert cli.cache_clear(tag="test") == "1 values removed"
+    assert cli.cache_clear().endswith("values removed")
+    assert len(private_cache) == 0
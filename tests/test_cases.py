@@ -25,6 +25,9 @@
 
 import os
 import pathlib
+import datetime as dt
+import functools
+from http import server
 
 import pytest
 
@@ -46,6 +49,8 @@ PATH = pathlib.Path(os.path.abspath(os.path.dirname(__file__)))
 
 LOCAL_CASES = PATH.parent / "databases" / "cases.xlsx"
 
+LOCAL_CASES_CSV = PATH.parent / "databases" / "cases.csv"
+
 LOCAL_AREA_POP = PATH.parent / "databases" / "extra" / "arg_provs.dat"
 
 
@@ -53,8 +58,7 @@ LOCAL_AREA_POP = PATH.parent / "databases" / "extra" / "arg_provs.dat"
 # SETUP
 # =============================================================================
 
-def setup_function(func):
-    arcovid19.CACHE.clear()
+pytestmark = pytest.mark.usefixtures("private_cache")
 
 
 # =============================================================================
@@ -84,6 +88,148 @@ def test_load_cases_local():
     assert isinstance(df, arcovid19.cases.CasesFrame)
 
 
+def test_load_cases_http(http_server):
+    class Handler(server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    url = http_server(
+        functools.partial(Handler, directory=str(LOCAL_CASES.parent)))
+    df = arcovid19.load_cases(
+        cases_url=f"{url}/cases.xlsx",
+        areas_pop_url=f"{url}/extra/arg_provs.dat",
+        force=True)
+
+    expected = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+    pd.testing.assert_frame_equal(df.df, expected.df)
+    pd.testing.assert_frame_equal(df.areapop, expected.areapop)
+
+
+def test_load_cases_cached(private_cache, monkeypatch):
+    expected = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the cases were parsed again")
+
+    monkeypatch.setattr(arcovid19.cases, "_parse_cases", fail)
+
+    df = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+    pd.testing.assert_frame_equal(df.df, expected.df)
+    pd.testing.assert_frame_equal(df.areapop, expected.areapop)
+
+    # the values in memory and disk are the same
+    arcovid19.cache.MEMORY_CACHE.clear()
+    df = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+    pd.testing.assert_frame_equal(df.df, expected.df)
+
+    with pytest.raises(AssertionError):
+        arcovid19.load_cases(
+            cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP, force=True)
+
+
+def test_load_cases_cached_copy(private_cache):
+    df = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+    df.df.loc[("ARG", "C"), df.dates] = -1
+    df.areapop.iloc[0, 0] = -1
+
+    again = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+
+    assert (again.df.loc[("ARG", "C"), again.dates] >= 0).all()
+    assert again.areapop.iloc[0, 0] != -1
+
+
+def test_load_cases_source_changed(private_cache, tmp_path):
+    areas_pop = tmp_path / "arg_provs.dat"
+    areas_pop.write_bytes(LOCAL_AREA_POP.read_bytes())
+    first = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=areas_pop)
+
+    content = LOCAL_AREA_POP.read_text().splitlines()
+    content[1] = "BA,1,-1"
+    areas_pop.write_text("\n".join(content))
+    second = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=areas_pop)
+
+    assert second.areapop["pop"].iloc[0] == -1
+    assert first.areapop["pop"].iloc[0] != -1
+
+
+def test_load_cases_index():
+    df = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+
+    provincias = df.index.get_level_values("cod_provincia")
+    status = df.index.get_level_values("cod_status")
+    assert df.index.names == ["cod_provincia", "cod_status"]
+    cases = status != "growth_rate_C"
+    assert list(df.provincia_status[cases]) == [
+        f"{pcia}_{stat}"
+        for pcia, stat in zip(provincias[cases], status[cases])]
+    assert set(provincias) == set(arcovid19.cases.PROVINCIAS.values()) | {
+        "ARG"}
+
+    # every row "<provincia> Casos <status>" has its codes
+    parsed = df.df[provincias != "ARG"]
+    for (pcia, stat), pcia_status in parsed.Pcia_status.items():
+        *name, _, stat_name = pcia_status.split()
+        assert arcovid19.cases.PROVINCIAS[" ".join(name)] == pcia
+        assert arcovid19.cases.STATUS[stat_name] == stat
+
+    # the totals of the country
+    totals = parsed[df.dates].groupby(level="cod_status").sum()
+    for stat, total in totals.iterrows():
+        np.testing.assert_array_equal(df.loc[("ARG", stat), df.dates], total)
+    n_c = df.loc[("ARG", "C"), df.dates].values
+    np.testing.assert_array_equal(
+        df.loc[("ARG", "growth_rate_C"), df.dates[1:]], n_c[1:] / n_c[:-1] - 1)
+
+
+def test_load_cases_csv():
+    df = arcovid19.load_cases(
+        cases_url=LOCAL_CASES_CSV, areas_pop_url=LOCAL_AREA_POP)
+    expected = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+
+    pd.testing.assert_frame_equal(df.df, expected.df, check_exact=True)
+    assert all(isinstance(date, dt.datetime) for date in df.dates)
+
+
+def test_load_cases_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    cases = tmp_path / "cases.parquet"
+    pd.read_csv(
+        LOCAL_CASES_CSV, nrows=arcovid19.cases.CASES_ROWS).to_parquet(cases)
+
+    df = arcovid19.load_cases(cases_url=cases, areas_pop_url=LOCAL_AREA_POP)
+    expected = arcovid19.load_cases(
+        cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
+
+    pd.testing.assert_frame_equal(df.df, expected.df, check_exact=True)
+
+
+@pytest.mark.parametrize("path, fmt", [
+    (LOCAL_CASES, "excel"), (LOCAL_CASES_CSV, "csv"),
+    (LOCAL_AREA_POP, "csv")])
+def test_cases_format(path, fmt):
+    assert arcovid19.cases._cases_format(path.read_bytes()) == fmt
+    assert arcovid19.cases._cases_format(b"PAR1\x15\x04") == "parquet"
+
+
+def test_parse_date_labels():
+    dates = arcovid19.cases._parse_date_labels(
+        ["29/02", "03/03", "31/12", "01/01", "2021-01-02", "03/01"])
+    assert dates == [
+        dt.datetime(2020, 2, 29), dt.datetime(2020, 3, 3),
+        dt.datetime(2020, 12, 31), dt.datetime(2021, 1, 1),
+        dt.datetime(2021, 1, 2), dt.datetime(2021, 1, 3)]
+
+
 def test_delegation():
     df = arcovid19.load_cases(
         cases_url=LOCAL_CASES, areas_pop_url=LOCAL_AREA_POP)
@@ -24,7 +24,10 @@
 # =============================================================================
 
 import os
+import sys
 import pathlib
+import threading
+import subprocess
 
 import pytest
 
@@ -35,6 +38,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 import arcovid19
+from arcovid19 import models
 from arcovid19.models import ModelResultFrame
 
 
@@ -152,6 +156,604 @@ def test_always_return_model_frame():
             assert result.model_name == mname.split("_")[-1]
 
 
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_do_is_cached(model, private_cache, monkeypatch):
+    curve = arcovid19.load_infection_curve()
+    method = getattr(curve, f"do_{model}")
+    expected = method(dt=0.5)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the model was integrated again")
+
+    monkeypatch.setattr(models, "_integrate", fail)
+    result = method(dt=0.5)
+
+    pd.testing.assert_frame_equal(result.df, expected.df)
+    assert result.extra == expected.extra
+
+    with pytest.raises(AssertionError):
+        method(dt=0.5, force=True)
+    with pytest.raises(AssertionError):
+        arcovid19.load_infection_curve(R=1.3).do_SIR(dt=0.5)
+
+
+def test_do_cache_salt(private_cache, monkeypatch):
+    curve = arcovid19.load_infection_curve()
+    curve.do_SIR()
+
+    calls = []
+    integrate = models._integrate
+    monkeypatch.setattr(
+        models, "_integrate",
+        lambda *args, **kwargs: calls.append(args) or integrate(
+            *args, **kwargs))
+
+    curve.do_SIR()
+    assert calls == []
+
+    monkeypatch.setattr(models, "_model_salt", lambda model_name: "changed")
+    curve.do_SIR()
+    assert len(calls) == 1
+
+
+# =============================================================================
+# GRAPHS
+# =============================================================================
+
+@pytest.fixture
+def graph():
+    g = models.Graph()
+    for i, inode in enumerate(['A', 'B', 'C', 'D']):
+        g.add_node(inode, i)
+
+    nms = ['x', 'y']
+    g.add_edge('A', 'B', nms, [1, 100])
+    g.add_edge('A', 'C', nms, [2, 200])
+    g.add_edge('B', 'D', nms, [3, 300])
+    g.add_edge('D', 'B', nms, [4, 400])
+    g.add_edge('D', 'C', nms, [5, 500])
+    g.add_edge('C', 'C', nms, [6, 600])
+    return g
+
+
+def test_graph_get_edge_missing_node(graph):
+    with pytest.raises(models.NodeNotFoundError):
+        graph.get_edge('A', 'Z', 'x')
+
+
+def test_compiled_graph(graph):
+    cg = graph.compile()
+
+    assert isinstance(cg, models.CompiledGraph)
+    assert cg.nodes == ('A', 'B', 'C', 'D')
+    assert len(cg) == 4
+    np.testing.assert_array_equal(cg.values, [0, 1, 2, 3])
+    assert cg.adjacency.sum() == 6
+    for node in graph:
+        assert cg.get_node_value(node.id) == node.value
+        for neighbor in node.get_connections():
+            for field in ['x', 'y']:
+                expected = graph.get_edge(node.id, neighbor.id, field)
+                assert cg.get_edge(node.id, neighbor.id, field) == expected
+
+
+def test_compiled_graph_missing(graph):
+    cg = graph.compile()
+    with pytest.raises(models.NodeNotFoundError):
+        cg.get_edge('A', 'Z', 'x')
+    with pytest.raises(KeyError):
+        cg.get_edge('B', 'A', 'x')
+
+
+def test_compiled_graph_stack(graph):
+    other = graph.compile()
+    graph.set_node('A', 10)
+    graph.add_edge('A', 'B', ['x', 'y'], [-1, -100])
+
+    stacked = models.CompiledGraph.stack([other, graph.compile()])
+
+    assert stacked.adjacency.shape == (2, 4, 4)
+    np.testing.assert_array_equal(stacked.get_node_value('A'), [0, 10])
+    np.testing.assert_array_equal(stacked.get_edge('A', 'B', 'y'), [100, -100])
+
+
+def test_compiled_graph_stack_different_nodes(graph):
+    other = models.Graph()
+    other.add_node('A', 0)
+    with pytest.raises(ValueError):
+        models.CompiledGraph.stack([graph.compile(), other.compile()])
+
+
+# =============================================================================
+# INTEGRATION
+# =============================================================================
+
+@pytest.mark.parametrize(
+    "t_max, dt", [(200, 1.), (200, 0.1), (57.3, 0.37), (3, 0.7), (0, 1.)])
+def test_time_grid(t_max, dt):
+    expected, t = [0.], 0.
+    while t < t_max:
+        t = t + dt
+        expected.append(t)
+
+    result = models._time_grid(t_max, dt)
+
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_sweep_equals_single_runs(model):
+    grid = {
+        "R": [1.2, 2.5],
+        "t_incubation": [3., 5.],
+        "population": [1000, 600000]}
+    curve = arcovid19.load_infection_curve(N_init=10)
+
+    result = curve.sweep(grid, model=model, t_max=100, dt=0.5)
+
+    assert isinstance(result, models.ModelSweepFrame)
+    assert result.model_name == model
+    assert len(result.params) == 8
+    for run_id, params in result.params.iterrows():
+        run_curve = arcovid19.load_infection_curve(
+            N_init=10, **{k: params[k] for k in grid})
+        expected = getattr(run_curve, f"do_{model}")(t_max=100, dt=0.5)
+
+        run = result.run(run_id)
+        assert isinstance(run, ModelResultFrame)
+        np.testing.assert_array_equal(run.df, expected.df)
+        np.testing.assert_array_equal(run.df.index, expected.df.index)
+
+
+def test_sweep_list_of_grids():
+    curve = arcovid19.load_infection_curve()
+    result = curve.sweep([{"R": [1.1, 1.2]}, {"N_init": [1, 2, 3]}])
+
+    assert list(result.params.R) == [1.1, 1.2, 1.2, 1.2, 1.2]
+    assert list(result.params.N_init) == [10, 10, 1, 2, 3]
+    assert list(result.df.index.levels[0]) == [0, 1, 2, 3, 4]
+
+
+def test_sweep_unknown_parameter():
+    curve = arcovid19.load_infection_curve()
+    with pytest.raises(ValueError, match="'R0'"):
+        curve.sweep([{"R": [1.1]}, {"R0": [1.1, 1.2]}], n_jobs=2)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_sweep_chunks(n_jobs):
+    grid = {"R": [1.1, 1.5, 2.], "t_incubation": [3., 5.], "N_init": [1, 10]}
+    curve = arcovid19.load_infection_curve()
+    expected = curve.sweep(grid, model="SEIRF", t_max=50)
+
+    calls = []
+    result = curve.sweep(
+        grid, model="SEIRF", t_max=50, n_jobs=n_jobs, chunk_size=5,
+        progress=lambda done, total: calls.append((done, total)))
+
+    pd.testing.assert_frame_equal(result.df, expected.df)
+    pd.testing.assert_frame_equal(result.params, expected.params)
+    assert len(calls) == 3
+    assert calls == sorted(calls)
+    assert calls[-1] == (12, 12)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_sweep_cancel(n_jobs):
+    cancel = threading.Event()
+    curve = arcovid19.load_infection_curve()
+    with pytest.raises(models.SweepCancelledError):
+        curve.sweep(
+            {"R": np.linspace(1.1, 2., 10)}, t_max=50, n_jobs=n_jobs,
+            chunk_size=1,
+            progress=lambda done, total: cancel.set(), cancel=cancel)
+
+
+def test_sweep_plot():
+    curve = arcovid19.load_infection_curve()
+    result = curve.sweep({"R": [1.1, 1.2]}, t_max=20)
+
+    fig, ax = plt.subplots()
+    assert result.plot(ax=ax, only=["I", "C"], log=True) is ax
+    assert len(ax.lines) >= 4
+    plt.close(fig)
+
+
+def test_time_grid_invalid_dt():
+    with pytest.raises(ValueError):
+        models._time_grid(200, 0)
+
+
+@pytest.mark.parametrize("jit", [False, True])
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_iter_integrate_equals_integrate(model, chunk_size, jit, monkeypatch):
+    if jit and not models._HAS_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(models, "JIT", jit)
+
+    spec = models._MODELS[model]
+    curves = [
+        arcovid19.load_infection_curve(R=R, t_incubation=t_incubation)
+        for R, t_incubation in [(1.2, 3.), (2.5, 3.), (2.5, 5.)]]
+    ts = models._time_grid(100, 0.5)
+    expected = models._integrate(spec, curves, ts, 0.5)
+
+    chunks = {c: [] for c in spec.compartments}
+    steps = []
+    for step, chunk in models._iter_integrate(
+        spec, curves, len(ts), 0.5, chunk_size=chunk_size
+    ):
+        steps.append(step)
+        for c, arr in chunk.items():
+            chunks[c].append(arr.copy())
+
+    assert steps[:2] == [0, 1]
+    for c in spec.compartments:
+        np.testing.assert_array_equal(np.concatenate(chunks[c]), expected[c])
+
+
+@pytest.mark.parametrize("solver", ["euler", "RK45"])
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_output_dt(model, solver, monkeypatch):
+    monkeypatch.setattr(models, "STREAM_CHUNK_SIZE", 13)
+    curve = arcovid19.load_infection_curve()
+    method = getattr(curve, f"do_{model}")
+
+    expected = method(t_max=50, dt=0.1, solver=solver).df.iloc[::10]
+    result = method(t_max=50, dt=0.1, solver=solver, output_dt=1.).df
+
+    np.testing.assert_array_equal(result.index, expected.index)
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+def test_sweep_output_dt():
+    grid = {"R": [1.2, 2.5], "t_incubation": [3., 5.]}
+    curve = arcovid19.load_infection_curve()
+
+    expected = curve.sweep(grid, model="SEIR", t_max=50, dt=0.5)
+    result = curve.sweep(grid, model="SEIR", t_max=50, dt=0.5, output_dt=2.)
+
+    for run_id in range(4):
+        np.testing.assert_array_equal(
+            result.run(run_id).df, expected.run(run_id).df.iloc[::4])
+
+
+@pytest.mark.parametrize("output_dt", [0.25, 1.3, 0])
+def test_output_dt_invalid(output_dt):
+    curve = arcovid19.load_infection_curve()
+    with pytest.raises(ValueError):
+        curve.do_SIR(dt=0.5, output_dt=output_dt)
+
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+@pytest.mark.parametrize("output_dt", [None, 2.])
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_iter_equals_do(model, output_dt):
+    curve = arcovid19.load_infection_curve()
+    expected = getattr(curve, f"do_{model}")(dt=0.5, output_dt=output_dt)
+
+    chunks = list(getattr(curve, f"iter_{model}")(
+        dt=0.5, chunk_size=50, output_dt=output_dt))
+
+    assert len(chunks) > 2
+    assert len(chunks[0]) == 1
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected.df)
+
+
+def test_iter_stop_below_threshold():
+    curve = arcovid19.load_infection_curve(N_init=10)
+    full = curve.do_SEIR(t_max=300).df
+    stop = models.BelowThreshold("E", threshold=5., days=3)
+
+    df = pd.concat(curve.iter_SEIR(t_max=300, stop=stop, chunk_size=10))
+
+    below = full.E < 5.
+    t_below = next(
+        t for t in full.index
+        if below[t] and below[t - 3:t].all() and len(below[t - 3:t]) == 4)
+    assert df.index[-1] == t_below
+    pd.testing.assert_frame_equal(df, full.loc[:t_below])
+
+
+def test_iter_stop_peak_passed():
+    curve = arcovid19.load_infection_curve()
+    full = curve.do_SIR().df
+    peak = full.I.idxmax()
+
+    df = pd.concat(curve.iter_SIR(
+        stop=[models.PeakPassed("I", days=10), models.BelowThreshold("R", 0)],
+        chunk_size=3))
+
+    assert full.I[peak + 10] < full.I[peak]
+    assert df.index[-1] == peak + 10
+    assert df.I.idxmax() == peak
+
+
+def test_iter_stop_condition_reusable():
+    curve = arcovid19.load_infection_curve()
+    stop = models.PeakPassed(days=5)
+
+    first = pd.concat(curve.iter_SIR(stop=stop))
+    second = pd.concat(curve.iter_SIR(stop=stop))
+
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_stop_condition_is_abstract():
+    class NoChecker(models.StopCondition):
+        pass
+
+    with pytest.raises(TypeError):
+        models.StopCondition()
+    with pytest.raises(TypeError):
+        NoChecker()
+
+
+# =============================================================================
+# COMPILER
+# =============================================================================
+
+@pytest.mark.parametrize("dt", [1., 0.5])
+def test_compile_model_SIR(dt):
+    curve = arcovid19.load_infection_curve()
+    model = models.compile_model(curve._SIR_graph(dt))
+
+    result = model.integrate(dt=dt, population=curve.population)
+    expected = curve.do_SIR(dt=dt)
+
+    assert result.model_name == "Compiled"
+    np.testing.assert_array_equal(
+        result.df[["I", "C", "R"]].values, expected.df.values)
+
+
+def test_compile_model_contacts():
+    g = models.Graph()
+    for node, value in [("S", 999), ("I", 1), ("R", 0)]:
+        g.add_node(node, value)
+    g.add_edge("S", "I", ["prob", "lag"], [0.3, 0])
+    g.add_edge("I", "R", ["prob", "lag"], [0.1, 0])
+
+    model = models.compile_model(g, contacts={("S", "I"): "I"})
+    df = model.integrate(t_max=100, population=1000).df
+
+    np.testing.assert_allclose(df.sum(axis=1), 1000)
+    assert df.S.is_monotonic_decreasing
+    assert df.R.is_monotonic_increasing
+    assert df.I.idxmax() not in (0, 100)
+
+    with pytest.raises(KeyError):
+        models.compile_model(g, contacts={("I", "S"): "I"})
+
+
+def test_compile_model_cache_by_structure():
+    curve = arcovid19.load_infection_curve()
+    other = arcovid19.load_infection_curve(R=2.3, N_init=100)
+    slower = arcovid19.load_infection_curve(t_incubation=7)
+
+    model = models.compile_model(curve._SIR_graph(1.))
+    assert model.kernel is models.compile_model(other._SIR_graph(1.)).kernel
+    assert model.kernel is not models.compile_model(
+        slower._SIR_graph(1.)).kernel
+
+
+# =============================================================================
+# ADAPTIVE SOLVERS
+# =============================================================================
+
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_adaptive_solver(model):
+    curve = arcovid19.load_infection_curve()
+    method = getattr(curve, f"do_{model}")
+
+    euler = method(t_max=100)
+    rk45 = method(t_max=100, solver="RK45")
+    dop853 = method(
+        t_max=100, solver="DOP853",
+        solver_options={"rtol": 1e-10, "atol": 1e-8})
+
+    assert rk45.solver == "RK45"
+    assert euler.solver == "euler"
+    assert rk45.df.index.equals(euler.df.index)
+    assert rk45.df.columns.equals(euler.df.columns)
+    assert (rk45.df.values <= curve.population).all()
+    np.testing.assert_allclose(
+        rk45.df, dop853.df, atol=1e-4 * curve.population)
+
+
+def test_adaptive_solver_exact():
+    # before the first delay the infected grow as N_init * exp(R * t)
+    curve = arcovid19.load_infection_curve(R=0.3, t_incubation=5)
+    result = curve.do_SIR(
+        t_max=10, dt=0.25, solver="RK45",
+        solver_options={"rtol": 1e-9, "atol": 1e-9})
+
+    growth = result.df.loc[:5.]
+    np.testing.assert_allclose(
+        growth.I, 10 * np.exp(0.3 * growth.index), rtol=1e-7)
+    assert (growth.C == 0).all()
+
+
+def test_adaptive_solver_invalid():
+    curve = arcovid19.load_infection_curve()
+    with pytest.raises(ValueError):
+        curve.do_SIR(solver="runge-kutta")
+
+
+# =============================================================================
+# JIT
+# =============================================================================
+
+@pytest.mark.skipif(not models._HAS_NUMBA, reason="numba is not installed")
+@pytest.mark.parametrize("model", ["SIR", "SEIR", "SEIRF"])
+def test_jit_equals_numpy(model, monkeypatch):
+    curve = arcovid19.load_infection_curve()
+    grid = {"R": [1.1, 2.], "t_incubation": [3., 5.]}
+
+    def run():
+        single = getattr(curve, f"do_{model}")(dt=0.1).df
+        sweep = curve.sweep(grid, model=model).df
+        return single, sweep
+
+    monkeypatch.setattr(models, "JIT", False)
+    expected_single, expected_sweep = run()
+
+    monkeypatch.setattr(models, "JIT", True)
+    single, sweep = run()
+
+    np.testing.assert_array_equal(single.values, expected_single.values)
+    np.testing.assert_array_equal(sweep.values, expected_sweep.values)
+
+
+def test_import_does_not_import_numba():
+    code = (
+        "import sys, arcovid19; "
+        "assert 'numba' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+# =============================================================================
+# STOCHASTIC
+# =============================================================================
+
+@pytest.mark.parametrize(
+    "simulate", [models._tau_leaping_SIR, models._gillespie_SIR])
+def test_stochastic_SIR_conserves_population(simulate):
+    rng = np.random.default_rng(42)
+    ts = models._time_grid(100, 1.)
+    out = simulate(
+        rng, 50, S0=490, I0=10, beta=0.3, gamma=0.1, population=500,
+        ts=ts, dt=1.)
+
+    assert out.shape == (len(ts), 3, 50)
+    assert (out >= 0).all()
+    assert (out.sum(axis=1) == 500).all()
+    assert (np.diff(out[:, 0], axis=0) <= 0).all()
+    assert (np.diff(out[:, 2], axis=0) >= 0).all()
+
+
+def test_stochastic_SIR():
+    curve = arcovid19.load_infection_curve(population=1000, R=2.5)
+
+    result = curve.stochastic_SIR(t_max=100, n_realizations=300, seed=42)
+
+    assert isinstance(result, models.ModelResultFrame)
+    assert result.model_name == "stochastic_SIR"
+    assert result.method == "gillespie"
+    assert result.df.shape == (101, 9)
+    assert list(result.df.columns.levels[0]) == ["I", "R", "S"]
+    np.testing.assert_array_equal(
+        result.df.loc[0., "I"].values, [10, 10, 10])
+    assert (result.df["R"][0.05] <= result.df["R"][0.5]).all()
+    assert (result.df["R"][0.5] <= result.df["R"][0.95]).all()
+
+
+def test_stochastic_SIR_methods_agree():
+    curve = arcovid19.load_infection_curve(population=1000, R=2.5)
+    kwargs = dict(t_max=150, n_realizations=400, quantiles=[0.5], seed=42)
+
+    tau = curve.stochastic_SIR(method="tau-leaping", **kwargs)
+    exact = curve.stochastic_SIR(method="gillespie", **kwargs)
+
+    # final size of the epidemic is ~89% of the population for R=2.5
+    np.testing.assert_allclose(
+        tau.df["R"][0.5].iloc[-1], exact.df["R"][0.5].iloc[-1], rtol=0.05)
+    np.testing.assert_allclose(tau.df["R"][0.5].iloc[-1], 890, rtol=0.05)
+
+
+def test_stochastic_SIR_reproducible():
+    curve = arcovid19.load_infection_curve()
+    kwargs = dict(t_max=50, n_realizations=200, chunk_size=50, seed=7)
+
+    result = curve.stochastic_SIR(**kwargs)
+    assert result.method == "tau-leaping"
+    assert result.df.equals(curve.stochastic_SIR(**kwargs).df)
+    assert result.df.equals(curve.stochastic_SIR(n_jobs=2, **kwargs).df)
+    assert not result.df.equals(
+        curve.stochastic_SIR(**dict(kwargs, seed=8)).df)
+
+
+def test_stochastic_SIR_invalid_method():
+    curve = arcovid19.load_infection_curve()
+    with pytest.raises(ValueError):
+        curve.stochastic_SIR(method="euler")
+
+
+# =============================================================================
+# STREAMING QUANTILES
+# =============================================================================
+
+def test_P2Quantiles():
+    rng = np.random.default_rng(42)
+    data = rng.normal(size=(5000, 4, 3))
+
+    aggregator = models.P2Quantiles([0.05, 0.5, 0.95], shape=(4, 3))
+    aggregator.update_many(data)
+
+    assert aggregator.count == 5000
+    result = aggregator.result()
+    assert result.shape == (3, 4, 3)
+    np.testing.assert_allclose(
+        result, np.quantile(data, [0.05, 0.5, 0.95], axis=0), atol=0.1)
+
+
+def test_P2Quantiles_few_observations():
+    aggregator = models.P2Quantiles([0.5, 0.9], shape=(2,))
+    with pytest.raises(ValueError):
+        aggregator.result()
+
+    aggregator.update([1, 2])
+    aggregator.update([3, 4])
+    np.testing.assert_allclose(aggregator.result(), [[2, 3], [2.8, 3.8]])
+
+
+@pytest.mark.parametrize("quantiles", [[0, 0.5], [0.5, 1.2], [[0.5]]])
+def test_P2Quantiles_invalid_quantiles(quantiles):
+    with pytest.raises(ValueError):
+        models.P2Quantiles(quantiles, shape=(2,))
+
+
+def test_stochastic_SIR_streaming():
+    curve = arcovid19.load_infection_curve(population=1000, R=2.5)
+    kwargs = dict(t_max=100, n_realizations=1000, chunk_size=250, seed=42)
+
+    exact = curve.stochastic_SIR(**kwargs)
+    streaming = curve.stochastic_SIR(streaming=True, **kwargs)
+
+    assert streaming.df.columns.equals(exact.df.columns)
+    np.testing.assert_allclose(streaming.df, exact.df, atol=20)
+    assert streaming.df.equals(
+        curve.stochastic_SIR(streaming=True, n_jobs=2, **kwargs).df)
+
+
+def test_sweep_quantiles():
+    curve = arcovid19.load_infection_curve(population=1000)
+    grid = {"R": np.linspace(1.5, 3, 500)}
+
+    bands = curve.sweep(grid, quantiles=[0.05, 0.5, 0.95], chunk_size=100)
+    expected = curve.sweep(grid).df.groupby("ts").quantile(
+        [0.05, 0.5, 0.95]).unstack()[bands.df.columns]
+
+    assert isinstance(bands, models.ModelResultFrame)
+    assert bands.population == 1000
+    assert len(bands.params) == 500
+    np.testing.assert_allclose(bands.df, expected, atol=10)
+
+
+def test_plot_bands():
+    curve = arcovid19.load_infection_curve(population=1000, R=2.5)
+    result = curve.stochastic_SIR(t_max=50, n_realizations=100, seed=42)
+
+    fig, ax = plt.subplots()
+    assert result.plot(ax=ax, only=["I", "R"]) is ax
+    assert [line.get_label() for line in ax.lines] == ["I", "R"]
+    assert len(ax.collections) == 2
+    plt.close(fig)
+
+
 # =============================================================================
 # PLOT TEST
 # =============================================================================
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2020, Bruno Sanchez, Vanessa Daza,
+#                     Juan B Cabral, Marcelo Lares,
+#                     Nadia Luczywo, Dante Paz, Rodrigo Quiroga,
+#                     Martín de los Ríos, Federico Stasyszyn
+#                     Cristian Giuppone.
+# License: BSD-3-Clause
+#   Full Text: https://raw.githubusercontent.com/ivco19/libs/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Test suite
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import os
+import time
+import pathlib
+import functools
+from http import server
+
+import pytest
+
+import arcovid19
+from arcovid19 import cache, cli, warm
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+PATH = pathlib.Path(os.path.abspath(os.path.dirname(__file__)))
+
+DATABASES = PATH.parent / "databases"
+
+DELAY = 0.5
+
+
+# =============================================================================
+# SETUP
+# =============================================================================
+
+pytestmark = pytest.mark.usefixtures("private_cache")
+
+
+class SlowHandler(server.SimpleHTTPRequestHandler):
+    """Serve the databases, ``DELAY`` seconds after every request."""
+
+    starts = []
+
+    def do_GET(self):
+        self.starts.append(time.monotonic())
+        time.sleep(DELAY)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def databases_url(http_server):
+    handler = type("Handler", (SlowHandler,), {"starts": []})
+    url = http_server(functools.partial(handler, directory=str(DATABASES)))
+    return url, handler.starts
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("the value was not in the cache")
+
+
+# =============================================================================
+# TESTS
+# =============================================================================
+
+def test_warm_cache(databases_url, monkeypatch):
+    url, starts = databases_url
+    cases_url = f"{url}/cases.xlsx"
+    areas_pop_url = f"{url}/extra/arg_provs.dat"
+
+    results = warm.warm_cache(
+        cases_url=cases_url, areas_pop_url=areas_pop_url)
+
+    assert set(results) == {
+        f"fetch {cases_url}", f"fetch {areas_pop_url}", "load_cases",
+        "do_SIR", "do_SEIR", "do_SEIRF"}
+    assert all(isinstance(r, float) for r in results.values())
+
+    # the tables were downloaded at the same time
+    first, second = starts
+    assert abs(second - first) < DELAY
+
+    # everything is in the cache
+    monkeypatch.setattr(cache, "_download", fail)
+    monkeypatch.setattr(arcovid19.cases, "_parse_cases", fail)
+    monkeypatch.setattr(arcovid19.models, "_run_model", fail)
+    cache.MEMORY_CACHE.clear()
+
+    arcovid19.load_cases(cases_url=cases_url, areas_pop_url=areas_pop_url)
+    curve = arcovid19.load_infection_curve()
+    for mname in warm.MODELS:
+        getattr(curve, mname)()
+
+
+def test_warm_cache_force(databases_url, monkeypatch):
+    url, starts = databases_url
+    urls = {
+        "cases_url": f"{url}/cases.xlsx",
+        "areas_pop_url": f"{url}/extra/arg_provs.dat"}
+    warm.warm_cache(models=[], **urls)
+
+    parsed = []
+    parse_cases = arcovid19.cases._parse_cases
+
+    def spy(*args, **kwargs):
+        parsed.append(True)
+        return parse_cases(*args, **kwargs)
+
+    monkeypatch.setattr(arcovid19.cases, "_parse_cases", spy)
+    results = warm.warm_cache(models=[], force=True, **urls)
+
+    assert all(isinstance(r, float) for r in results.values())
+    assert len(parsed) == 1
+    assert len(starts) == 4  # every table downloaded once more
+
+
+def test_warm_cache_error(tmp_path):
+    results = warm.warm_cache(
+        cases_url=tmp_path / "missing.xlsx",
+        areas_pop_url=DATABASES / "extra" / "arg_provs.dat",
+        models=["do_SIR"])
+
+    assert isinstance(results[f"fetch {tmp_path / 'missing.xlsx'}"], OSError)
+    assert isinstance(results["load_cases"], OSError)
+    assert isinstance(results["do_SIR"], float)
+
+
+def test_warm_cache_in_background(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        warm, "warm_cache", lambda **kwargs: calls.append(kwargs))
+
+    warm.warm_cache_in_background(force=True).join()
+
+    assert calls == [{"force": True}]
+
+
+@pytest.mark.parametrize("setting, warmed", [(True, 1), (False, 0)])
+def test_create_app_warm(setting, warmed, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        arcovid19.web, "warm_cache_in_background",
+        lambda: calls.append(True))
+
+    arcovid19.web.create_app(WARM=setting)
+
+    assert len(calls) == warmed
+
+
+def test_cli_warm(monkeypatch):
+    monkeypatch.setattr(
+        cli, "warm_cache",
+        lambda force: {"load_cases": 0.5, "do_SIR": ValueError("boom")})
+
+    assert cli.warm().splitlines() == [
+        "load_cases: 0.500 s", "do_SIR: FAILED ValueError('boom')"]